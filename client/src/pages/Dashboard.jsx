@@ -47,6 +47,9 @@ import ContextInfo from "../components/ContextInfo";
 import TrafficMetricsDetail from "../components/TrafficMetricsDetail";
 import logo from "../assets/logo.png";
 
+const API_URL = "http://127.0.0.1:8000/api";
+const JOB_POLL_INTERVAL_MS = 1000;
+
 const Dashboard = () => {
   // Available scenarios and strategies
   const scenarios = [
@@ -60,6 +63,7 @@ const Dashboard = () => {
   const strategies = [
     { id: "set_interval", name: "Set Interval" },
     { id: "multi_agent", name: "Multi Agent" },
+    { id: "max_pressure", name: "Max Pressure" },
   ];
 
   // Add states for scenario selection and API integration
@@ -67,6 +71,7 @@ const Dashboard = () => {
   const [selectedStrategy, setSelectedStrategy] = useState("set_interval");
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [jobProgress, setJobProgress] = useState(null);
   const [simulationData, setSimulationData] = useState(null);
   const [persistentData, setPersistentData] = useState(null);
   const [initialState, setInitialState] = useState(null);
@@ -83,10 +88,11 @@ const Dashboard = () => {
   const runSimulation = async () => {
     setLoading(true);
     setError(null);
+    setJobProgress(null);
     setPlaying(false);
 
     try {
-      const response = await fetch("http://127.0.0.1:8000/api/run", {
+      const response = await fetch(`${API_URL}/run`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -101,7 +107,26 @@ const Dashboard = () => {
         throw new Error(`API error: ${response.status}`);
       }
 
-      const data = await response.json();
+      // The simulation runs as a background job; poll until it has finished
+      const job = await response.json();
+      let status = job;
+      while (status.status === "queued" || status.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        const statusResponse = await fetch(`${API_URL}/jobs/${job.job_id}`);
+        if (!statusResponse.ok) {
+          throw new Error(`API error: ${statusResponse.status}`);
+        }
+        status = await statusResponse.json();
+        setJobProgress(status.progress);
+      }
+
+      const resultResponse = await fetch(`${API_URL}/jobs/${job.job_id}/result`);
+      if (!resultResponse.ok) {
+        const failure = await resultResponse.json();
+        throw new Error(failure.error || `API error: ${resultResponse.status}`);
+      }
+
+      const data = await resultResponse.json();
       setSimulationData(data);
 
       // Extract scenario data, metrics, and states from the response
@@ -404,7 +429,11 @@ const Dashboard = () => {
               ) : (
                 <Play className="h-4 w-4 mr-2" />
               )}
-              {loading ? "Generating Simulation..." : "Run Simulation"}
+              {loading
+                ? jobProgress && jobProgress.step
+                  ? `Simulating step ${jobProgress.step} (${jobProgress.vehicles_remaining} vehicles left)...`
+                  : "Generating Simulation..."
+                : "Run Simulation"}
             </Button>
           </CardFooter>
         </Card>
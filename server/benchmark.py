@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from scenario_generator import DEFAULT_LANE_RATES, generate_vehicles, scenario_header, write_scenario
+from simulator import TrafficSimulator
+from utils.metrics import calculate_metrics
+from tests.stub_client import install_stub_client
+
+# Number of generated vehicles of each benchmark scenario
+DEFAULT_SIZES = [100, 1000, 10000]
+
+# Arrival period of the generated scenarios
+ARRIVAL_SECONDS = 1800
+
+START = datetime(2025, 3, 19, 8, 0)
+
+# Whether a higher value of each metric is better; every metric is compared against
+# the median of the same size in the recent history
+HIGHER_IS_BETTER = {
+    "ticks_per_second": True,
+    "vehicles_per_second": True,
+    "calculate_metrics_seconds": False,
+    "save_results_seconds": False,
+    "save_results_peak_mb": False,
+    "api_run_seconds": False,
+    "strategy_set_interval_ms": False,
+    "strategy_max_pressure_ms": False,
+    "strategy_multi_agent_ms": False,
+}
+
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_BASELINE_RUNS = 5
+STRATEGY_CALLS = 50
+
+
+def build_scenario(directory: str, size: int, seed: int = 0) -> str:
+    """Write a generated scenario of about `size` vehicles and return its path"""
+    scale = size / (sum(DEFAULT_LANE_RATES.values()) * ARRIVAL_SECONDS / 3600)
+    lane_rates = {lane: rate * scale for lane, rate in DEFAULT_LANE_RATES.items()}
+    path = os.path.join(directory, f"benchmark_{size}.json")
+    write_scenario(path, scenario_header(START),
+                   generate_vehicles(START, ARRIVAL_SECONDS, lane_rates=lane_rates,
+                                     emergency_per_hour=2, seed=seed))
+    return path
+
+
+def _median_ms(function, calls: int) -> float:
+    durations = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return round(statistics.median(durations) * 1000, 4)
+
+
+def bench_simulation(path: str, directory: str, engine: str = "dict") -> Dict[str, float]:
+    """Tick rate, vehicle rate, calculate_metrics time and _save_results time and memory"""
+    simulator = TrafficSimulator(path, engine=engine, timed_arrivals=True,
+                                 experiment_dir=os.path.join(directory, "simulation"))
+    ticks = {"count": 0, "end": None}
+    save = {}
+
+    def progress(step, vehicles):
+        ticks["count"] = step
+        ticks["end"] = time.perf_counter()
+
+    # Measure the save the run ends with, which also writes out the passed vehicles;
+    # it is traced for its peak allocation, so its time includes the tracing overhead
+    save_results = simulator._save_results
+
+    def measured_save_results():
+        tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            save_results()
+            save["seconds"] = time.perf_counter() - start
+            save["peak"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    simulator._save_results = measured_save_results
+
+    start = time.perf_counter()
+    simulator.run(max_steps=100000, progress=progress)
+    loop_seconds = (ticks["end"] or time.perf_counter()) - start
+
+    states = list(simulator.states)
+    with open(os.path.join(directory, "simulation", "passed_vehicles.json")) as file:
+        passed_vehicles = json.load(file)
+    start = time.perf_counter()
+    calculate_metrics(states, passed_vehicles, simulator.passed_pedestrians,
+                      list(simulator.queue_lengths), os.path.join(directory, "simulation"))
+    metrics_seconds = time.perf_counter() - start
+
+    return {
+        "ticks": ticks["count"],
+        "ticks_per_second": round(ticks["count"] / loop_seconds, 2),
+        "vehicles_per_second": round(simulator.passed_count / loop_seconds, 2),
+        "calculate_metrics_seconds": round(metrics_seconds, 5),
+        "save_results_seconds": round(save["seconds"], 5),
+        "save_results_peak_mb": round(save["peak"] / 2 ** 20, 3),
+    }
+
+
+def bench_api(path: str, directory: str) -> Dict[str, float]:
+    """Latency of a blocking /api/run request through the Flask test client"""
+    from app import app
+    from routes import simulator_routes
+
+    scenarios_dir = simulator_routes.SCENARIOS_DIR
+    simulator_routes.SCENARIOS_DIR = os.path.dirname(path)
+    try:
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post("/api/run", json={
+            "scenario": os.path.basename(path), "timed_arrivals": True, "wait": True})
+        response.get_data()
+        seconds = time.perf_counter() - start
+    finally:
+        simulator_routes.SCENARIOS_DIR = scenarios_dir
+    if response.status_code != 200:
+        raise RuntimeError(f"/api/run failed with {response.status_code}: {response.get_json()}")
+    shutil.rmtree(response.get_json()["experiment_dir"], ignore_errors=True)
+    return {"api_run_seconds": round(seconds, 5)}
+
+
+def bench_strategies(path: str, directory: str, calls: int = STRATEGY_CALLS) -> Dict[str, float]:
+    """Median decision latency of each strategy with every vehicle present (LLM stubbed)"""
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    results = {}
+    for strategy, options in [("set_interval", {}), ("max_pressure", {}),
+                              ("multi_agent", {})]:
+        simulator = TrafficSimulator(path, strategy=strategy, strategy_options=options,
+                                     experiment_dir=os.path.join(directory, strategy))
+        if strategy == "multi_agent":
+            install_stub_client(simulator.strategy.traffic_optimizer, duration_seconds=40)
+        vehicles = simulator._active_vehicles()
+        results[f"strategy_{strategy}_ms"] = _median_ms(
+            lambda: simulator.strategy.get_next_signal_status(
+                simulator.current_signal_status, vehicles, simulator.pedestrians,
+                simulator.weather, simulator.context),
+            calls)
+    return results
+
+
+def run_benchmarks(sizes: List[int] = None, engine: str = "dict", api: bool = True,
+                   seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Run every benchmark at every scenario size.
+
+    Returns:
+        Dict mapping the size (as a string) to its measurements
+    """
+    results = {}
+    directory = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        for size in sizes or DEFAULT_SIZES:
+            path = build_scenario(directory, size, seed)
+            measurements = bench_simulation(path, directory, engine)
+            if api:
+                measurements.update(bench_api(path, directory))
+            measurements.update(bench_strategies(path, directory))
+            results[str(size)] = measurements
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    """Benchmark runs recorded so far, oldest first"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)
+
+
+def find_regressions(results: Dict[str, Dict[str, float]],
+                     history: List[Dict[str, Any]],
+                     threshold: float = DEFAULT_THRESHOLD,
+                     baseline_runs: int = DEFAULT_BASELINE_RUNS,
+                     machine: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Compare results with the median of the last baseline_runs recorded runs
+    (of the given machine only, unless machine is None).
+
+    Returns:
+        One entry per metric that got worse by more than the threshold (a fraction)
+    """
+    if machine is not None:
+        history = [run for run in history if run.get("machine") == machine]
+    regressions = []
+    for size, measurements in results.items():
+        for metric, higher_is_better in HIGHER_IS_BETTER.items():
+            if metric not in measurements:
+                continue
+            previous = [run["results"][size][metric] for run in history
+                        if metric in run["results"].get(size, {})][-baseline_runs:]
+            if not previous:
+                continue
+            baseline = statistics.median(previous)
+            value = measurements[metric]
+            if baseline == 0:
+                continue
+            change = (value - baseline) / baseline
+            worse = -change if higher_is_better else change
+            if worse > threshold:
+                regressions.append({
+                    "size": size,
+                    "metric": metric,
+                    "value": value,
+                    "baseline": baseline,
+                    "change": round(change, 4)
+                })
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record(results: Dict[str, Dict[str, float]], history_path: str,
+           threshold: float = DEFAULT_THRESHOLD,
+           baseline_runs: int = DEFAULT_BASELINE_RUNS,
+           machine: Optional[str] = platform.node()) -> Dict[str, Any]:
+    """
+    Check results for regressions against the runs of the same machine (any machine
+    if machine is None) and append them to the history file
+    """
+    history = load_history(history_path)
+    run = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "results": results,
+        "regressions": find_regressions(results, history, threshold, baseline_runs, machine)
+    }
+    history.append(run)
+    os.makedirs(os.path.dirname(history_path) or ".", exist_ok=True)
+    with open(history_path, "w") as file:
+        json.dump(history, file, indent=2)
+    return run
+
+
+def parse_arguments() -> argparse.Namespace:
+    # Setup command-line argument parsing
+    parser = argparse.ArgumentParser(
+        description="Benchmark the simulator and fail on performance regressions"
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="Number of vehicles of each benchmark scenario")
+    parser.add_argument("--engine", default="dict", choices=["dict", "numpy"], help="Vehicle engine")
+    parser.add_argument("--history", default="benchmark_history.json",
+                        help="JSON file the results are appended to")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown as a fraction of the baseline (0.25 = 25%%)")
+    parser.add_argument("--baseline_runs", type=int, default=DEFAULT_BASELINE_RUNS,
+                        help="Number of recent runs whose median is the baseline")
+    parser.add_argument("--machine", default=platform.node(),
+                        help="Machine whose recorded runs form the baseline (default: this one)")
+    parser.add_argument("--any_machine", action="store_true",
+                        help="Compare with the recorded runs of every machine")
+    parser.add_argument("--no_api", action="store_true", help="Skip the /api/run benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated scenarios")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    results = run_benchmarks(args.sizes, engine=args.engine, api=not args.no_api, seed=args.seed)
+    run = record(results, args.history, args.threshold, args.baseline_runs,
+                 None if args.any_machine else args.machine)
+
+    for size, measurements in results.items():
+        print(f"{size} vehicles:")
+        for metric, value in measurements.items():
+            print(f"  {metric}: {value}")
+    for regression in run["regressions"]:
+        print(f"REGRESSION {regression['metric']} at {regression['size']} vehicles: "
+              f"{regression['value']} vs baseline {regression['baseline']} ({regression['change']:+.1%})")
+    sys.exit(1 if run["regressions"] else 0)
@@ -0,0 +1,85 @@
+from bisect import bisect_right
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+
+
+def interpolate_state(state: Dict[str, Any], ticks: int, delta_time: int,
+                      render_radius: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Derive the state `ticks` idle steps after `state`.
+
+    Nothing but positions and the clock changes during an idle stretch: every
+    moving vehicle (approaching or already passed) keeps its speed and the
+    signals, pedestrians and queue stay as they are. Passed vehicles that move
+    beyond the render radius are left out, as the simulator retires them.
+    """
+    timestamp = datetime.fromisoformat(state["timestamp"]) + timedelta(seconds=ticks * delta_time)
+    vehicles = []
+    for vehicle in state["vehicles"]:
+        speed = vehicle.get("speed_kmh", 0)
+        if speed > 0:
+            vehicle = dict(vehicle)
+            vehicle["distance_to_intersection_m"] -= ticks * (speed / 3.6 * delta_time)
+            if render_radius is not None and vehicle["distance_to_intersection_m"] < -render_radius:
+                continue
+        vehicles.append(vehicle)
+    return {**state, "timestamp": timestamp.isoformat(), "vehicles": vehicles}
+
+
+class EventTimeline(Sequence):
+    """
+    Per-tick states of an event-driven run.
+
+    Only the states of processed ticks (keyframes) are stored. The states of
+    skipped idle ticks are interpolated from the preceding keyframe whenever they
+    are indexed or iterated, so consumers still see one state per tick.
+    """
+
+    def __init__(self, render_radius: Optional[float] = None):
+        self.render_radius = render_radius
+        self.keyframes: List[Dict[str, Any]] = []
+        # Tick index of each keyframe
+        self.offsets: List[int] = []
+        # Number of idle ticks skipped after each keyframe and their step size
+        self.skipped: List[int] = []
+        self.delta_times: List[int] = []
+        self.length = 0
+
+    def append(self, state: Dict[str, Any]):
+        """Add the state of a processed tick"""
+        self.keyframes.append(state)
+        self.offsets.append(self.length)
+        self.skipped.append(0)
+        self.delta_times.append(0)
+        self.length += 1
+
+    def skip(self, ticks: int, delta_time: int):
+        """Record idle ticks after the latest keyframe"""
+        self.skipped[-1] += ticks
+        self.delta_times[-1] = delta_time
+        self.length += ticks
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("state index out of range")
+
+        position = bisect_right(self.offsets, index) - 1
+        ticks = index - self.offsets[position]
+        if ticks == 0:
+            return self.keyframes[position]
+        return interpolate_state(self.keyframes[position], ticks, self.delta_times[position],
+                                 self.render_radius)
+
+    def __iter__(self):
+        for keyframe, skipped, delta_time in zip(self.keyframes, self.skipped, self.delta_times):
+            yield keyframe
+            for ticks in range(1, skipped + 1):
+                yield interpolate_state(keyframe, ticks, delta_time, self.render_radius)
@@ -0,0 +1,296 @@
+import heapq
+import math
+from typing import Dict, List, Any, Callable, Iterable, Optional, Set, Tuple
+
+# Stopped vehicles closer than this to the stop line count towards the queue
+QUEUE_DISTANCE_M = 50
+
+# Seconds of slack for floating-point rounding when an arrival time is compared
+# to the clock: vehicles due within it are checked at the line, and idle steps
+# never skip a tick that falls within it of an arrival
+ARRIVAL_TOLERANCE_S = 1e-6
+
+
+def arrival_time(distance: float, speed_kmh: float, since: float) -> float:
+    """Clock time at which a vehicle `distance` metres out at clock `since` reaches the stop line"""
+    if speed_kmh <= 0:
+        return since
+    return since + distance / (speed_kmh / 3.6)
+
+
+def idle_ticks_before(arrival: float, clock: float, delta_time: int) -> int:
+    """
+    Number of ticks after `clock` that end before a vehicle arriving at clock
+    `arrival` can reach the stop line. The first tick it can reach the line on is
+    the first one ending within ARRIVAL_TOLERANCE_S of its arrival or later.
+    """
+    return max(0, math.ceil((arrival - ARRIVAL_TOLERANCE_S - clock) / delta_time) - 1)
+
+
+class ActiveVehicles(list):
+    """
+    List of active vehicle dicts that also carries the running aggregates of the
+    lane index it came from, so strategies can skip recounting the vehicles.
+    """
+
+    def __init__(self, vehicles: Iterable[Dict[str, Any]], lane_queues: "LaneQueues"):
+        super().__init__(vehicles)
+        self.lane_queues = lane_queues
+
+    def summary(self) -> Dict[str, Any]:
+        return self.lane_queues.summary()
+
+
+class LaneQueues:
+    """
+    Index of the active vehicles of the dict engine.
+
+    Approaching vehicles are kept in one heap per lane ordered by the time they
+    reach the stop line. Their positions are not updated tick by tick but follow
+    from the distance and clock they started moving at, and are only written into
+    the vehicle dicts when a state or a strategy needs them. Vehicles stopped at
+    the line are grouped by destination, whose signal decides for all of them, and
+    their waiting time is charged to the group. A tick therefore only touches the
+    heads of the lanes that reach the line and the groups there. The queue length
+    and the vehicle counts by lane, destination and emergency status are kept up
+    to date as vehicles enter and leave.
+    """
+
+    def __init__(self, vehicles: List[Dict[str, Any]]):
+        # Lane -> heap of (arrival time, entry position, vehicle) of approaching vehicles
+        self.lanes: Dict[str, List[Tuple[float, int, Dict[str, Any]]]] = {}
+        # Destination -> vehicles stopped at the line
+        self.waiting: Dict[str, List[Dict[str, Any]]] = {}
+        # Seconds the vehicles of each destination have been held at the line so far
+        self.blocked: Dict[str, int] = {}
+        # Active vehicles by id() in the order they entered
+        self.active: Dict[int, Dict[str, Any]] = {}
+        # Distance and clock an approaching vehicle's position is measured from
+        self.anchors: Dict[int, Tuple[float, float]] = {}
+        # Blocked seconds of its destination when a waiting vehicle stopped, and its stops
+        self.marks: Dict[int, Tuple[int, int]] = {}
+        # Position of every vehicle in the scenario, to keep output in scenario order
+        self.positions: Dict[int, int] = {}
+        self.by_lane: Dict[str, int] = {}
+        self.by_destination: Dict[str, int] = {}
+        self.emergency: Dict[int, Dict[str, Any]] = {}
+        self.entered = 0
+        self.queued = 0
+        # Seconds of movement simulated so far
+        self.clock = 0
+        for vehicle in vehicles:
+            self.add(vehicle)
+
+    def __len__(self) -> int:
+        return len(self.active)
+
+    def add(self, vehicle: Dict[str, Any]):
+        """Index a vehicle that has entered the simulation"""
+        key = id(vehicle)
+        lane_id = vehicle.get("lane_id", "unknown")
+        destination = vehicle.get("destination", "unknown")
+        self.active[key] = vehicle
+        self.positions[key] = self.entered
+        self.entered += 1
+        self.by_lane[lane_id] = self.by_lane.get(lane_id, 0) + 1
+        self.by_destination[destination] = self.by_destination.get(destination, 0) + 1
+        if vehicle.get("emergency_vehicle", False):
+            self.emergency[key] = vehicle
+
+        speed = vehicle["speed_kmh"]
+        distance = vehicle["distance_to_intersection_m"]
+        # Vehicles stopped away from the line never reach it
+        if speed > 0 or distance <= 0:
+            self.anchors[key] = (distance, self.clock)
+            heapq.heappush(self.lanes.setdefault(lane_id, []),
+                           (arrival_time(distance, speed, self.clock), self.positions[key], vehicle))
+        if self._is_queued(vehicle):
+            self.queued += 1
+
+    @staticmethod
+    def _is_queued(vehicle: Dict[str, Any]) -> bool:
+        # Stopped vehicles do not move, so their stored distance is current
+        return vehicle["speed_kmh"] == 0 and vehicle["distance_to_intersection_m"] < QUEUE_DISTANCE_M
+
+    def position(self, vehicle: Dict[str, Any]) -> int:
+        """Order in which the vehicle entered the simulation"""
+        return self.positions[id(vehicle)]
+
+    def _distance(self, vehicle: Dict[str, Any]) -> float:
+        """Current distance of an approaching vehicle to the stop line"""
+        distance, since = self.anchors[id(vehicle)]
+        return distance - vehicle["speed_kmh"] / 3.6 * (self.clock - since)
+
+    def update(self, delta_time: int,
+               can_proceed: Callable[[str, List[Dict[str, Any]]], bool]) -> List[Tuple[Dict[str, Any], int, int]]:
+        """
+        Advance the clock by one tick and process the vehicles at the stop line.
+
+        Args:
+            delta_time: Seconds elapsed since the previous tick
+            can_proceed: Whether the vehicles at the line heading for a destination may pass
+
+        Returns:
+            (vehicle, wait time, stops) of the vehicles that passed, in entry order
+        """
+        self.clock += delta_time
+
+        # Only the heads of each lane can have reached the line
+        arriving: Dict[str, List[Dict[str, Any]]] = {}
+        for heap in self.lanes.values():
+            later = []
+            while heap and heap[0][0] <= self.clock + ARRIVAL_TOLERANCE_S:
+                entry = heapq.heappop(heap)
+                if self._distance(entry[2]) <= 0:
+                    arriving.setdefault(entry[2].get("destination", "unknown"), []).append(entry[2])
+                else:
+                    # Rounding put its arrival time just before this tick
+                    later.append(entry)
+            for entry in later:
+                heapq.heappush(heap, entry)
+
+        passed = []
+        for destination in list(self.waiting) + [key for key in arriving if key not in self.waiting]:
+            waiting = self.waiting.get(destination, [])
+            reached = arriving.get(destination, [])
+            if can_proceed(destination, waiting + reached):
+                blocked = self.blocked.get(destination, 0)
+                for vehicle in waiting:
+                    mark, stops = self.marks[id(vehicle)]
+                    passed.append((vehicle, blocked - mark, stops))
+                passed.extend((vehicle, 0, 0) for vehicle in reached)
+                continue
+
+            # Vehicles that cannot proceed stop at the line and accumulate waiting time
+            self.blocked[destination] = self.blocked.get(destination, 0) + delta_time
+            for vehicle in reached:
+                stops = 1 if vehicle["speed_kmh"] > 0 else 0
+                if not self._is_queued(vehicle):
+                    self.queued += 1
+                vehicle["speed_kmh"] = 0
+                vehicle["distance_to_intersection_m"] = 0
+                del self.anchors[id(vehicle)]
+                self.marks[id(vehicle)] = (self.blocked[destination] - delta_time, stops)
+                self.waiting.setdefault(destination, []).append(vehicle)
+
+        if passed:
+            passed.sort(key=lambda item: self.positions[id(item[0])])
+            self.remove([vehicle for vehicle, _, _ in passed])
+        return passed
+
+    def fast_forward(self, ticks: int, delta_time: int):
+        """Advance the clock over idle ticks, in which the vehicles at the line keep waiting"""
+        self.clock += ticks * delta_time
+        for destination in self.waiting:
+            self.blocked[destination] = self.blocked.get(destination, 0) + ticks * delta_time
+
+    def idle_ticks(self, signal_status: Dict[str, Any], delta_time: int) -> Optional[int]:
+        """
+        Number of upcoming ticks in which no vehicle reaches the stop line or passes,
+        assuming the signals stay as they are (None when no vehicle will ever move).
+        """
+        if any(signal_status.get(destination) == "green" for destination in self.waiting):
+            return 0
+        arrivals = [heap[0][0] for heap in self.lanes.values() if heap]
+        if not arrivals:
+            return None
+        return idle_ticks_before(min(arrivals), self.clock, delta_time)
+
+    def stats(self, vehicle: Dict[str, Any]) -> Tuple[int, int]:
+        """Waiting time and stops of an active vehicle so far"""
+        if id(vehicle) not in self.marks:
+            return 0, 0
+        mark, stops = self.marks[id(vehicle)]
+        return self.blocked.get(vehicle.get("destination", "unknown"), 0) - mark, stops
+
+    def vehicles(self) -> List[Dict[str, Any]]:
+        """The active vehicles in entry order, with their current distances written in"""
+        for key, (distance, since) in self.anchors.items():
+            if since != self.clock:
+                vehicle = self.active[key]
+                vehicle["distance_to_intersection_m"] = distance - vehicle["speed_kmh"] / 3.6 * (self.clock - since)
+        return list(self.active.values())
+
+    def remove(self, vehicles: List[Dict[str, Any]]) -> Set[int]:
+        """
+        Drop vehicles that passed the intersection from the index.
+
+        Returns:
+            The ids of the removed vehicle dicts
+        """
+        removed = {id(vehicle) for vehicle in vehicles}
+        approaching = set()
+        waiting = set()
+        for vehicle in vehicles:
+            key = id(vehicle)
+            lane_id = vehicle.get("lane_id", "unknown")
+            destination = vehicle.get("destination", "unknown")
+            if self._is_queued(vehicle):
+                self.queued -= 1
+            self._decrement(self.by_lane, lane_id)
+            self._decrement(self.by_destination, destination)
+            self.emergency.pop(key, None)
+            del self.active[key]
+            del self.positions[key]
+            if key in self.marks:
+                del self.marks[key]
+                waiting.add(destination)
+            elif self.anchors.pop(key, None) is not None and any(
+                    entry[2] is vehicle for entry in self.lanes.get(lane_id, [])):
+                approaching.add(lane_id)
+
+        # Passed vehicles have left their heap already, others are filtered out
+        for lane_id in approaching:
+            self.lanes[lane_id] = [entry for entry in self.lanes[lane_id] if id(entry[2]) not in removed]
+            heapq.heapify(self.lanes[lane_id])
+        for destination in waiting:
+            queue = [vehicle for vehicle in self.waiting[destination] if id(vehicle) not in removed]
+            if queue:
+                self.waiting[destination] = queue
+            else:
+                del self.waiting[destination]
+        for lane_id in [lane_id for lane_id, heap in self.lanes.items() if not heap]:
+            del self.lanes[lane_id]
+        return removed
+
+    @staticmethod
+    def _decrement(counts: Dict[str, int], key: str):
+        counts[key] -= 1
+        if counts[key] == 0:
+            del counts[key]
+
+    def clear(self):
+        """Drop every vehicle (deadlock recovery)"""
+        self.lanes.clear()
+        self.waiting.clear()
+        self.active.clear()
+        self.anchors.clear()
+        self.marks.clear()
+        self.positions.clear()
+        self.by_lane.clear()
+        self.by_destination.clear()
+        self.emergency.clear()
+        self.queued = 0
+
+    def queue_length(self) -> int:
+        """Number of vehicles stopped within QUEUE_DISTANCE_M of the stop line"""
+        return self.queued
+
+    def summary(self) -> Dict[str, Any]:
+        """Vehicle summary in the format of MultiAgentStrategy.aggregate_vehicles"""
+        return {
+            "total_count": len(self.active),
+            "by_lane": dict(self.by_lane),
+            "by_destination": dict(self.by_destination),
+            "emergency_vehicles": [
+                {
+                    "vehicle_id": vehicle.get("vehicle_id"),
+                    "lane_id": vehicle.get("lane_id", "unknown"),
+                    "destination": vehicle.get("destination", "unknown"),
+                    "priority_level": vehicle.get("emergency_status", {}).get("priority_level", "medium"),
+                    "lights_active": vehicle.get("emergency_status", {}).get("lights_active", False),
+                    "siren_active": vehicle.get("emergency_status", {}).get("siren_active", False)
+                }
+                for vehicle in self.emergency.values()
+            ]
+        }
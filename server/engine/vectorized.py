@@ -0,0 +1,323 @@
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
+
+from engine.lanes import idle_ticks_before
+
+# Passed vehicles are moved away from the stop line at a fixed cruising speed
+PASSED_DISTANCE_M = -10
+PASSED_SPEED_KMH = 33.9
+
+# Which pedestrian crosswalk a left turn has to yield to
+YIELD_NONE = 0
+YIELD_EAST_WEST = 1
+YIELD_NORTH_SOUTH = 2
+
+
+def _yield_group(destination: str) -> int:
+    """Return the crosswalk a movement yields to (Singapore right-hand drive context)"""
+    if "_Left" not in destination:
+        return YIELD_NONE
+    if "Northbound" in destination or "Southbound" in destination:
+        return YIELD_EAST_WEST
+    if "Eastbound" in destination or "Westbound" in destination:
+        return YIELD_NORTH_SOUTH
+    return YIELD_NONE
+
+
+def intern_strings(values: List[str]) -> Tuple[List[str], np.ndarray]:
+    """
+    Map strings to small integers in order of first appearance.
+
+    Returns:
+        The distinct strings and the code of every value
+    """
+    index: Dict[str, int] = {}
+    codes = np.array([index.setdefault(value, len(index)) for value in values], dtype=np.int32)
+    return list(index), codes
+
+
+class VehicleArrays:
+    """
+    Struct-of-arrays store for the vehicles of a simulation run.
+
+    Every active vehicle is a row across parallel NumPy arrays (distance, speed,
+    lane index, destination index, wait time, stops, emergency flag) so that a
+    simulation tick is a handful of vectorized operations instead of a Python
+    loop over vehicle dicts. Like the dict engine's LaneQueues, a moving vehicle's
+    distance is measured from where it was at clock `since`, so both engines
+    compute the same positions. The original vehicle dicts are kept as templates and
+    are only materialized when a state has to be saved or a strategy needs them.
+    """
+
+    def __init__(self, vehicles: List[Dict[str, Any]], passed_vehicles: List[Dict[str, Any]],
+                 debug: bool = False, lanes: Optional[Tuple[List[str], np.ndarray]] = None,
+                 destinations: Optional[Tuple[List[str], np.ndarray]] = None):
+        """
+        Build the arrays from a list of vehicle dicts.
+
+        Args:
+            vehicles: Vehicle dicts in scenario order (owned by the arrays from now on)
+            passed_vehicles: List that passed vehicle records are appended to until they retire
+            debug: Print yielding vehicles like the dict engine does
+            lanes: Interned lane names and per-vehicle codes (computed if None)
+            destinations: Interned destination names and per-vehicle codes (computed if None)
+        """
+        self.debug = debug
+        if lanes is None:
+            lanes = intern_strings([v["lane_id"] for v in vehicles])
+        if destinations is None:
+            destinations = intern_strings([v["destination"] for v in vehicles])
+        self.lane_names: List[str] = list(lanes[0])
+        self.destination_names: List[str] = list(destinations[0])
+        self.destination_yield = np.array(
+            [_yield_group(name) for name in self.destination_names], dtype=np.int8)
+
+        count = len(vehicles)
+        self.templates = np.empty(count, dtype=object)
+        self.templates[:] = vehicles
+        self.origin = np.array(
+            [v["distance_to_intersection_m"] for v in vehicles], dtype=np.float64)
+        self.since = np.zeros(count, dtype=np.float64)
+        # Seconds of movement simulated so far
+        self.clock = 0
+        self.speed = np.array([v["speed_kmh"] for v in vehicles], dtype=np.float64)
+        self.lane = np.array(lanes[1], dtype=np.int32)
+        self.destination = np.array(destinations[1], dtype=np.int32)
+        self.wait = np.zeros(count, dtype=np.int64)
+        self.stops = np.zeros(count, dtype=np.int64)
+        self.emergency = np.array(
+            [bool(v.get("emergency_vehicle", False)) for v in vehicles], dtype=bool)
+
+        # Passed vehicles keep moving away from the intersection
+        self.passed = passed_vehicles
+        self.passed_distance = np.zeros(0, dtype=np.float64)
+        self.passed_speed = np.zeros(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def _signal_masks(self, signal_status: Dict[str, Any], pedestrians: Dict[str, Any]):
+        """Per-destination masks of green signals and of left turns yielding to pedestrians"""
+        green = np.array([signal_status.get(name) == "green" for name in self.destination_names],
+                         dtype=bool)
+        crosswalk_busy = np.array([
+            False,
+            pedestrians.get("crosswalk_east_west", 0) > 0 and
+            signal_status.get("Crosswalk_East_West") == "green",
+            pedestrians.get("crosswalk_north_south", 0) > 0 and
+            signal_status.get("Crosswalk_North_South") == "green",
+        ], dtype=bool)
+        return green, green & crosswalk_busy[self.destination_yield]
+
+    def update(self, signal_status: Dict[str, Any], pedestrians: Dict[str, Any],
+               timestamp: str, delta_time: int) -> List[Dict[str, Any]]:
+        """
+        Advance the clock by one tick and process the vehicles at the stop line.
+
+        Args:
+            signal_status: Current signal status
+            pedestrians: Current pedestrian counts
+            timestamp: ISO timestamp of the current tick
+            delta_time: Seconds elapsed since the previous tick
+
+        Returns:
+            List of passed vehicle records created during this tick
+        """
+        self.clock += delta_time
+        if not len(self.templates):
+            return []
+
+        at_line = self.distance() <= 0
+
+        green, yielding = self._signal_masks(signal_status, pedestrians)
+        proceed = at_line & (green & ~yielding)[self.destination]
+        if self.debug:
+            for index in np.flatnonzero(at_line & yielding[self.destination]):
+                crosswalk = ("crosswalk_east_west"
+                             if self.destination_yield[self.destination[index]] == YIELD_EAST_WEST
+                             else "crosswalk_north_south")
+                print(
+                    f"Vehicle {self.templates[index]['vehicle_id']} yielding to pedestrians at {crosswalk}")
+        stopped = at_line & ~proceed
+
+        # Vehicles that cannot proceed stop at the line and accumulate waiting time
+        self.stops += stopped & (self.speed > 0)
+        self.speed[stopped] = 0
+        self.wait[stopped] += delta_time
+        self.origin[stopped] = 0
+        self.since[stopped] = self.clock
+
+        if not proceed.any():
+            return []
+
+        passed_index = np.flatnonzero(proceed)
+        passed = [
+            {
+                "vehicle_id": vehicle["vehicle_id"],
+                "vehicle_type": vehicle["vehicle_type"],
+                "lane_id": vehicle["lane_id"],
+                "destination": vehicle["destination"],
+                "distance_to_intersection_m": PASSED_DISTANCE_M,
+                "timestamp": timestamp,
+                "estimated_arrival_time": timestamp,
+                "emergency_vehicle": vehicle["emergency_vehicle"],
+                "speed_kmh": PASSED_SPEED_KMH,
+                "wait_time": wait,
+                "speed": speed,
+                "stops": stops
+            }
+            for vehicle, wait, speed, stops in zip(
+                self.templates[passed_index],
+                self.wait[passed_index].tolist(),
+                self.speed[passed_index].tolist(),
+                self.stops[passed_index].tolist())
+        ]
+        if self.debug:
+            for record in passed:
+                print(
+                    f"Vehicle {record['vehicle_id']} passed through intersection via {record['destination']} at speed {record['speed']} km/h")
+
+        self.passed.extend(passed)
+        self.passed_distance = np.concatenate(
+            [self.passed_distance, np.full(len(passed), PASSED_DISTANCE_M, dtype=np.float64)])
+        self.passed_speed = np.concatenate(
+            [self.passed_speed, np.full(len(passed), PASSED_SPEED_KMH, dtype=np.float64)])
+        self._keep(~proceed)
+        return passed
+
+    def add(self, vehicles: List[Dict[str, Any]]):
+        """Append vehicles that entered the simulation after it started"""
+        if not vehicles:
+            return
+        lane_index = {name: index for index, name in enumerate(self.lane_names)}
+        destination_index = {name: index for index, name in enumerate(self.destination_names)}
+        lanes = [lane_index.setdefault(v["lane_id"], len(lane_index)) for v in vehicles]
+        destinations = [destination_index.setdefault(v["destination"], len(destination_index))
+                        for v in vehicles]
+        if len(destination_index) > len(self.destination_names):
+            self.destination_yield = np.array(
+                [_yield_group(name) for name in destination_index], dtype=np.int8)
+        self.lane_names = list(lane_index)
+        self.destination_names = list(destination_index)
+
+        templates = np.empty(len(vehicles), dtype=object)
+        templates[:] = vehicles
+        self.templates = np.concatenate([self.templates, templates])
+        self.origin = np.concatenate([self.origin, np.array(
+            [v["distance_to_intersection_m"] for v in vehicles], dtype=np.float64)])
+        self.since = np.concatenate([self.since, np.full(len(vehicles), self.clock, dtype=np.float64)])
+        self.speed = np.concatenate([self.speed, np.array(
+            [v["speed_kmh"] for v in vehicles], dtype=np.float64)])
+        self.lane = np.concatenate([self.lane, np.array(lanes, dtype=np.int32)])
+        self.destination = np.concatenate([self.destination, np.array(destinations, dtype=np.int32)])
+        self.wait = np.concatenate([self.wait, np.zeros(len(vehicles), dtype=np.int64)])
+        self.stops = np.concatenate([self.stops, np.zeros(len(vehicles), dtype=np.int64)])
+        self.emergency = np.concatenate([self.emergency, np.array(
+            [bool(v.get("emergency_vehicle", False)) for v in vehicles], dtype=bool)])
+
+    def _keep(self, mask: np.ndarray):
+        """Drop the rows of every active-vehicle array that are not in the mask"""
+        self.templates = self.templates[mask]
+        self.origin = self.origin[mask]
+        self.since = self.since[mask]
+        self.speed = self.speed[mask]
+        self.lane = self.lane[mask]
+        self.destination = self.destination[mask]
+        self.wait = self.wait[mask]
+        self.stops = self.stops[mask]
+        self.emergency = self.emergency[mask]
+
+    def distance(self) -> np.ndarray:
+        """Current distance of every active vehicle to the stop line"""
+        return self.origin - self.speed / 3.6 * (self.clock - self.since)
+
+    def advance_passed(self, delta_time: int):
+        """Move passed vehicles further away from the intersection"""
+        self.passed_distance -= self.passed_speed / 3.6 * delta_time
+
+    def retire_passed(self, radius: float) -> List[Dict[str, Any]]:
+        """
+        Drop the passed vehicles beyond the radius (ordered by distance, furthest first).
+
+        Returns:
+            Their records, with their final distance written back
+        """
+        count = int(np.searchsorted(self.passed_distance, -radius))
+        if not count:
+            return []
+        retired = self.passed[:count]
+        for vehicle, distance in zip(retired, self.passed_distance[:count].tolist()):
+            vehicle["distance_to_intersection_m"] = distance
+        del self.passed[:count]
+        self.passed_distance = self.passed_distance[count:]
+        self.passed_speed = self.passed_speed[count:]
+        return retired
+
+    def queue_length(self) -> int:
+        """Number of vehicles stopped within 50m of the intersection"""
+        return int(np.count_nonzero((self.speed == 0) & (self.origin < 50)))
+
+    def vehicle_dicts(self) -> List[Dict[str, Any]]:
+        """Materialize the active vehicles as dicts in the dict engine's format"""
+        vehicles = list(map(dict.copy, self.templates))
+        for vehicle, speed, distance in zip(vehicles, self.speed.tolist(), self.distance().tolist()):
+            vehicle["speed_kmh"] = speed
+            vehicle["distance_to_intersection_m"] = distance
+        return vehicles
+
+    def passed_dicts(self) -> List[Dict[str, Any]]:
+        """Copies of the passed vehicle records that are not retired, with their current distance"""
+        vehicles = list(map(dict.copy, self.passed))
+        for vehicle, distance in zip(vehicles, self.passed_distance.tolist()):
+            vehicle["distance_to_intersection_m"] = distance
+        return vehicles
+
+    def sync_passed(self):
+        """Write the current distances back into the passed vehicle records"""
+        for vehicle, distance in zip(self.passed, self.passed_distance.tolist()):
+            vehicle["distance_to_intersection_m"] = distance
+
+    def force_pass(self, timestamp: str) -> List[Dict[str, Any]]:
+        """Move every remaining vehicle to the passed list (deadlock recovery)"""
+        self.sync_passed()
+        forced = [
+            {
+                "vehicle_id": vehicle["vehicle_id"],
+                "vehicle_type": vehicle["vehicle_type"],
+                "lane_id": vehicle["lane_id"],
+                "destination": vehicle["destination"],
+                "timestamp": timestamp,
+                "wait_time": wait,
+                "stops": stops
+            }
+            for vehicle, wait, stops in zip(
+                self.templates, self.wait.tolist(), self.stops.tolist())
+        ]
+        self.passed.extend(forced)
+        self._keep(np.zeros(len(self.templates), dtype=bool))
+        return forced
+
+    def idle_ticks(self, signal_status: Dict[str, Any], delta_time: int):
+        """
+        Number of upcoming ticks in which no vehicle reaches the stop line or passes,
+        assuming the signals stay as they are (None when no vehicle will ever move).
+        """
+        green = np.array([signal_status.get(name) == "green" for name in self.destination_names],
+                         dtype=bool)
+        waiting = (self.speed == 0) & (self.origin <= 0)
+        if (waiting & green[self.destination]).any():
+            return 0
+
+        moving = self.speed > 0
+        if not moving.any():
+            return None
+        arrival = self.since[moving] + self.origin[moving] / (self.speed[moving] / 3.6)
+        return idle_ticks_before(float(arrival.min()), self.clock, delta_time)
+
+    def fast_forward(self, ticks: int, delta_time: int):
+        """Advance the clock and waiting times over idle ticks in closed form"""
+        self.clock += ticks * delta_time
+        waiting = (self.speed == 0) & (self.origin <= 0)
+        self.origin[waiting] = 0
+        self.wait[waiting] += ticks * delta_time
+        self.passed_distance -= ticks * (self.passed_speed / 3.6 * delta_time)
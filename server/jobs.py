@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Callable, Optional
+
+# Lifecycle of a job
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = [COMPLETED, FAILED, CANCELLED]
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once its cancellation was requested"""
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while every worker and queue slot is taken"""
+
+
+class Job:
+    """A unit of work run by the JobQueue, with its progress and result"""
+
+    def __init__(self, job_id: str, description: Dict[str, Any]):
+        self.id = job_id
+        self.description = description
+        self.status = QUEUED
+        self.progress: Dict[str, Any] = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        self.future = None
+
+    def report(self, **progress):
+        """
+        Update the progress of a running job.
+        Raises JobCancelled once the job has been asked to stop.
+        """
+        self.progress.update(progress)
+        if self.cancel_requested.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Status of the job for the API (without the result)"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            **self.description
+        }
+
+
+class JobQueue:
+    """
+    Bounded pool of worker threads that runs submitted jobs in the background.
+
+    At most max_workers jobs run at the same time and at most max_pending more
+    wait for a worker; further submissions are rejected with QueueFull so the
+    server stays responsive under load. Finished jobs are kept (oldest dropped
+    first) so their status and result can still be fetched.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 8, max_finished: int = 100):
+        """
+        Args:
+            max_workers: Number of jobs that run concurrently
+            max_pending: Number of jobs that may wait for a worker
+            max_finished: Number of finished jobs whose results are kept
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, function: Callable[[Job], Any], description: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        Queue function(job) to run on a worker; its return value becomes the job result.
+
+        Raises:
+            QueueFull: If max_workers jobs are running and max_pending are waiting
+        """
+        with self.lock:
+            active = sum(1 for job in self.jobs.values() if job.status not in FINISHED)
+            if active >= self.max_workers + self.max_pending:
+                raise QueueFull(f"{active} jobs are already queued or running")
+            job = Job(uuid.uuid4().hex, description or {})
+            self.jobs[job.id] = job
+            self._prune()
+        job.future = self.executor.submit(self._run, job, function)
+        return job
+
+    def _run(self, job: Job, function: Callable[[Job], Any]):
+        """Run a job on a worker thread and record its outcome"""
+        if job.cancel_requested.is_set():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = function(job)
+            job.status = COMPLETED
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job by ID, or None if it is unknown or was dropped"""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        """All known jobs, oldest first"""
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job. A queued job is cancelled right away; a running job stops at
+        its next progress report. Finished jobs are left as they are.
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job.cancel_requested.set()
+        if job.future is not None and job.future.cancel():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        return job
+
+    def _prune(self):
+        """Drop the oldest finished jobs beyond max_finished"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of jobs per status and the configured limits"""
+        with self.lock:
+            counts = {status: 0 for status in [QUEUED, RUNNING] + FINISHED}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+        return {"max_workers": self.max_workers, "max_pending": self.max_pending, **counts}
+
+    def shutdown(self):
+        """Cancel every unfinished job and stop the workers"""
+        for job in self.list():
+            self.cancel(job.id)
+        self.executor.shutdown(wait=True)
+
+
+_job_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Process-wide job queue for simulation runs, configured from environment variables:
+
+    SIMULATION_WORKERS (concurrent runs), SIMULATION_MAX_PENDING, SIMULATION_MAX_FINISHED
+    """
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            max_workers=int(os.environ.get("SIMULATION_WORKERS", 2)),
+            max_pending=int(os.environ.get("SIMULATION_MAX_PENDING", 8)),
+            max_finished=int(os.environ.get("SIMULATION_MAX_FINISHED", 100))
+        )
+    return _job_queue
@@ -0,0 +1,508 @@
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+from simulator import TrafficSimulator, STEP_SECONDS
+
+# Approach headings in clockwise order
+HEADINGS = ["Northbound", "Eastbound", "Southbound", "Westbound"]
+
+# Grid offset (row, column) of the next intersection for each heading
+HEADING_OFFSETS = {
+    "Northbound": (-1, 0),
+    "Eastbound": (0, 1),
+    "Southbound": (1, 0),
+    "Westbound": (0, -1),
+}
+
+# Share of vehicles taking each movement at the next intersection
+DEFAULT_TURN_RATIOS = {"Straight": 0.7, "Left": 0.15, "Right": 0.15}
+
+# Where and how fast vehicles coming off a road segment enter the next intersection
+ENTRY_DISTANCE_M = 150
+ENTRY_SPEED_KMH = 40
+
+DEFAULT_TRAVEL_TIME_SECONDS = 30
+
+
+def exit_heading(movement: str) -> str:
+    """
+    Heading of a vehicle after a movement. Traffic drives on the left (Singapore),
+    so a left turn turns anticlockwise and a right turn clockwise.
+    """
+    heading, _, turn = movement.partition("_")
+    index = HEADINGS.index(heading)
+    if turn == "Left":
+        index -= 1
+    elif turn == "Right":
+        index += 1
+    return HEADINGS[index % len(HEADINGS)]
+
+
+def build_grid_network(rows: int, columns: int, scenario: str, strategy: str = "set_interval",
+                       travel_time_seconds: float = DEFAULT_TRAVEL_TIME_SECONDS) -> Dict[str, Any]:
+    """
+    Network description of a rows x columns grid of intersections, each linked to its
+    neighbours by a road segment in every direction.
+
+    Args:
+        rows: Number of intersection rows
+        columns: Number of intersection columns
+        scenario: Scenario file each intersection starts from
+        strategy: Signal strategy of every intersection
+        travel_time_seconds: Travel time between neighbouring intersections
+
+    Returns:
+        Network description for NetworkSimulator
+    """
+    intersections = []
+    roads = []
+    for row in range(rows):
+        for column in range(columns):
+            intersection_id = f"r{row}c{column}"
+            intersections.append({"id": intersection_id, "scenario": scenario, "strategy": strategy})
+            for heading, (row_offset, column_offset) in HEADING_OFFSETS.items():
+                next_row, next_column = row + row_offset, column + column_offset
+                if 0 <= next_row < rows and 0 <= next_column < columns:
+                    roads.append({
+                        "from": intersection_id,
+                        "to": f"r{next_row}c{next_column}",
+                        "heading": heading,
+                        "travel_time_seconds": travel_time_seconds
+                    })
+    return {"intersections": intersections, "roads": roads}
+
+
+def build_corridor_network(length: int, scenario: str, strategy: str = "set_interval",
+                           travel_time_seconds: float = DEFAULT_TRAVEL_TIME_SECONDS) -> Dict[str, Any]:
+    """Network description of an east-west corridor of intersections"""
+    return build_grid_network(1, length, scenario, strategy, travel_time_seconds)
+
+
+def validate_network(network: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check a network description and fill in the defaults.
+
+    Raises:
+        ValueError: If the description is inconsistent
+    """
+    intersections = network.get("intersections") or []
+    if not intersections:
+        raise ValueError("Network has no intersections")
+    ids = [intersection["id"] for intersection in intersections]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Intersection IDs must be unique")
+
+    roads = []
+    seen = set()
+    for road in network.get("roads", []):
+        if road["from"] not in ids or road["to"] not in ids:
+            raise ValueError(f"Road {road['from']} -> {road['to']} links an unknown intersection")
+        if road["heading"] not in HEADINGS:
+            raise ValueError(f"Unknown heading: {road['heading']}")
+        if (road["from"], road["heading"]) in seen:
+            raise ValueError(f"Intersection {road['from']} has two {road['heading']} roads")
+        seen.add((road["from"], road["heading"]))
+        travel_time = road.get("travel_time_seconds", DEFAULT_TRAVEL_TIME_SECONDS)
+        if travel_time < STEP_SECONDS:
+            raise ValueError(f"Road travel times must be at least one step ({STEP_SECONDS}s)")
+        roads.append({
+            "from": road["from"],
+            "to": road["to"],
+            "heading": road["heading"],
+            "travel_time_seconds": travel_time,
+            "speed_kmh": road.get("speed_kmh", ENTRY_SPEED_KMH),
+            "turn_ratios": road.get("turn_ratios", network.get("turn_ratios", DEFAULT_TURN_RATIOS))
+        })
+    return {
+        "intersections": [
+            {"strategy": network.get("strategy", "set_interval"), **intersection}
+            for intersection in intersections
+        ],
+        "roads": roads,
+        "seed": network.get("seed", 0)
+    }
+
+
+def partition_intersections(intersection_ids: List[str], workers: int) -> List[List[str]]:
+    """
+    Split the intersections into contiguous blocks, one per worker. Neighbouring
+    intersections of a grid or corridor usually share a block, which keeps most
+    road segments inside a worker.
+    """
+    workers = max(1, min(workers, len(intersection_ids)))
+    size, extra = divmod(len(intersection_ids), workers)
+    blocks = []
+    start = 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        blocks.append(intersection_ids[start:end])
+        start = end
+    return blocks
+
+
+class NetworkPartition:
+    """
+    The intersections simulated by one worker. Vehicles that pass an intersection are
+    routed onto the outgoing road segment of their exit heading; vehicles arriving
+    from road segments wait until their arrival time before entering.
+    """
+
+    def __init__(self, network: Dict[str, Any], intersection_ids: List[str], network_dir: str,
+                 simulator_options: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            network: Validated network description
+            intersection_ids: Intersections simulated by this partition
+            network_dir: Directory the per-intersection experiments are written to
+            simulator_options: Extra TrafficSimulator keyword arguments
+        """
+        self.seed = network["seed"]
+        self.roads = {(road["from"], road["heading"]): road for road in network["roads"]}
+        specs = {intersection["id"]: intersection for intersection in network["intersections"]}
+        self.simulators: Dict[str, TrafficSimulator] = {}
+        # Records of the vehicles that passed each intersection and are not routed yet
+        self.passed: Dict[str, List[Dict[str, Any]]] = {}
+        for intersection_id in intersection_ids:
+            spec = specs[intersection_id]
+            self.passed[intersection_id] = []
+            self.simulators[intersection_id] = TrafficSimulator(
+                spec["scenario"], strategy=spec["strategy"],
+                experiment_dir=os.path.join(network_dir, intersection_id),
+                on_passed=self.passed[intersection_id].extend,
+                **(simulator_options or {}))
+        self.start_times = {key: simulator.timestamp for key, simulator in self.simulators.items()}
+        # Arrivals per intersection as a heap of (arrival seconds, vehicle ID, vehicle)
+        self.pending: Dict[str, List[Tuple[float, str, Dict[str, Any]]]] = {
+            key: [] for key in self.simulators}
+        # Network bookkeeping of the vehicles currently at each intersection
+        self.carried: Dict[str, Dict[str, Dict[str, Any]]] = {key: {} for key in self.simulators}
+        self.steps = 0
+
+    def deliver(self, arrivals: List[Tuple[str, float, Dict[str, Any]]]):
+        """Queue vehicles arriving from road segments as (intersection, arrival seconds, vehicle)"""
+        for intersection_id, arrival, vehicle in arrivals:
+            heapq.heappush(self.pending[intersection_id], (arrival, vehicle["vehicle_id"], vehicle))
+
+    def advance(self, steps: int) -> Tuple[List[Tuple[str, float, Dict[str, Any]]], List[Dict[str, Any]]]:
+        """
+        Simulate every intersection of the partition for a number of steps.
+
+        Returns:
+            Vehicles sent onto road segments as (intersection, arrival seconds, vehicle)
+            and the records of vehicles that left the network
+        """
+        transfers = []
+        exits = []
+        for _ in range(steps):
+            self.steps += 1
+            elapsed = self.steps * STEP_SECONDS
+            for intersection_id, simulator in self.simulators.items():
+                self._enter_arrivals(intersection_id, simulator, elapsed)
+                simulator.advance(STEP_SECONDS)
+                self._route_passed(intersection_id, simulator, elapsed, transfers, exits)
+        return transfers, exits
+
+    def _enter_arrivals(self, intersection_id: str, simulator: TrafficSimulator, elapsed: float):
+        """Add the vehicles that reach the intersection during the coming step"""
+        pending = self.pending[intersection_id]
+        entering = []
+        while pending and pending[0][0] <= elapsed:
+            arrival, _, vehicle = heapq.heappop(pending)
+            carried = vehicle.pop("network")
+            self.carried[intersection_id][vehicle["vehicle_id"]] = carried
+            vehicle["estimated_arrival_time"] = (
+                self.start_times[intersection_id] + timedelta(seconds=arrival)).isoformat()
+            entering.append(vehicle)
+        if entering:
+            simulator.add_vehicles(entering)
+
+    def _route_passed(self, intersection_id: str, simulator: TrafficSimulator, elapsed: float,
+                      transfers: List, exits: List):
+        """Send the vehicles that passed the intersection on to the next one or out of the network"""
+        passed = list(self.passed[intersection_id])
+        self.passed[intersection_id].clear()
+        for record in passed:
+            # Scenario vehicles get a network-wide ID when they first leave their intersection
+            carried = self.carried[intersection_id].pop(record["vehicle_id"], None) or {
+                "vehicle_id": f"{intersection_id}:{record['vehicle_id']}",
+                "origin": intersection_id,
+                "hops": 0,
+                "wait_time": 0,
+                "stops": 0
+            }
+            carried = {
+                **carried,
+                "hops": carried["hops"] + 1,
+                "wait_time": carried["wait_time"] + record.get("wait_time", 0),
+                "stops": carried["stops"] + record.get("stops", 0)
+            }
+            road = self.roads.get((intersection_id, exit_heading(record["destination"])))
+            if road is None:
+                exits.append({**carried, "vehicle_type": record["vehicle_type"],
+                              "exit": intersection_id, "exit_seconds": elapsed})
+                continue
+
+            # Same turn choice for the vehicle no matter how the network is partitioned
+            rng = random.Random(f"{self.seed}:{carried['vehicle_id']}:{carried['hops']}")
+            turn = rng.choices(list(road["turn_ratios"]), weights=list(road["turn_ratios"].values()))[0]
+            movement = f"{road['heading']}_{turn}"
+            transfers.append((road["to"], elapsed + road["travel_time_seconds"], {
+                "vehicle_id": carried["vehicle_id"],
+                "lane_id": movement,
+                "speed_kmh": road["speed_kmh"],
+                "distance_to_intersection_m": ENTRY_DISTANCE_M,
+                "destination": movement,
+                "vehicle_type": record["vehicle_type"],
+                "emergency_vehicle": record.get("emergency_vehicle", False),
+                "network": carried
+            }))
+
+    def active(self) -> bool:
+        """Whether any intersection still has vehicles or pedestrians, or is expecting arrivals"""
+        return any(self.pending.values()) or not all(
+            simulator._is_simulation_complete() for simulator in self.simulators.values())
+
+    def vehicle_count(self) -> int:
+        """Vehicles approaching the intersections of the partition or about to enter them"""
+        return sum(simulator._active_count() for simulator in self.simulators.values()) + sum(
+            len(pending) for pending in self.pending.values())
+
+    def finish(self) -> Dict[str, Dict[str, Any]]:
+        """Save the results of every intersection and return their metrics"""
+        return {key: simulator.finish()[1] for key, simulator in self.simulators.items()}
+
+    def handle(self, command: str, *args):
+        """Run a coordinator command (see NetworkSimulator)"""
+        if command == "advance":
+            arrivals, steps = args
+            self.deliver(arrivals)
+            transfers, exits = self.advance(steps)
+            return transfers, exits, self.active(), self.vehicle_count()
+        if command == "finish":
+            return self.finish()
+        raise ValueError(f"Unknown command: {command}")
+
+
+def _partition_worker(connection, network, intersection_ids, network_dir, simulator_options):
+    """Serve coordinator commands for one partition (executed in a worker process)"""
+    try:
+        partition = NetworkPartition(network, intersection_ids, network_dir, simulator_options)
+        connection.send(("ok", None))
+    except Exception as e:
+        connection.send(("error", str(e)))
+        return
+    while True:
+        command, args = connection.recv()
+        if command == "close":
+            break
+        try:
+            connection.send(("ok", partition.handle(command, *args)))
+        except Exception as e:
+            connection.send(("error", str(e)))
+    connection.close()
+
+
+class _LocalChannel:
+    """Runs a partition in the coordinator process"""
+
+    def __init__(self, *partition_args):
+        self.partition = NetworkPartition(*partition_args)
+        self.reply = None
+
+    def send(self, command: str, *args):
+        self.reply = self.partition.handle(command, *args)
+
+    def receive(self):
+        return self.reply
+
+    def close(self):
+        pass
+
+
+class _ProcessChannel:
+    """Runs a partition in a worker process connected by a pipe"""
+
+    def __init__(self, *partition_args):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_partition_worker, args=(child, *partition_args), daemon=True)
+        self.process.start()
+        child.close()
+        self.receive()
+
+    def send(self, command: str, *args):
+        self.connection.send((command, args))
+
+    def receive(self):
+        status, value = self.connection.recv()
+        if status == "error":
+            raise RuntimeError(f"Network worker failed: {value}")
+        return value
+
+    def close(self):
+        if self.process.is_alive():
+            self.connection.send(("close", ()))
+        self.process.join()
+
+
+class NetworkSimulator:
+    """
+    Simulates a network of intersections linked by road segments, where the vehicles
+    discharged by one intersection arrive at the next one after the segment's travel
+    time.
+
+    The intersections are split across worker processes that advance in lockstep
+    epochs. An epoch is never longer than the shortest travel time, so a vehicle
+    leaving an intersection during an epoch cannot arrive anywhere before the next
+    barrier, where the coordinator hands it to the worker owning its destination.
+    Results are the same for any number of workers.
+    """
+
+    def __init__(self, network: Dict[str, Any], workers: int = 1, network_dir: Optional[str] = None,
+                 simulator_options: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            network: Network description (see build_grid_network)
+            workers: Number of worker processes (1 simulates in this process)
+            network_dir: Directory for the per-intersection experiments and the network summary
+            simulator_options: Extra TrafficSimulator keyword arguments for every intersection
+        """
+        simulator_options = simulator_options or {}
+        if simulator_options.get("mode", "tick") != "tick":
+            raise ValueError("Network simulations only support the tick mode")
+        self.network = validate_network(network)
+        self.workers = workers
+        self.simulator_options = simulator_options
+        self.network_dir = network_dir or f"experiments/network_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        os.makedirs(self.network_dir, exist_ok=True)
+
+        ids = [intersection["id"] for intersection in self.network["intersections"]]
+        self.partitions = partition_intersections(ids, workers)
+        self.owner = {intersection_id: index
+                      for index, block in enumerate(self.partitions) for intersection_id in block}
+        travel_times = [road["travel_time_seconds"] for road in self.network["roads"]]
+        # Lookahead: no vehicle can reach another intersection within one epoch
+        self.epoch_steps = int(min(travel_times) // STEP_SECONDS) if travel_times else 100
+
+    def run(self, max_steps: int = 1000, progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+        """
+        Run the network until it is empty or max_steps steps have passed.
+        progress(step, vehicles) is called at every barrier.
+
+        Returns:
+            Dict with the network directory, network-wide metrics and the metrics of
+            every intersection
+        """
+        start = time.perf_counter()
+        channel_type = _LocalChannel if len(self.partitions) == 1 else _ProcessChannel
+        channels = []
+        try:
+            for block in self.partitions:
+                channels.append(channel_type(
+                    self.network, block, self.network_dir, self.simulator_options))
+
+            step = 0
+            arrivals = [[] for _ in channels]
+            exits = []
+            in_transit = 0
+            vehicles = 0
+            while step < max_steps:
+                steps = min(self.epoch_steps, max_steps - step)
+                for channel, inbound in zip(channels, arrivals):
+                    channel.send("advance", inbound, steps)
+                step += steps
+
+                arrivals = [[] for _ in channels]
+                active = False
+                vehicles = 0
+                for channel in channels:
+                    transfers, left, partition_active, partition_vehicles = channel.receive()
+                    for transfer in transfers:
+                        arrivals[self.owner[transfer[0]]].append(transfer)
+                    exits.extend(left)
+                    active = active or partition_active
+                    vehicles += partition_vehicles
+                in_transit = sum(len(inbound) for inbound in arrivals)
+                if progress is not None:
+                    progress(step, vehicles + in_transit)
+                if not active and not in_transit:
+                    break
+
+            for channel in channels:
+                channel.send("finish")
+            intersections = {}
+            for channel in channels:
+                intersections.update(channel.receive())
+        finally:
+            for channel in channels:
+                channel.close()
+
+        metrics = {
+            "steps": step,
+            "simulated_seconds": step * STEP_SECONDS,
+            "intersections": len(self.owner),
+            "workers": len(self.partitions),
+            "epoch_steps": self.epoch_steps,
+            "vehicles_exited": len(exits),
+            "vehicles_in_transit": in_transit,
+            "vehicles_remaining": vehicles,
+            "average_hops": _average([vehicle["hops"] for vehicle in exits]),
+            "average_network_wait_time": _average([vehicle["wait_time"] for vehicle in exits]),
+            "average_network_stops": _average([vehicle["stops"] for vehicle in exits]),
+            "elapsed_seconds": round(time.perf_counter() - start, 3)
+        }
+        result = {"network_dir": self.network_dir, "metrics": metrics, "intersections": intersections}
+        with open(f"{self.network_dir}/network.json", "w") as file:
+            json.dump({**result, "network": self.network}, file, indent=2)
+        with open(f"{self.network_dir}/exits.json", "w") as file:
+            json.dump(exits, file, indent=2)
+        return result
+
+
+def _average(values: List[float]) -> float:
+    return round(sum(values) / len(values), 2) if values else 0
+
+
+def parse_arguments() -> argparse.Namespace:
+    # Setup command-line argument parsing
+    parser = argparse.ArgumentParser(
+        description="Simulate a corridor or grid of linked intersections across worker processes"
+    )
+    parser.add_argument("--network", help="Network description JSON file")
+    parser.add_argument("--grid", default="1x3",
+                        help="Grid size as ROWSxCOLUMNS when no network file is given (e.g. 10x10)")
+    parser.add_argument("--scenario", default="scenarios/scenario1.json",
+                        help="Scenario every grid intersection starts from")
+    parser.add_argument("--strategy", default="set_interval", help="Strategy of every grid intersection")
+    parser.add_argument("--travel_time", type=float, default=DEFAULT_TRAVEL_TIME_SECONDS,
+                        help="Travel time between grid intersections in seconds")
+    parser.add_argument("--max_steps", type=int, default=1000, help="Maximum simulation steps")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes")
+    parser.add_argument("--engine", default="dict", choices=["dict", "numpy"], help="Vehicle engine")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    if args.network:
+        with open(args.network) as file:
+            network = json.load(file)
+    else:
+        rows, _, columns = args.grid.partition("x")
+        network = build_grid_network(int(rows), int(columns), args.scenario, args.strategy, args.travel_time)
+
+    # Stream states to disk so large grids do not keep every state in memory
+    simulator = NetworkSimulator(network, workers=args.workers,
+                                 simulator_options={"engine": args.engine, "stream_states": True})
+    result = simulator.run(max_steps=args.max_steps)
+    for key, value in result["metrics"].items():
+        print(f"{key}: {value}")
+    print(f"Network simulation complete. Results saved to {result['network_dir']}")
@@ -0,0 +1,18 @@
+from flask import Blueprint, Response
+
+from jobs import get_job_queue, RUNNING
+from utils.profiling import render_prometheus
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text exposition of the simulator profiles (totals over profiled runs,
+    live tick counts of the running ones) and the progress of running jobs
+    """
+    job_queue = get_job_queue()
+    running = [job.to_dict() for job in job_queue.list() if job.status == RUNNING]
+    return Response(render_prometheus(job_queue.stats(), running),
+                    mimetype="text/plain; version=0.0.4")
@@ -1,13 +1,26 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 import os
 import json
-from simulator import TrafficSimulator
+from concurrent.futures import CancelledError
+from datetime import datetime
+from simulator import TrafficSimulator, RENDER_RADIUS_M
+from sweep import build_grid, run_sweep
+from jobs import get_job_queue, QueueFull, COMPLETED, FAILED, CANCELLED
+from utils.state_index import open_experiment
+from utils.scenario_cache import load_scenario, validate_scenario
 
 simulator_bp = Blueprint('simulator', __name__, url_prefix='/api')
 
 # Directory for storing scenarios
 SCENARIOS_DIR = "scenarios"
 
+# Number of states per page of /api/experiments/<experiment_id>/states
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Worker processes a sweep requested over HTTP may use
+MAX_SWEEP_WORKERS = 4
+
 
 @simulator_bp.route('/scenarios', methods=['POST'])
 def add_scenario():
@@ -44,6 +57,9 @@ def add_scenario():
             # If data is provided as a string, parse it
             scenario_data = json.loads(scenario_data)
 
+        # Reject scenarios the simulator cannot run
+        validate_scenario(scenario_data)
+
         # Write scenario to file
         with open(scenario_path, 'w') as file:
             json.dump(scenario_data, file, indent=2)
@@ -55,6 +71,8 @@ def add_scenario():
         })
     except json.JSONDecodeError:
         return jsonify({"error": "Invalid JSON data provided"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to save scenario: {str(e)}"}), 500
 
@@ -62,8 +80,18 @@ def add_scenario():
 @simulator_bp.route('/run', methods=['POST'])
 def run_simulation():
     """
-    Run a simulation with a stored scenario file and selected strategy
+    Queue a simulation of a stored scenario file with the selected strategy and return
+    its job ID right away (poll /api/jobs/<job_id> and fetch /api/jobs/<job_id>/result,
+    or pass 'wait': true to get the result in this response)
     Expected request format: JSON with 'scenario' and 'strategy' fields
+    and optional 'engine' ('dict' or 'numpy'), 'mode' ('tick' or 'event'), 'stream_states'
+    and 'strategy_options' (e.g. multi_agent 'deadline_seconds', 'fallback' and
+    'use_decision_cache') fields.
+    'render_radius' sets how far past the stop line passed vehicles stay in the states (null keeps all)
+    and 'columnar': true also writes the run as Parquet tables; with 'timed_arrivals': true vehicles
+    enter at their estimated arrival time instead of all being present at the start.
+    'profile': true records per-phase timings in profile.json and on /metrics (default from the
+    SIMULATION_PROFILE environment variable)
     """
     if not request.is_json:
         return jsonify({"error": "Request must be JSON"}), 400
@@ -81,8 +109,18 @@ def run_simulation():
 
     # Get strategy, default to set_interval
     strategy = data.get('strategy', 'set_interval')
-    if strategy not in ['set_interval', 'multi_agent']:
-        return jsonify({"error": "Invalid strategy. Choose 'set_interval' or 'multi_agent'"}), 400
+    if strategy not in ['set_interval', 'multi_agent', 'max_pressure']:
+        return jsonify({"error": "Invalid strategy. Choose 'set_interval', 'multi_agent' or 'max_pressure'"}), 400
+
+    # Get vehicle engine, default to dict
+    engine = data.get('engine', 'dict')
+    if engine not in ['dict', 'numpy']:
+        return jsonify({"error": "Invalid engine. Choose 'dict' or 'numpy'"}), 400
+
+    # Get time advance mode, default to fixed ticks
+    mode = data.get('mode', 'tick')
+    if mode not in ['tick', 'event']:
+        return jsonify({"error": "Invalid mode. Choose 'tick' or 'event'"}), 400
 
     # Construct full scenario path
     scenario_path = os.path.join(SCENARIOS_DIR, scenario_name)
@@ -92,28 +130,248 @@ def run_simulation():
     # Get optional parameters
     debug = data.get('debug', False)
     max_steps = data.get('max_steps', 10000)
+    stream_states = data.get('stream_states', False)
+    strategy_options = data.get('strategy_options', {})
+    render_radius = data.get('render_radius', RENDER_RADIUS_M)
+    columnar = data.get('columnar', False)
+    timed_arrivals = data.get('timed_arrivals', False)
+    profile = data.get('profile', os.environ.get('SIMULATION_PROFILE', '0') == '1')
 
+    # Parse and validate the scenario once; the simulator reuses the cached compiled form
     try:
-        # Load the scenario data
-        with open(scenario_path, 'r') as file:
-            scenario_data = json.load(file)
+        load_scenario(scenario_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Run simulation
+    def run_job(job):
+        # Run simulation (parallel jobs each get their own experiment directory)
         simulator = TrafficSimulator(
-            scenario_path, strategy=strategy, debug=debug)
-        experiment_dir, metrics, states = simulator.run(max_steps=max_steps)
-
-        # Extract experiment ID from the full path
-        experiment_id = os.path.basename(experiment_dir)
+            scenario_path, strategy=strategy, debug=debug, engine=engine,
+            stream_states=stream_states, mode=mode, strategy_options=strategy_options,
+            render_radius=render_radius, columnar=columnar, timed_arrivals=timed_arrivals,
+            profile=profile,
+            experiment_dir=f"experiments/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job.id[:8]}")
+        experiment_dir, metrics, _ = simulator.run(
+            max_steps=max_steps,
+            progress=lambda step, vehicles: job.report(
+                step=step, vehicles_remaining=vehicles, metrics=simulator.live_metrics.metrics()))
 
-        # Return results including the scenario data
-        return jsonify({
+        # Finished jobs are kept around, so their states and scenario stay on disk
+        return {
             "success": True,
-            "experiment_id": experiment_id,
+            # Extract experiment ID from the full path
+            "experiment_id": os.path.basename(experiment_dir),
             "experiment_dir": experiment_dir,
-            "scenario": scenario_data,  # Include the scenario data
-            "states": states,
             "metrics": metrics
+        }
+
+    try:
+        job = get_job_queue().submit(run_job, {
+            "scenario": scenario_name,
+            "strategy": strategy,
+            "max_steps": max_steps
         })
-    except Exception as e:
-        return jsonify({"error": f"Simulation error: {str(e)}"}), 500
+    except QueueFull as e:
+        return jsonify({"error": f"Too many simulations in progress: {str(e)}"}), 503
+
+    # Optionally block until the run is done and answer like a job result
+    if data.get('wait', False):
+        try:
+            job.future.result()
+        except CancelledError:
+            # Cancelled while still queued, the job status says so
+            pass
+        return _job_result_response(job)
+
+    return jsonify({"success": True, **job.to_dict()}), 202
+
+
+@simulator_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List the simulation jobs known to the server and the job queue limits"""
+    job_queue = get_job_queue()
+    return jsonify({
+        "jobs": [job.to_dict() for job in job_queue.list()],
+        "queue": job_queue.stats()
+    })
+
+
+@simulator_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and progress (current step, vehicles remaining, live metrics) of a simulation job"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@simulator_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    Result of a completed simulation job, in the format /api/run used to return
+    (202 with the job status while the job is still queued or running)
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return _job_result_response(job)
+
+
+@simulator_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running simulation job"""
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job.to_dict())
+
+
+def _job_result_response(job):
+    """Build the response for the result of a job in any state"""
+    if job.status == FAILED:
+        return jsonify({"error": f"Simulation error: {job.error}", **job.to_dict()}), 500
+    if job.status == CANCELLED:
+        return jsonify({"error": "Simulation was cancelled", **job.to_dict()}), 409
+    if job.status != COMPLETED:
+        return jsonify(job.to_dict()), 202
+    if job.description.get("type") == "sweep":
+        return jsonify({"job_id": job.id, **job.result})
+
+    # The states and the scenario are read back from the experiment directory
+    index = open_experiment(job.result["experiment_id"])
+    if index is None:
+        return jsonify({"error": f"Experiment {job.result['experiment_id']} no longer exists",
+                        **job.to_dict()}), 410
+    with open(os.path.join(job.result["experiment_dir"], "scenario.json"), "r") as file:
+        scenario = json.load(file)
+
+    # Return results including the scenario data, streaming the states from disk
+    payload = {"job_id": job.id, **job.result, "scenario": scenario}
+    return Response(_stream_run_response(payload, index), mimetype="application/json")
+
+
+@simulator_bp.route('/experiments/<experiment_id>', methods=['GET'])
+def get_experiment(experiment_id):
+    """Number of steps and time span of an experiment's states"""
+    index = open_experiment(experiment_id)
+    if index is None:
+        return jsonify({"error": f"Experiment {experiment_id} not found"}), 404
+    first = index.state(0) if len(index) else None
+    last = index.state(len(index) - 1) if len(index) else None
+    return jsonify({
+        "experiment_id": experiment_id,
+        "total_steps": len(index),
+        "start_time": first["timestamp"] if first else None,
+        "end_time": last["timestamp"] if last else None
+    })
+
+
+@simulator_bp.route('/experiments/<experiment_id>/states', methods=['GET'])
+def get_experiment_states(experiment_id):
+    """
+    A page of an experiment's states, read through the offset index
+    Query parameters: 'start' and 'stop' (step range) or 'start_time' and 'end_time'
+    (ISO timestamps, inclusive), and 'limit' (page size, at most MAX_PAGE_SIZE)
+    """
+    index = open_experiment(experiment_id)
+    if index is None:
+        return jsonify({"error": f"Experiment {experiment_id} not found"}), 404
+
+    try:
+        limit = min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+        if 'start_time' in request.args or 'end_time' in request.args:
+            start, stop = index.window(request.args.get('start_time'), request.args.get('end_time'))
+        else:
+            start = request.args.get('start', 0, type=int)
+            stop = request.args.get('stop', len(index), type=int)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {str(e)}"}), 400
+    if start < 0 or stop < start or limit <= 0:
+        return jsonify({"error": "Invalid range. Require 0 <= start <= stop and limit > 0"}), 400
+
+    # Page through the requested range; 'next' is the start of the following page
+    range_stop = min(stop, len(index))
+    stop = max(start, min(range_stop, start + limit))
+    payload = {
+        "experiment_id": experiment_id,
+        "total_steps": len(index),
+        "start": start,
+        "stop": stop,
+        "next": stop if stop < range_stop else None
+    }
+    # The states are copied into the response as stored, without parsing them
+    body = json.dumps(payload)[:-1] + ', "states": [' + ",".join(index.lines(start, stop)) + "]}"
+    return Response(body, mimetype="application/json")
+
+
+@simulator_bp.route('/experiments/<experiment_id>/states/<int:step>', methods=['GET'])
+def get_experiment_state(experiment_id, step):
+    """A single state of an experiment"""
+    index = open_experiment(experiment_id)
+    if index is None:
+        return jsonify({"error": f"Experiment {experiment_id} not found"}), 404
+    if step >= len(index):
+        return jsonify({"error": f"Step {step} out of range (0-{len(index) - 1})"}), 404
+    return Response(index.lines(step, step + 1)[0], mimetype="application/json")
+
+
+def _stream_run_response(payload, index):
+    """Yield a /api/run JSON body whose 'states' array is copied page by page from the NDJSON file"""
+    yield json.dumps(payload)[:-1] + ', "states": ['
+    for start in range(0, len(index), MAX_PAGE_SIZE):
+        lines = index.lines(start, start + MAX_PAGE_SIZE)
+        yield ",".join(lines) if start == 0 else "," + ",".join(lines)
+    yield "]}"
+
+
+@simulator_bp.route('/sweep', methods=['POST'])
+def run_sweep_grid():
+    """
+    Queue a grid of simulations run in parallel and return its job ID right away
+    (fetch the comparison table from /api/jobs/<job_id>/result)
+    Expected request format: JSON with 'scenarios' (names or glob patterns of stored
+    scenarios) and 'strategies' lists and optional 'max_steps' (list), 'parameters'
+    (name -> list of values, see sweep.SWEEP_PARAMETERS) and 'workers' fields
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.json
+
+    # Validate input
+    scenarios = data.get('scenarios', ['all'])
+    strategies = data.get('strategies', ['set_interval'])
+    if any(strategy not in ['set_interval', 'multi_agent', 'max_pressure'] for strategy in strategies):
+        return jsonify({"error": "Invalid strategy. Choose 'set_interval', 'multi_agent' or 'max_pressure'"}), 400
+    max_steps = data.get('max_steps', [10000])
+    if isinstance(max_steps, int):
+        max_steps = [max_steps]
+    parameters = data.get('parameters', {})
+    workers = data.get('workers', MAX_SWEEP_WORKERS)
+    if not isinstance(workers, int) or workers < 1:
+        return jsonify({"error": "workers must be a positive integer"}), 400
+    workers = min(workers, MAX_SWEEP_WORKERS)
+
+    try:
+        # Only scenarios stored in the scenarios directory can be swept over HTTP
+        runs = build_grid(scenarios, strategies, max_steps, parameters, allow_paths=False)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def sweep_job(job):
+        sweep = run_sweep(runs, workers=workers, progress=False,
+                          on_result=lambda finished, total: job.report(runs_finished=finished, runs=total))
+        return {
+            "success": True,
+            "sweep_id": os.path.basename(sweep["sweep_dir"]),
+            "sweep_dir": sweep["sweep_dir"],
+            "table": sweep["table"]
+        }
+
+    try:
+        job = get_job_queue().submit(sweep_job, {"type": "sweep", "runs": len(runs), "workers": workers})
+    except QueueFull as e:
+        return jsonify({"error": f"Too many simulations in progress: {str(e)}"}), 503
+    return jsonify({"success": True, **job.to_dict()}), 202
@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterator, Optional
+
+import numpy as np
+import orjson
+
+from utils.scenario_cache import load_json
+
+MOVEMENTS = [f"{heading}_{turn}"
+             for heading in ["Northbound", "Southbound", "Eastbound", "Westbound"]
+             for turn in ["Straight", "Left", "Right"]]
+
+# Vehicles per hour of every movement when no lane rates are given
+DEFAULT_LANE_RATES = {
+    movement: 240 if movement.endswith("Straight") else 80 for movement in MOVEMENTS
+}
+
+# Share of each vehicle type in regular traffic
+DEFAULT_VEHICLE_MIX = {
+    "car": 0.5, "sedan": 0.15, "suv": 0.12, "van": 0.07,
+    "truck": 0.06, "bus": 0.05, "motorcycle": 0.05
+}
+
+EMERGENCY_TYPES = ["ambulance", "fire_truck", "police"]
+
+# Hourly multipliers of the lane rates for the time-of-day profile (AM and PM peaks)
+DAY_PROFILE = [
+    0.15, 0.1, 0.08, 0.08, 0.15, 0.4, 0.9, 1.6, 1.8, 1.2, 0.9, 0.9,
+    1.0, 0.95, 0.9, 1.0, 1.3, 1.75, 1.7, 1.2, 0.8, 0.6, 0.4, 0.25
+]
+
+PROFILES = ["poisson", "time_of_day"]
+
+# Generated vehicles start this far from the stop line
+ENTRY_DISTANCE_M = 300
+
+# Approach speeds are normally distributed and clipped to a plausible range
+SPEED_MEAN_KMH = 42
+SPEED_STD_KMH = 8
+SPEED_RANGE_KMH = (15, 70)
+
+# Arrivals are drawn one window at a time so day-long streams use little memory
+CHUNK_SECONDS = 900
+
+
+def _rate_multiplier(profile: str, start: datetime, seconds: np.ndarray) -> np.ndarray:
+    """Rate multiplier of the arrival profile at the given offsets from the start"""
+    if profile == "poisson":
+        return np.ones(len(seconds))
+    hours = ((start.hour * 3600 + start.minute * 60 + start.second + seconds) // 3600).astype(int) % 24
+    return np.asarray(DAY_PROFILE)[hours]
+
+
+def generate_vehicles(start: datetime,
+                      duration_seconds: float,
+                      lane_rates: Optional[Dict[str, float]] = None,
+                      profile: str = "poisson",
+                      vehicle_mix: Optional[Dict[str, float]] = None,
+                      emergency_per_hour: float = 0,
+                      seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Stream vehicles arriving at an intersection, ordered by the time they enter the
+    simulation (their estimated arrival at the stop line minus their travel time from
+    ENTRY_DISTANCE_M). Arrivals on every lane are a Poisson process whose rate is
+    constant ("poisson") or follows DAY_PROFILE ("time_of_day", drawn by thinning).
+
+    Args:
+        start: Time the arrivals start
+        duration_seconds: Length of the arrival period
+        lane_rates: Vehicles per hour per movement (lane IDs match their movement)
+        profile: "poisson" or "time_of_day"
+        vehicle_mix: Share of each vehicle type
+        emergency_per_hour: Rate of emergency vehicles over all lanes
+        seed: Seed of the random generator; the same arguments give the same vehicles
+
+    Yields:
+        Vehicle dicts in the scenario vehicle_data format
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown arrival profile: {profile}")
+    lane_rates = lane_rates or DEFAULT_LANE_RATES
+    vehicle_mix = vehicle_mix or DEFAULT_VEHICLE_MIX
+    lanes = list(lane_rates)
+    rates = np.array([lane_rates[lane] for lane in lanes], dtype=np.float64) / 3600
+    types = list(vehicle_mix)
+    type_weights = np.array([vehicle_mix[vehicle_type] for vehicle_type in types], dtype=np.float64)
+    type_weights /= type_weights.sum()
+    peak = max(DAY_PROFILE) if profile == "time_of_day" else 1.0
+
+    rng = np.random.default_rng(seed)
+    count = 0
+    chunk_start = 0.0
+    while chunk_start < duration_seconds:
+        chunk = min(CHUNK_SECONDS, duration_seconds - chunk_start)
+
+        # Candidate arrivals at the peak rate, thinned to the profile's rate
+        counts = rng.poisson(rates * peak * chunk)
+        seconds = chunk_start + rng.random(counts.sum()) * chunk
+        lane_index = np.repeat(np.arange(len(lanes)), counts)
+        keep = rng.random(len(seconds)) * peak < _rate_multiplier(profile, start, seconds)
+        seconds, lane_index = seconds[keep], lane_index[keep]
+        emergency = np.zeros(len(seconds), dtype=bool)
+
+        # Emergency vehicles arrive on random lanes independently of the lane rates
+        emergencies = rng.poisson(emergency_per_hour / 3600 * chunk)
+        if emergencies:
+            seconds = np.concatenate([seconds, chunk_start + rng.random(emergencies) * chunk])
+            lane_index = np.concatenate([lane_index, rng.integers(len(lanes), size=emergencies)])
+            emergency = np.concatenate([emergency, np.ones(emergencies, dtype=bool)])
+
+        order = np.argsort(seconds, kind="stable")
+        seconds, lane_index, emergency = seconds[order], lane_index[order], emergency[order]
+        speeds = np.round(np.clip(rng.normal(SPEED_MEAN_KMH, SPEED_STD_KMH, len(seconds)),
+                                  *SPEED_RANGE_KMH), 1)
+        type_index = rng.choice(len(types), size=len(seconds), p=type_weights)
+        emergency_type = rng.integers(len(EMERGENCY_TYPES), size=len(seconds))
+
+        for offset, lane, speed, vehicle_type, is_emergency, kind in zip(
+                seconds.tolist(), lane_index.tolist(), speeds.tolist(), type_index.tolist(),
+                emergency.tolist(), emergency_type.tolist()):
+            count += 1
+            arrival = start + timedelta(seconds=offset + ENTRY_DISTANCE_M / (speed / 3.6))
+            vehicle = {
+                "vehicle_id": f"G{count:07d}",
+                "lane_id": lanes[lane],
+                "speed_kmh": speed,
+                "distance_to_intersection_m": ENTRY_DISTANCE_M,
+                "destination": lanes[lane],
+                "vehicle_type": EMERGENCY_TYPES[kind] if is_emergency else types[vehicle_type],
+                "estimated_arrival_time": arrival.isoformat(),
+                "emergency_vehicle": is_emergency
+            }
+            if is_emergency:
+                vehicle["emergency_status"] = {
+                    "lights_active": True,
+                    "siren_active": True,
+                    "priority_level": "high"
+                }
+            yield vehicle
+        chunk_start += chunk
+
+
+def scenario_header(start: datetime,
+                    pedestrians: Optional[Dict[str, int]] = None,
+                    context: Optional[Dict[str, Any]] = None,
+                    config_path: str = "traffic_rules/traffic_configuration.json") -> Dict[str, Any]:
+    """
+    Everything of a generated scenario but its vehicles: the first configuration of
+    the traffic rules as initial signal status, pedestrians and context.
+    """
+    rules = load_json(config_path)["traffic_rules"]
+    signal_status = dict(next(iter(rules.values())))
+    signal_status["last_changed"] = start.isoformat()
+    signal_status["next_timestamp"] = (start + timedelta(seconds=30)).isoformat()
+    return {
+        "vehicle_data": [],
+        "pedestrians": {
+            "crosswalk_north_south": 0,
+            "crosswalk_east_west": 0,
+            **(pedestrians or {}),
+            "timestamp": start.isoformat()
+        },
+        "context": context or {"weather": "Clear", "peak_period": False, "incident_reported": False},
+        "signal_status": signal_status
+    }
+
+
+def write_scenario(path: str, header: Dict[str, Any], vehicles: Iterator[Dict[str, Any]]) -> int:
+    """
+    Write a scenario file, streaming the vehicles so large scenarios are never held
+    in memory.
+
+    Returns:
+        Number of vehicles written
+    """
+    count = 0
+    fields = {key: value for key, value in header.items() if key != "vehicle_data"}
+    with open(path, "wb") as file:
+        file.write(b'{"vehicle_data":[')
+        for vehicle in vehicles:
+            if count:
+                file.write(b",\n")
+            file.write(orjson.dumps(vehicle))
+            count += 1
+        file.write(b"],")
+        # Rest of the header without its opening brace
+        file.write(orjson.dumps(fields)[1:])
+    return count
+
+
+def parse_arguments() -> argparse.Namespace:
+    # Setup command-line argument parsing
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic scenario with timed vehicle arrivals"
+    )
+    parser.add_argument("--output", default="scenarios/generated.json", help="Scenario file to write")
+    parser.add_argument("--start", default="2025-03-19T00:00:00", help="Start time of the arrivals")
+    parser.add_argument("--hours", type=float, default=1, help="Length of the arrival period in hours")
+    parser.add_argument("--profile", default="poisson", choices=PROFILES, help="Arrival rate profile")
+    parser.add_argument("--scale", type=float, default=1,
+                        help="Multiplier of the default lane rates (26 gives about a million vehicles a day)")
+    parser.add_argument("--lane_rates", help="JSON object of vehicles per hour per movement")
+    parser.add_argument("--vehicle_mix", help="JSON object of the share of each vehicle type")
+    parser.add_argument("--emergency_per_hour", type=float, default=0.5,
+                        help="Emergency vehicles per hour over all lanes")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--run", action="store_true",
+                        help="Stream the vehicles straight into a simulation instead of only writing them")
+    parser.add_argument("--strategy", default="set_interval", help="Strategy of the simulation with --run")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    start = datetime.fromisoformat(args.start)
+    lane_rates = json.loads(args.lane_rates) if args.lane_rates else DEFAULT_LANE_RATES
+    lane_rates = {lane: rate * args.scale for lane, rate in lane_rates.items()}
+    vehicles = generate_vehicles(
+        start, args.hours * 3600, lane_rates=lane_rates, profile=args.profile,
+        vehicle_mix=json.loads(args.vehicle_mix) if args.vehicle_mix else None,
+        emergency_per_hour=args.emergency_per_hour, seed=args.seed)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    if args.run:
+        from simulator import TrafficSimulator, STEP_SECONDS
+
+        # The scenario file only holds the header; the vehicles are streamed in
+        write_scenario(args.output, scenario_header(start), iter([]))
+        simulator = TrafficSimulator(args.output, strategy=args.strategy, stream_states=True,
+                                     arrivals=vehicles)
+        experiment_dir, metrics, _ = simulator.run(max_steps=int(args.hours * 3600 / STEP_SECONDS) + 1000)
+        print(json.dumps(metrics, indent=2))
+        print(f"Simulation complete. Results saved to {experiment_dir}")
+    else:
+        count = write_scenario(args.output, scenario_header(start), vehicles)
+        print(f"Wrote {count} vehicles to {args.output}")
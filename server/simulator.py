@@ -1,192 +1,363 @@
 import json
+import math
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Iterable
 import copy
+import heapq
+from collections import deque
 
 # Import strategies and metrics
 from strategy.set_interval import SetIntervalStrategy
 from strategy.multi_agent import MultiAgentStrategy
-from utils.metrics import calculate_metrics
+from strategy.max_pressure import MaxPressureStrategy
+from utils.metrics import MetricsAccumulator
+from utils.state_stream import StateWriter, StateReader, PassedVehicleWriter
+from utils.columnar import ColumnarWriter
+from utils.scenario_cache import load_scenario
+from utils.profiling import Profiler
+from engine.vectorized import VehicleArrays
+from engine.events import EventTimeline, interpolate_state
+from engine.lanes import LaneQueues, ActiveVehicles
+
+# Vehicle update engines: per-vehicle dicts or NumPy struct-of-arrays
+ENGINES = ["dict", "numpy"]
+
+# Time advance modes: every fixed step, or jump over idle steps to the next event
+MODES = ["tick", "event"]
+
+# Seconds of simulated time per step
+STEP_SECONDS = 5
+
+# Passed vehicles further than this past the stop line are no longer moved or
+# included in states (the client's intersection view hides them beyond 350m)
+RENDER_RADIUS_M = 350
+
+
+def entry_time(vehicle: Dict[str, Any]) -> datetime:
+    """
+    Time a vehicle enters the simulation with timed arrivals: its estimated arrival
+    at the stop line minus the time it needs to cover its distance to it
+    """
+    if "estimated_arrival_time" not in vehicle:
+        return datetime.min
+    arrival = datetime.fromisoformat(vehicle["estimated_arrival_time"])
+    if vehicle["speed_kmh"] <= 0:
+        return arrival
+    return arrival - timedelta(seconds=vehicle["distance_to_intersection_m"] / (vehicle["speed_kmh"] / 3.6))
 
 
 class TrafficSimulator:
-    def __init__(self, scenario_path: str, strategy: str = "set_interval", debug: bool = False):
-        """Initialize the traffic simulator with a scenario and strategy"""
+    def __init__(self, scenario_path: str, strategy: str = "set_interval", debug: bool = False,
+                 engine: str = "dict", experiment_dir: str = None, stream_states: bool = False,
+                 mode: str = "tick", strategy_options: Dict[str, Any] = None,
+                 render_radius: float = RENDER_RADIUS_M, columnar: bool = False,
+                 timed_arrivals: bool = False, arrivals: Iterable[Dict[str, Any]] = None,
+                 profile: bool = False, trace_memory: bool = False, snapshot_interval: int = None,
+                 on_passed: Callable[[List[Dict[str, Any]]], None] = None):
+        """
+        Initialize the traffic simulator with a scenario, strategy and vehicle engine.
+        With stream_states, each state is written to states.ndjson as the run goes
+        instead of being kept in memory. In "event" mode, steps in which nothing but
+        positions and waiting times can change are skipped and their states are
+        interpolated on demand. strategy_options are passed to the strategy constructor.
+        Passed vehicles beyond render_radius metres are retired: they are spooled to
+        disk and dropped from memory (None keeps them all), and passed_vehicles.json
+        gets them with their final distance. on_passed is called with the records
+        of the vehicles passing on every step.
+        With columnar, states and passed vehicles are also written as Parquet tables.
+        With timed_arrivals, scenario vehicles only enter the simulation at their entry
+        time (see entry_time) instead of all being present at the start. arrivals is
+        an optional stream of further vehicles, ordered by entry time, that enter the
+        same way (e.g. from scenario_generator.generate_vehicles).
+        With profile, the wall time of every phase and the strategy latency are recorded
+        in profile.json; trace_memory adds tracemalloc snapshots (every snapshot_interval
+        steps and at the end).
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
         self.debug = debug
+        self.engine = engine
+        self.mode = mode
+        self.render_radius = render_radius
         self.scenario_path = scenario_path
-        self.scenario = self._load_json(scenario_path)
+        # Parsed, validated and interned once per scenario file content
+        self.compiled_scenario = load_scenario(scenario_path)
+        self.scenario = self.compiled_scenario.scenario
         self.strategy_name = strategy
+        self.strategy_options = strategy_options or {}
         self.strategy = self._get_strategy()
 
         # Initialize simulation time variables
-        self.timestamp = datetime.fromisoformat(
-            self.scenario["signal_status"]["last_changed"])
-        self.next_timestamp = datetime.fromisoformat(
-            self.scenario["signal_status"]["next_timestamp"])
+        self.timestamp = self.compiled_scenario.last_changed
+        self.next_timestamp = self.compiled_scenario.next_timestamp
         self.signal_change_timestamp = self.next_timestamp
+        self.decision_requested = False
 
         # Initialize state variables
-        self.current_signal_status = copy.deepcopy(
-            self.scenario["signal_status"])
+        self.current_signal_status = self.compiled_scenario.new_signal_status()
         self.reasoning = "Initial signal status"
-        self.vehicles = copy.deepcopy(self.scenario["vehicle_data"])
-        self.pedestrians = copy.deepcopy(self.scenario["pedestrians"])
+        vehicles = self.compiled_scenario.new_vehicles()
+        self.pedestrians = self.compiled_scenario.new_pedestrians()
+
+        # Vehicles still to enter, merged from the scenario and the arrival stream
+        self.next_arrival = None
+        self.pending_arrivals = None
+        if timed_arrivals:
+            entries = [entry_time(vehicle) for vehicle in vehicles]
+            later = [vehicles[index] for index in sorted(range(len(entries)), key=entries.__getitem__)
+                     if entries[index] > self.timestamp]
+            vehicles = [vehicle for vehicle, entry in zip(vehicles, entries) if entry <= self.timestamp]
+        else:
+            later = []
+        if later or arrivals is not None:
+            self.pending_arrivals = heapq.merge(later, arrivals or [], key=entry_time)
+            self._next_arrival()
 
         # Get weather and context data if available
         self.weather = self.scenario.get("context", {}).get("weather", None)
         self.context = self.scenario.get("context", None)
 
         # Track vehicle and pedestrian statistics
-        self.vehicle_stats = {}
+        # Passed vehicles within the render radius; the others are on disk
         self.passed_vehicles = []
+        self.passed_count = 0
+        # Seconds passed vehicles have moved, to carry retired ones on to the end of the run
+        self.passed_clock = 0
+        self.on_passed = on_passed
         self.passed_pedestrians = 0
-        self.queue_lengths = []
-        self.states = []
-
-        # Create experiment directory
-        self.experiment_dir = f"experiments/{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        # Recent queue lengths for the deadlock check; the metrics keep running totals
+        self.queue_lengths = deque(maxlen=20)
+        self.live_metrics = MetricsAccumulator()
+        self.states = EventTimeline(render_radius) if self.mode == "event" else []
+
+        # The dict engine indexes the vehicles per lane, the numpy engine takes
+        # ownership of them as parallel arrays
+        self.lane_queues = None
+        self.vehicle_arrays = None
+        if self.engine == "dict":
+            self.lane_queues = LaneQueues(vehicles)
+        else:
+            # The interned codes cover every scenario vehicle, in scenario order
+            interned = {} if timed_arrivals else {
+                "lanes": (self.compiled_scenario.lane_names, self.compiled_scenario.lane_codes),
+                "destinations": (self.compiled_scenario.destination_names,
+                                 self.compiled_scenario.destination_codes)
+            }
+            self.vehicle_arrays = VehicleArrays(
+                vehicles, self.passed_vehicles, debug=self.debug, **interned)
+
+        # Create experiment directory (callers running in parallel pass their own)
+        self.experiment_dir = experiment_dir or f"experiments/{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         os.makedirs(self.experiment_dir, exist_ok=True)
 
+        # Retired passed vehicles are written out as they leave the render radius
+        self.passed_writer = PassedVehicleWriter(f"{self.experiment_dir}/passed_vehicles.json")
+
+        # Streaming mode writes states to disk instead of keeping them
+        self.state_writer = None
+        if stream_states:
+            self.state_writer = StateWriter(f"{self.experiment_dir}/states.ndjson")
+
+        # Parquet tables written in row groups as the run goes
+        self.columnar_writer = None
+        if columnar:
+            signals = [key for key, value in self.current_signal_status.items()
+                       if isinstance(value, str) and key not in ["last_changed", "next_timestamp"]]
+            self.columnar_writer = ColumnarWriter(self.experiment_dir, signals)
+
+        # Instrument the phases before the first state is saved
+        self.profiler = None
+        if profile or trace_memory:
+            self.profiler = Profiler(os.path.basename(self.experiment_dir), trace_memory, snapshot_interval)
+            self.profiler.instrument(self)
+
         # Save initial state
         self._save_state()
 
-    def _load_json(self, file_path: str) -> Dict:
-        """Load JSON file"""
-        with open(file_path, 'r') as file:
-            return json.load(file)
-
     def _get_strategy(self):
         """Get the traffic signal strategy implementation"""
         if self.strategy_name == "set_interval":
-            return SetIntervalStrategy(config_path="traffic_rules/traffic_configuration.json")
+            return SetIntervalStrategy(config_path="traffic_rules/traffic_configuration.json",
+                                       **self.strategy_options)
         elif self.strategy_name == "multi_agent":
-            return MultiAgentStrategy(config_path="traffic_rules/traffic_configuration.json")
+            return MultiAgentStrategy(config_path="traffic_rules/traffic_configuration.json",
+                                      **self.strategy_options)
+        elif self.strategy_name == "max_pressure":
+            return MaxPressureStrategy(config_path="traffic_rules/traffic_configuration.json",
+                                       **self.strategy_options)
         else:
             raise ValueError(f"Unknown strategy: {self.strategy_name}")
 
+    def _active_vehicles(self) -> List[Dict[str, Any]]:
+        """Vehicles that have not passed the intersection yet, as dicts"""
+        if self.vehicle_arrays is not None:
+            return self.vehicle_arrays.vehicle_dicts()
+        return ActiveVehicles(self.lane_queues.vehicles(), self.lane_queues)
+
+    def _active_count(self) -> int:
+        """Number of vehicles that have not passed the intersection yet"""
+        if self.vehicle_arrays is not None:
+            return len(self.vehicle_arrays)
+        return len(self.lane_queues)
+
     def _save_state(self):
         """Save the current state of the simulation"""
-        state = {
+        if self.state_writer is not None:
+            state = self._current_state(copy_values=False)
+            self._stream_state(state)
+        else:
+            state = self._current_state(copy_values=True)
+            self.states.append(state)
+        if self.columnar_writer is not None:
+            # States list the passed vehicles within the render radius first
+            self.columnar_writer.write_state(state, passed=len(self.passed_vehicles))
+        self.live_metrics.add_states(state["timestamp"])
+        self._update_metrics()
+
+    def _update_metrics(self):
+        """Add the pedestrians that passed since the last update to the live metrics"""
+        self.live_metrics.passed_pedestrians = self.passed_pedestrians
+
+    def _record_passed(self, records: List[Dict[str, Any]]):
+        """Feed the records of vehicles that just passed to the metrics, the Parquet table and on_passed"""
+        self.passed_count += len(records)
+        self.live_metrics.add_passed_vehicles(records)
+        if self.columnar_writer is not None:
+            self.columnar_writer.write_passed(records)
+        if self.on_passed is not None:
+            self.on_passed(records)
+
+    def _track_queue_length(self, steps: int = 1):
+        """Record the current queue length for `steps` steps"""
+        queue_length = self._calculate_queue_length()
+        self.queue_lengths.extend([queue_length] * min(steps, self.queue_lengths.maxlen))
+        self.live_metrics.add_queue_length(queue_length, steps)
+
+    def _current_state(self, copy_values: bool) -> Dict[str, Any]:
+        """Build the current state, deep-copying live values unless it is serialized right away"""
+        if self.vehicle_arrays is not None:
+            vehicles = self.vehicle_arrays.passed_dicts() + self.vehicle_arrays.vehicle_dicts()
+        elif copy_values:
+            vehicles = copy.deepcopy(self.passed_vehicles) + copy.deepcopy(self.lane_queues.vehicles())
+        else:
+            vehicles = self.passed_vehicles + self.lane_queues.vehicles()
+        return {
             "timestamp": self.timestamp.isoformat(),
-            "signal_status": copy.deepcopy(self.current_signal_status),
+            "signal_status": copy.deepcopy(self.current_signal_status) if copy_values else self.current_signal_status,
             "reasoning": self.reasoning,
-            "vehicles": copy.deepcopy(self.passed_vehicles) + copy.deepcopy(self.vehicles),
-            "pedestrians": copy.deepcopy(self.pedestrians),
+            "vehicles": vehicles,
+            "pedestrians": copy.deepcopy(self.pedestrians) if copy_values else self.pedestrians,
             "queue_length": self._calculate_queue_length(),
-            "passed_vehicles_count": len(self.passed_vehicles),
+            "passed_vehicles_count": self.passed_count,
             "passed_pedestrians_count": self.passed_pedestrians,
         }
-        self.states.append(state)
+
+    def _stream_state(self, state: Dict[str, Any]):
+        """Write a state straight to the NDJSON file"""
+        self.state_writer.write(state)
 
     def _calculate_queue_length(self) -> int:
         """Calculate current queue length (vehicles stopped at intersection)"""
-        return sum(1 for v in self.vehicles if v["speed_kmh"] == 0 and v["distance_to_intersection_m"] < 50)
+        if self.vehicle_arrays is not None:
+            return self.vehicle_arrays.queue_length()
+        return self.lane_queues.queue_length()
 
     def _update_vehicles(self, delta_time: int):
         """Update vehicle positions and process through intersection if possible"""
-        updated_vehicles = []
-
-        for vehicle in self.vehicles:
-            vehicle_id = vehicle["vehicle_id"]
-            destination = vehicle["destination"]
-
-            # Initialize vehicle stats if first time seeing this vehicle
-            if vehicle_id not in self.vehicle_stats:
-                self.vehicle_stats[vehicle_id] = {
-                    "wait_time": 0,
-                    "stops": 0,
-                    "initial_arrival_time": self.timestamp,
-                    "type": vehicle["vehicle_type"]
-                }
-
-            # Calculate new position
-            speed_ms = vehicle["speed_kmh"] / 3.6  # Convert km/h to m/s
-            new_distance = max(
-                0, vehicle["distance_to_intersection_m"] - speed_ms * delta_time)
-
-            # Check if vehicle can proceed through intersection
-            can_proceed = False
-
-            if new_distance <= 0:
-                # Check if estimated arrival time has been reached
-                # if "estimated_arrival_time" in vehicle:
-                #     estimated_arrival = datetime.fromisoformat(
-                #         vehicle["estimated_arrival_time"])
-                #     if self.timestamp < estimated_arrival:
-                #         # Vehicle hasn't reached its estimated arrival time yet
-                #         vehicle["distance_to_intersection_m"] = new_distance
-                #         updated_vehicles.append(vehicle)
-                #         continue
-
-                # Match destination to signal configuration key
-                if destination in self.current_signal_status:
-                    can_proceed = self.current_signal_status[destination] == "green"
-
-                    # Special handling for left turns (yield to pedestrians)
-                    if can_proceed and "_Left" in destination:
-                        # Determine which crosswalk this left turn crosses
-                        # In Singapore right-hand drive context: North/South Left turns cross East/West pedestrians, East/West Left turns cross North/South pedestrians
-                        relevant_crosswalk = None
-                        relevant_signal = None
-
-                        if "Northbound" in destination or "Southbound" in destination:
-                            relevant_crosswalk = "crosswalk_east_west"
-                            relevant_signal = "Crosswalk_East_West"
-                        elif "Eastbound" in destination or "Westbound" in destination:
-                            relevant_crosswalk = "crosswalk_north_south"
-                            relevant_signal = "Crosswalk_North_South"
-
-                        # Check if pedestrians are present AND have green signal
-                        if (relevant_crosswalk and relevant_signal and
-                            self.pedestrians.get(relevant_crosswalk, 0) > 0 and
-                                self.current_signal_status.get(relevant_signal) == "green"):
-                            can_proceed = False  # Yield to pedestrians
-                            if self.debug:
-                                print(
-                                    f"Vehicle {vehicle_id} yielding to pedestrians at {relevant_crosswalk}")
-
-                if can_proceed:
-                    # Vehicle passes through intersection
-
-                    self.passed_vehicles.append({
-                        "vehicle_id": vehicle_id,
-                        "vehicle_type": vehicle["vehicle_type"],
-                        "lane_id": vehicle["lane_id"],
-                        "destination": destination,
-                        "distance_to_intersection_m": -10,
-                        "timestamp": self.timestamp.isoformat(),
-                        "estimated_arrival_time": self.timestamp.isoformat(),
-                        "emergency_vehicle": vehicle["emergency_vehicle"],
-                        "speed_kmh": 33.9,
-                        "wait_time": self.vehicle_stats[vehicle_id]["wait_time"],
-                        "speed": vehicle["speed_kmh"],
-                        "stops": self.vehicle_stats[vehicle_id]["stops"]
-                    })
-                    if self.debug:
+        if self.vehicle_arrays is not None:
+            records = self.vehicle_arrays.update(
+                self.current_signal_status, self.pedestrians, self.timestamp.isoformat(), delta_time)
+        else:
+            # Only the vehicles reaching the stop line or waiting at it are processed
+            records = [self._passed_record(vehicle, wait_time, stops)
+                       for vehicle, wait_time, stops in self.lane_queues.update(delta_time, self._can_proceed)]
+            self.passed_vehicles.extend(records)
+        if records:
+            self._record_passed(records)
+
+    def _can_proceed(self, destination: str, vehicles: List[Dict[str, Any]]) -> bool:
+        """Whether the vehicles at the stop line heading for a destination may pass"""
+        # Match destination to signal configuration key
+        if destination not in self.current_signal_status:
+            return False
+        can_proceed = self.current_signal_status[destination] == "green"
+
+        # Special handling for left turns (yield to pedestrians)
+        if can_proceed and "_Left" in destination:
+            # Determine which crosswalk this left turn crosses
+            # In Singapore right-hand drive context: North/South Left turns cross East/West pedestrians, East/West Left turns cross North/South pedestrians
+            relevant_crosswalk = None
+            relevant_signal = None
+
+            if "Northbound" in destination or "Southbound" in destination:
+                relevant_crosswalk = "crosswalk_east_west"
+                relevant_signal = "Crosswalk_East_West"
+            elif "Eastbound" in destination or "Westbound" in destination:
+                relevant_crosswalk = "crosswalk_north_south"
+                relevant_signal = "Crosswalk_North_South"
+
+            # Check if pedestrians are present AND have green signal
+            if (relevant_crosswalk and relevant_signal and
+                self.pedestrians.get(relevant_crosswalk, 0) > 0 and
+                    self.current_signal_status.get(relevant_signal) == "green"):
+                can_proceed = False  # Yield to pedestrians
+                if self.debug:
+                    for vehicle in vehicles:
                         print(
-                            f"Vehicle {vehicle_id} passed through intersection via {destination} at speed {vehicle['speed_kmh']} km/h")
-                    continue
-                else:
-                    # Vehicle stops at intersection
-                    new_distance = 0
-                    if vehicle["speed_kmh"] > 0:
-                        # Record stop if vehicle was moving
-                        self.vehicle_stats[vehicle_id]["stops"] += 1
-                    vehicle["speed_kmh"] = 0
-                    self.vehicle_stats[vehicle_id]["wait_time"] += delta_time
-
-            # Update vehicle position if it hasn't passed through
-            vehicle["distance_to_intersection_m"] = new_distance
-            updated_vehicles.append(vehicle)
-
-        self.vehicles = updated_vehicles
+                            f"Vehicle {vehicle['vehicle_id']} yielding to pedestrians at {relevant_crosswalk}")
+        return can_proceed
+
+    def _passed_record(self, vehicle: Dict[str, Any], wait_time: int, stops: int) -> Dict[str, Any]:
+        """Record of a vehicle passing through the intersection on this step"""
+        if self.debug:
+            print(
+                f"Vehicle {vehicle['vehicle_id']} passed through intersection via {vehicle['destination']} at speed {vehicle['speed_kmh']} km/h")
+        return {
+            "vehicle_id": vehicle["vehicle_id"],
+            "vehicle_type": vehicle["vehicle_type"],
+            "lane_id": vehicle["lane_id"],
+            "destination": vehicle["destination"],
+            "distance_to_intersection_m": -10,
+            "timestamp": self.timestamp.isoformat(),
+            "estimated_arrival_time": self.timestamp.isoformat(),
+            "emergency_vehicle": vehicle["emergency_vehicle"],
+            "speed_kmh": 33.9,
+            "wait_time": wait_time,
+            "speed": vehicle["speed_kmh"],
+            "stops": stops
+        }
 
     def _update_passed_vehicles(self, delta_time: int):
         """Update passed vehicles based on signal status"""
-        for vehicle in self.passed_vehicles:
-            vehicle["distance_to_intersection_m"] -= vehicle["speed_kmh"] / \
-                3.6 * delta_time
+        self.passed_clock += delta_time
+        if self.vehicle_arrays is not None:
+            self.vehicle_arrays.advance_passed(delta_time)
+        else:
+            for vehicle in self.passed_vehicles:
+                vehicle["distance_to_intersection_m"] -= vehicle["speed_kmh"] / \
+                    3.6 * delta_time
+        self._retire_passed_vehicles()
+
+    def _retire_passed_vehicles(self):
+        """
+        Write out and forget the passed vehicles beyond the render radius. Passed vehicles
+        leave at the same speed, so they are ordered by distance and retire from the front.
+        """
+        if self.render_radius is None:
+            return
+        if self.vehicle_arrays is not None:
+            self.passed_writer.write(self.vehicle_arrays.retire_passed(self.render_radius), self.passed_clock)
+            return
+        count = 0
+        while (count < len(self.passed_vehicles) and
+               self.passed_vehicles[count].get("distance_to_intersection_m", 0) < -self.render_radius):
+            count += 1
+        if count:
+            self.passed_writer.write(self.passed_vehicles[:count], self.passed_clock)
+            del self.passed_vehicles[:count]
 
     def _update_pedestrians(self, delta_time: int):
         """Update pedestrian counts based on crosswalk signals"""
@@ -213,11 +384,27 @@ class TrafficSimulator:
             if self.debug and crossing_rate > 0:
                 print(f"{crossing_rate} pedestrians crossed E-W")
 
+    def _request_signal_change(self):
+        """Let strategies that decide asynchronously start on the next signal change ahead of time"""
+        prefetch_seconds = getattr(self.strategy, "prefetch_seconds", None)
+        if prefetch_seconds is None or self.decision_requested:
+            return
+        if (self.signal_change_timestamp - self.timestamp).total_seconds() <= prefetch_seconds:
+            self.strategy.request_next_signal_status(
+                self.current_signal_status,
+                self._active_vehicles(),
+                self.pedestrians,
+                self.weather,
+                self.context
+            )
+            self.decision_requested = True
+
     def _change_signal(self):
         """Change the traffic signal using the strategy"""
+        self.decision_requested = False
         self.current_signal_status, self.reasoning = self.strategy.get_next_signal_status(
             self.current_signal_status,
-            self.vehicles,
+            self._active_vehicles(),
             self.pedestrians,
             self.weather,
             self.context
@@ -249,15 +436,98 @@ class TrafficSimulator:
     def _is_simulation_complete(self) -> bool:
         """Check if simulation is complete (no vehicles or pedestrians)"""
         return (
-            len(self.vehicles) == 0 and
+            self._active_count() == 0 and
+            self.next_arrival is None and
             sum(self.pedestrians.get(k, 0)
                 for k in ["crosswalk_north_south", "crosswalk_east_west"]) == 0
         )
 
-    def run(self, max_steps: int = 10000):
-        """Run the simulation for a maximum number of steps"""
+    def _idle_ticks(self, delta_time: int, step: int, max_steps: int) -> int:
+        """
+        Number of upcoming steps in which only positions and waiting times change:
+        no signal change, no pedestrian crossing and no vehicle reaching the stop line
+        """
+        ticks = max_steps - step
+
+        # Next vehicle entering the simulation (entries happen on processed steps)
+        if self.next_arrival is not None:
+            seconds_to_arrival = (self.next_arrival[0] - self.timestamp).total_seconds()
+            ticks = min(ticks, math.ceil(seconds_to_arrival / delta_time) - 1)
+
+        # Next signal change
+        seconds_to_change = (self.signal_change_timestamp - self.timestamp).total_seconds()
+        ticks = min(ticks, math.ceil(seconds_to_change / delta_time) - 1)
+
+        # Step on which an asynchronous strategy is asked for the next decision
+        prefetch_seconds = getattr(self.strategy, "prefetch_seconds", None)
+        if prefetch_seconds is not None and not self.decision_requested:
+            ticks = min(ticks, math.ceil((seconds_to_change - prefetch_seconds) / delta_time) - 1)
+
+        # Pedestrians cross on every step while their walk signal is green
+        for crosswalk, signal in [("crosswalk_north_south", "Crosswalk_North_South"),
+                                  ("crosswalk_east_west", "Crosswalk_East_West")]:
+            if self.pedestrians.get(crosswalk, 0) > 0 and self.current_signal_status.get(signal) == "green":
+                return 0
+
+        # Next vehicle reaching the stop line, or a waiting vehicle with a green light
+        if self.vehicle_arrays is not None:
+            vehicle_ticks = self.vehicle_arrays.idle_ticks(self.current_signal_status, delta_time)
+        else:
+            vehicle_ticks = self.lane_queues.idle_ticks(self.current_signal_status, delta_time)
+        if vehicle_ticks is not None:
+            ticks = min(ticks, vehicle_ticks)
+
+        # Stop short of the step where the deadlock safety check in run() would fire
+        if self._active_count() > 0:
+            queue_length = self._calculate_queue_length()
+            constant_steps = 0
+            for length in reversed(self.queue_lengths):
+                if length != queue_length:
+                    break
+                constant_steps += 1
+            ticks = min(ticks, max(1001 - step, 20 - constant_steps, 1) - 1)
+
+        return max(0, ticks)
+
+    def _fast_forward(self, ticks: int, delta_time: int):
+        """Advance the simulation over idle steps without processing them one by one"""
+        if self.state_writer is not None or self.columnar_writer is not None:
+            # Streamed and columnar output still get one state per step
+            base_state = self._current_state(copy_values=False)
+            for tick in range(1, ticks + 1):
+                state = interpolate_state(base_state, tick, delta_time, self.render_radius)
+                if self.state_writer is not None:
+                    self._stream_state(state)
+                if self.columnar_writer is not None:
+                    # Interpolation only leaves out passed vehicles beyond the render radius
+                    passed = len(self.passed_vehicles) - (len(base_state["vehicles"]) - len(state["vehicles"]))
+                    self.columnar_writer.write_state(state, passed=passed)
+        if self.state_writer is None:
+            self.states.skip(ticks, delta_time)
+
+        self._track_queue_length(ticks)
+        self.timestamp += timedelta(seconds=ticks * delta_time)
+        self.live_metrics.add_states(self.timestamp.isoformat(), ticks)
+        self.passed_clock += ticks * delta_time
+
+        if self.vehicle_arrays is not None:
+            self.vehicle_arrays.fast_forward(ticks, delta_time)
+            self._retire_passed_vehicles()
+            return
+
+        self.lane_queues.fast_forward(ticks, delta_time)
+        for vehicle in self.passed_vehicles:
+            vehicle["distance_to_intersection_m"] -= ticks * (vehicle["speed_kmh"] / 3.6 * delta_time)
+        self._retire_passed_vehicles()
+
+    def run(self, max_steps: int = 10000, progress: Callable[[int, int], None] = None):
+        """
+        Run the simulation for a maximum number of steps.
+        progress(step, vehicles_remaining) is called after every processed step;
+        an exception raised by it aborts the run.
+        """
         step = 0
-        delta_time = 5  # 5 seconds per step
+        delta_time = STEP_SECONDS
         if self.debug:
             print(f'Starting simulation with traffic signal configuration:')
             for lane, status in self.current_signal_status.items():
@@ -265,78 +535,152 @@ class TrafficSimulator:
                     print(f'  {lane}: {status}')
 
         while step < max_steps and not self._is_simulation_complete():
-            step += 1
-            self.timestamp += timedelta(seconds=delta_time)
-
-            # Check if it's time to change the signal
-            if self.timestamp >= self.signal_change_timestamp:
-                self._change_signal()
-
-            # Update pedestrian states first, then vehicle states
-            # This ensures pedestrians are cleared before allowing vehicles to turn left
-            self._update_pedestrians(delta_time)
-            self._update_vehicles(delta_time)
-            self._update_passed_vehicles(delta_time)
+            if self.mode == "event":
+                idle_ticks = self._idle_ticks(delta_time, step, max_steps)
+                if idle_ticks:
+                    self._fast_forward(idle_ticks, delta_time)
+                    step += idle_ticks
+                    if step >= max_steps:
+                        break
 
-            # Save current state
-            self._save_state()
+            step += 1
+            self.advance(delta_time)
 
-            # Track queue length
-            self.queue_lengths.append(self._calculate_queue_length())
+            if progress is not None:
+                progress(step, self._active_count())
 
             if self.debug and step % 10 == 0:
-                print(f"Step {step}: {len(self.vehicles)} vehicles, " +
+                print(f"Step {step}: {self._active_count()} vehicles, " +
                       f"{sum(self.pedestrians.get(k, 0) for k in ['crosswalk_north_south', 'crosswalk_east_west'])} pedestrians")
 
-            # Safety check - break if no changes in last x steps (vehicles might be stuck)
-            if step > 1000 and len(self.vehicles) > 0:
-                if len(set(self.queue_lengths[-20:])) == 1:
+            # Safety check - break if no changes in last x steps (vehicles might be stuck),
+            # once every vehicle has entered
+            if step > 1000 and self._active_count() > 0 and self.next_arrival is None:
+                if len(set(self.queue_lengths)) == 1:
                     if self.debug:
                         print(
                             "Warning: Possible deadlock detected. Breaking simulation.")
-                        for vehicle in self.vehicles:
+                        for vehicle in self._active_vehicles():
                             print(
                                 f"Stuck vehicle: {vehicle['vehicle_id']} at lane {vehicle['lane_id']} to {vehicle['destination']}")
                             print(
                                 f"Signal status for lane: {self.current_signal_status.get(vehicle['lane_id'], 'unknown')}")
 
                     # Force process all remaining vehicles
-                    for vehicle in self.vehicles:
-                        self.passed_vehicles.append({
-                            "vehicle_id": vehicle["vehicle_id"],
-                            "vehicle_type": vehicle["vehicle_type"],
-                            "lane_id": vehicle["lane_id"],
-                            "destination": vehicle["destination"],
-                            "timestamp": self.timestamp.isoformat(),
-                            "wait_time": self.vehicle_stats.get(vehicle["vehicle_id"], {}).get("wait_time", 0),
-                            "stops": self.vehicle_stats.get(vehicle["vehicle_id"], {}).get("stops", 0)
-                        })
-                    self.vehicles = []
+                    if self.vehicle_arrays is not None:
+                        forced = self.vehicle_arrays.force_pass(self.timestamp.isoformat())
+                    else:
+                        forced = []
+                        for vehicle in self.lane_queues.vehicles():
+                            wait_time, stops = self.lane_queues.stats(vehicle)
+                            forced.append({
+                                "vehicle_id": vehicle["vehicle_id"],
+                                "vehicle_type": vehicle["vehicle_type"],
+                                "lane_id": vehicle["lane_id"],
+                                "destination": vehicle["destination"],
+                                "timestamp": self.timestamp.isoformat(),
+                                "wait_time": wait_time,
+                                "stops": stops
+                            })
+                        self.passed_vehicles.extend(forced)
+                        self.lane_queues.clear()
+                    self._record_passed(forced)
                     break
 
+        return self.finish()
+
+    def advance(self, delta_time: int = STEP_SECONDS):
+        """Process one step of delta_time seconds and save its state"""
+        # Vehicles entering during this step join before it is processed
+        if self.next_arrival is not None:
+            self._enter_arrivals(self.timestamp + timedelta(seconds=delta_time))
+        self.timestamp += timedelta(seconds=delta_time)
+
+        # Check if it's time to change the signal
+        if self.timestamp >= self.signal_change_timestamp:
+            self._change_signal()
+
+        # Update pedestrian states first, then vehicle states
+        # This ensures pedestrians are cleared before allowing vehicles to turn left
+        self._update_pedestrians(delta_time)
+        self._update_vehicles(delta_time)
+        self._update_passed_vehicles(delta_time)
+
+        # Save current state
+        self._save_state()
+
+        # Track queue length
+        self._track_queue_length()
+
+        # Request the next decision early if the strategy supports it
+        self._request_signal_change()
+
+    def add_vehicles(self, vehicles: List[Dict[str, Any]]):
+        """Let vehicles enter the simulation, e.g. arrivals from an upstream intersection"""
+        if self.vehicle_arrays is not None:
+            self.vehicle_arrays.add(vehicles)
+            return
+        for vehicle in vehicles:
+            self.lane_queues.add(vehicle)
+
+    def _next_arrival(self):
+        """Peek at the next vehicle of the arrival stream"""
+        vehicle = next(self.pending_arrivals, None)
+        self.next_arrival = None if vehicle is None else (entry_time(vehicle), vehicle)
+
+    def _enter_arrivals(self, until: datetime):
+        """Add the vehicles whose entry time is not after `until`"""
+        entering = []
+        while self.next_arrival is not None and self.next_arrival[0] <= until:
+            entering.append(self.next_arrival[1])
+            self._next_arrival()
+        if entering:
+            self.add_vehicles(entering)
+
+    def finish(self):
+        """
+        Save the results of the run.
+
+        Returns:
+            The experiment directory, the metrics and the states
+        """
+        # Write the final positions of passed vehicles back into their records
+        if self.vehicle_arrays is not None:
+            self.vehicle_arrays.sync_passed()
+
         # Save final results
         self._save_results()
 
-        # Calculate metrics
-        metrics = calculate_metrics(
-            self.states,
-            self.passed_vehicles,
-            self.passed_pedestrians,
-            self.queue_lengths,
-            self.experiment_dir
-        )
+        # Stop strategies that decide on background threads
+        if hasattr(self.strategy, "close"):
+            self.strategy.close()
+
+        # Save the metrics
+        self._update_metrics()
+        metrics = self.live_metrics.save(self.experiment_dir)
+        if self.profiler is not None:
+            self.profiler.save(self.experiment_dir)
 
+        if self.state_writer is not None:
+            return self.experiment_dir, metrics, StateReader(self.state_writer.path)
         return self.experiment_dir, metrics, self.states
 
     def _save_results(self):
         """Save simulation results to the experiment directory"""
-        # Save states
-        with open(f"{self.experiment_dir}/states.json", "w") as file:
-            json.dump(self.states, file, indent=2)
+        # Save states (streamed runs already have them in states.ndjson)
+        if self.state_writer is not None:
+            self.state_writer.close()
+        else:
+            with open(f"{self.experiment_dir}/states.json", "w") as file:
+                # Event-driven runs interpolate their skipped states here
+                json.dump(list(self.states), file, indent=2)
+
+        # Write the remaining rows of the Parquet tables
+        if self.columnar_writer is not None:
+            self.columnar_writer.close()
 
-        # Save passed vehicles
-        with open(f"{self.experiment_dir}/passed_vehicles.json", "w") as file:
-            json.dump(self.passed_vehicles, file, indent=2)
+        # Save the passed vehicles, retired ones carried on to their final distance
+        self.passed_writer.close(self.passed_clock, self.passed_vehicles)
 
         # Save passed pedestrian
         with open(f"{self.experiment_dir}/passed_pedestrians.json", "w") as file:
@@ -346,9 +690,12 @@ class TrafficSimulator:
         with open(f"{self.experiment_dir}/scenario.json", "w") as file:
             json.dump(self.scenario, file, indent=2)
 
-        # Save strategy info
+        # Save strategy info (and decision statistics for strategies that keep them)
+        strategy_info = {"name": self.strategy_name, "engine": self.engine}
+        if hasattr(self.strategy, "stats"):
+            strategy_info["stats"] = self.strategy.stats()
         with open(f"{self.experiment_dir}/strategy.json", "w") as file:
-            json.dump({"name": self.strategy_name}, file, indent=2)
+            json.dump(strategy_info, file, indent=2)
 
 
 if __name__ == "__main__":
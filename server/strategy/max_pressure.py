@@ -0,0 +1,152 @@
+from typing import Dict, List, Any, Tuple
+
+from utils.scenario_cache import load_json
+
+# Crosswalk signal for each pedestrian count in the scenario
+CROSSWALKS = {
+    "Crosswalk_North_South": "crosswalk_north_south",
+    "Crosswalk_East_West": "crosswalk_east_west",
+}
+
+
+def duration_for_count(count: int) -> int:
+    """
+    Phase duration for the number of vehicles served, using the same bands as
+    CONTROLLER_PROMPT: under 20 vehicles 30-60s (closer to 30 under 10),
+    20-60 vehicles 60-120s, more than 60 vehicles 120-150s.
+    """
+    if count < 10:
+        return 30 + count
+    if count < 20:
+        return 40 + 2 * (count - 10)
+    if count <= 60:
+        return 60 + round(1.5 * (count - 20))
+    return min(150, 120 + (count - 60) // 2)
+
+
+class MaxPressureStrategy:
+    """
+    A local adaptive strategy that picks the traffic light configuration from
+    the traffic_configurations.json file with the highest weighted demand.
+
+    Each configuration is scored from the vehicles heading for its green
+    movements (stopped and emergency vehicles weigh more), the pedestrians
+    waiting at its green crosswalks and a penalty for every interval it has
+    not been served. No network calls are made, so a decision takes microseconds.
+    """
+
+    def __init__(self, config_path: str = "traffic_rules/traffic_configuration.json",
+                 queue_weight: float = 1.0,
+                 emergency_weight: float = 10.0,
+                 pedestrian_weight: float = 1.0,
+                 wait_penalty: float = 0.5,
+                 max_wait: int = 4):
+        """
+        Initialize with available traffic configurations and scoring weights.
+
+        Args:
+            config_path: Path to the traffic configuration JSON file
+            queue_weight: Extra weight of a vehicle already stopped in the queue
+            emergency_weight: Extra weight of an emergency vehicle
+            pedestrian_weight: Weight of a waiting pedestrian
+            wait_penalty: Score added per interval a configuration with demand has not been served
+            max_wait: Intervals after which a configuration with demand is served regardless of score
+        """
+        self.config_path = config_path
+        self.config = self._load_config()
+        self.traffic_signals = self.config.get("traffic_rules", {})
+        self.configurations = list(self.traffic_signals.keys())
+        self.queue_weight = queue_weight
+        self.emergency_weight = emergency_weight
+        self.pedestrian_weight = pedestrian_weight
+        self.wait_penalty = wait_penalty
+        self.max_wait = max_wait
+
+        # Green vehicle movements and crosswalks of every configuration
+        self.green_movements = {
+            name: [lane for lane, status in lights.items()
+                   if status == "green" and not lane.startswith("Crosswalk")]
+            for name, lights in self.traffic_signals.items()
+        }
+        self.green_crosswalks = {
+            name: [CROSSWALKS[lane] for lane, status in lights.items()
+                   if status == "green" and lane in CROSSWALKS]
+            for name, lights in self.traffic_signals.items()
+        }
+
+        # Decision number at which each configuration was last served
+        self.decisions = 0
+        self.last_served = {name: -1 for name in self.configurations}
+
+    def _load_config(self) -> Dict[str, Any]:
+        """Load traffic configurations from JSON file"""
+        return load_json(self.config_path)
+
+    def _demand(self, vehicles: List[Dict[str, Any]]) -> Tuple[Dict[str, float], Dict[str, int]]:
+        """Weighted demand and vehicle count per movement"""
+        demand: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        for vehicle in vehicles:
+            movement = vehicle.get("destination", "unknown")
+            weight = 1.0
+            if vehicle.get("speed_kmh", 0) == 0:
+                weight += self.queue_weight
+            if vehicle.get("emergency_vehicle", False):
+                weight += self.emergency_weight
+            demand[movement] = demand.get(movement, 0) + weight
+            counts[movement] = counts.get(movement, 0) + 1
+        return demand, counts
+
+    def score(self, name: str, demand: Dict[str, float], pedestrians: Dict[str, Any]) -> float:
+        """Pressure of a configuration plus its waiting-time penalty"""
+        pressure = sum(demand.get(movement, 0) for movement in self.green_movements[name])
+        pressure += self.pedestrian_weight * sum(
+            pedestrians.get(crosswalk, 0) for crosswalk in self.green_crosswalks[name])
+        if pressure == 0:
+            return 0
+        waited = self.decisions - self.last_served[name]
+        if waited > self.max_wait:
+            # Starved configurations outrank any unpenalized pressure
+            pressure += sum(demand.values()) + sum(
+                pedestrians.get(crosswalk, 0) for crosswalk in CROSSWALKS.values())
+        return pressure + self.wait_penalty * waited
+
+    def get_next_signal_status(self,
+                               current_signal: Dict[str, Any],
+                               vehicles: List[Dict[str, Any]],
+                               pedestrians: Dict[str, Any],
+                               weather: Dict[str, Any] = None,
+                               context: Dict[str, Any] = None) -> Dict[str, Any]:
+
+        demand, counts = self._demand(vehicles)
+        scores = {name: self.score(name, demand, pedestrians) for name in self.configurations}
+
+        # Highest score wins; ties (e.g. no traffic at all) go to the least recently served
+        next_config = max(self.configurations,
+                          key=lambda name: (scores[name], -self.last_served[name]))
+        self.decisions += 1
+        self.last_served[next_config] = self.decisions
+
+        count = sum(counts.get(movement, 0) for movement in self.green_movements[next_config])
+        duration_seconds = duration_for_count(count)
+        reasoning = (f"Max pressure selected {next_config} with score {scores[next_config]:.1f} "
+                     f"serving {count} vehicles for {duration_seconds} seconds")
+
+        # Get the signal configuration
+        next_signal = dict(self.traffic_signals[next_config])
+
+        # Preserve metadata from current signal
+        for key, value in current_signal.items():
+            if key not in next_signal and key not in ["last_changed", "next_timestamp"]:
+                next_signal[key] = value
+
+        # Store the configuration duration for use in simulator
+        next_signal["duration_seconds"] = duration_seconds
+
+        # Store weather and context data if provided
+        if weather:
+            next_signal["weather_data"] = weather
+        if context:
+            next_signal["context_data"] = context
+
+        return next_signal, reasoning
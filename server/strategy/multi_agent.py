@@ -1,49 +1,150 @@
-import json
+import copy
 import os
 import logging
-from typing import Dict, List, Any
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Any, Optional
+
 from traffic_optimizer.traffic_optimizer import TrafficOptimizer
+from traffic_optimizer.decision_cache import DecisionCache, get_shared_cache
+from strategy.set_interval import SetIntervalStrategy
+from utils.scenario_cache import load_json
+
+# Local choices used when the optimizer misses its deadline
+FALLBACKS = ["rotate", "extend"]
 
 class MultiAgentStrategy:
     """
-    A strategy that cycles through available traffic light configurations
-    at regular intervals from the traffic_configurations.json file.
+    A strategy that asks the LLM traffic optimizer for the next traffic light
+    configuration from the traffic_configurations.json file.
+
+    Decisions are requested on a background thread, ideally ahead of the signal
+    change, optionally within a hard deadline. Late or failed decisions are
+    replaced by a local fallback: the next set-interval configuration ("rotate")
+    or an extension of the current phase ("extend"). close() stops the thread.
     """
     
-    def __init__(self, config_path: str = "traffic_rules/traffic_configuration.json"):
-        """Initialize with available traffic configurations"""
+    def __init__(self, config_path: str = "traffic_rules/traffic_configuration.json",
+                 decision_cache: DecisionCache = None,
+                 use_decision_cache: Optional[bool] = None,
+                 deadline_seconds: Optional[float] = None,
+                 fallback: str = "rotate",
+                 prefetch_seconds: int = 10,
+                 extension_seconds: int = 30,
+                 token_budget: Optional[int] = None):
+        """
+        Initialize with available traffic configurations.
+        Every decision calls the optimizer unless a decision cache is given or the
+        process-wide one is opted into, in which case similar states reuse decisions.
+
+        Args:
+            config_path: Path to the traffic configuration JSON file
+            decision_cache: Decision cache to use
+            use_decision_cache: Use the process-wide decision cache when no decision_cache
+                is given (default from the DECISION_CACHE environment variable, off unless "1")
+            deadline_seconds: Wall-clock seconds a requested decision may take (None waits forever)
+            fallback: "rotate" or "extend" when the decision is late or fails
+            prefetch_seconds: Simulated seconds before a signal change to request the decision
+            extension_seconds: Duration of a phase extension fallback
+            token_budget: Maximum prompt tokens per optimizer call (unlimited if None)
+        """
+        if fallback not in FALLBACKS:
+            raise ValueError(f"Unknown fallback: {fallback}")
         self.config_path = config_path
         self.config = self._load_config()
         self.traffic_signals = self.config.get("traffic_rules", {})
+        self.deadline_seconds = deadline_seconds
+        self.fallback = fallback
+        self.prefetch_seconds = prefetch_seconds
+        self.extension_seconds = extension_seconds
 
         # Initialise LLM Traffic Optimizer
+        if use_decision_cache is None:
+            use_decision_cache = os.environ.get("DECISION_CACHE", "0") == "1"
+        if decision_cache is None and use_decision_cache:
+            decision_cache = get_shared_cache()
         self.traffic_optimizer = TrafficOptimizer(
-            traffic_config_path=self.config_path
+            traffic_config_path=self.config_path,
+            cache=decision_cache,
+            token_budget=token_budget
         )
+        self.fallback_strategy = SetIntervalStrategy(config_path=self.config_path)
+
+        # Memory of applied configurations (most recent first), including fallbacks
+        self.memory: List[Dict[str, Any]] = []
+        self.current_configuration = None
+
+        # Outstanding decision request: (future, submitted at)
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="optimizer")
+        self.pending = None
+
+        # Decision statistics
+        self.decision_latencies: List[float] = []
+        self.fallback_count = 0
+        self.late_count = 0
+        self.error_count = 0
 
     def _load_config(self) -> Dict[str, Any]:
         """Load traffic configurations from JSON file"""
-        with open(self.config_path, 'r') as file:
-            return json.load(file)
-            
+        return load_json(self.config_path)
+
+    def request_next_signal_status(self,
+                                   current_signal: Dict[str, Any],
+                                   vehicles: List[Dict[str, Any]],
+                                   pedestrians: Dict[str, Any],
+                                   weather: Dict[str, Any] = None,
+                                   context: Dict[str, Any] = None):
+        """Start computing the next decision in the background from a snapshot of the current state"""
+        configuration_state = {
+            "vehicles": self.aggregate_vehicles(vehicles),
+            "pedestrians": copy.deepcopy(pedestrians),
+            "weather": weather,
+            "context": context
+        }
+        future = self.executor.submit(self._optimize, configuration_state, list(self.memory))
+        self.pending = (future, time.perf_counter())
+
+    def _optimize(self, configuration_state: Dict[str, Any], memory: List[Dict[str, Any]]):
+        """Run the optimizer and time it (executed on the background thread)"""
+        start = time.perf_counter()
+        results = self.traffic_optimizer.optimize(
+            configuration_state=configuration_state, custom_memory=memory)
+        return results, time.perf_counter() - start
+
     def get_next_signal_status(self, 
                               current_signal: Dict[str, Any], 
                               vehicles: List[Dict[str, Any]],
                               pedestrians: Dict[str, Any],
                               weather: Dict[str, Any] = None,
                               context: Dict[str, Any] = None) -> Dict[str, Any]:
-        
-        results = self.traffic_optimizer.optimize(
-            configuration_state = {
-                "vehicles": self.aggregate_vehicles(vehicles),
-                "pedestrians": pedestrians,
-                "weather" : weather,
-                "context" : context
-            }
-        )
-     
-        # Get the signal configuration
-        next_signal = dict(self.traffic_signals[results["selected_configuration"]])
+
+        # Nothing was requested ahead of time, ask now
+        if self.pending is None:
+            self.request_next_signal_status(current_signal, vehicles, pedestrians, weather, context)
+        future, submitted_at = self.pending
+        self.pending = None
+
+        try:
+            timeout = None
+            if self.deadline_seconds is not None:
+                timeout = max(0, self.deadline_seconds - (time.perf_counter() - submitted_at))
+            results, latency = future.result(timeout=timeout)
+            self.decision_latencies.append(latency)
+            # Get the signal configuration
+            next_signal = dict(self.traffic_signals[results["selected_configuration"]])
+        except FutureTimeoutError:
+            # Drop the request if it has not reached the API yet
+            future.cancel()
+            self.late_count += 1
+            return self._fallback_signal_status(
+                current_signal, vehicles, pedestrians, weather, context,
+                f"Optimizer missed its {self.deadline_seconds}s deadline")
+        except Exception as e:
+            self.error_count += 1
+            return self._fallback_signal_status(
+                current_signal, vehicles, pedestrians, weather, context,
+                f"Optimizer failed ({str(e)})")
         
         # Store the configuration duration for use in simulator
         next_signal["duration_seconds"] = results["duration_seconds"]
@@ -53,10 +154,76 @@ class MultiAgentStrategy:
             next_signal["weather_data"] = weather
         if context:
             next_signal["context_data"] = context
-        
+
+        self._remember(results["selected_configuration"], results["duration_seconds"])
         justification = results["justification"]
         return next_signal, justification
-    
+
+    def close(self):
+        """Cancel the outstanding decision request and stop the background thread"""
+        if self.pending is not None:
+            self.pending[0].cancel()
+            self.pending = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _fallback_signal_status(self,
+                                current_signal: Dict[str, Any],
+                                vehicles: List[Dict[str, Any]],
+                                pedestrians: Dict[str, Any],
+                                weather: Dict[str, Any],
+                                context: Dict[str, Any],
+                                cause: str):
+        """Choose the next signal locally when no optimizer decision is available"""
+        self.fallback_count += 1
+
+        if self.fallback == "extend":
+            configuration = self.current_configuration or self._configuration_name(current_signal)
+            next_signal = {key: value for key, value in current_signal.items()
+                           if key not in ["last_changed", "next_timestamp"]}
+            next_signal["duration_seconds"] = self.extension_seconds
+            reasoning = f"{cause}; extending the current phase by {self.extension_seconds} seconds"
+        else:
+            next_signal, reasoning = self.fallback_strategy.get_next_signal_status(
+                current_signal, vehicles, pedestrians, weather, context)
+            configuration = self.fallback_strategy.configurations[self.fallback_strategy.current_index]
+            reasoning = f"{cause}; {reasoning.lower()}"
+
+        self._remember(configuration, next_signal["duration_seconds"])
+        return next_signal, reasoning
+
+    def _remember(self, configuration: Optional[str], duration: int):
+        """Record the applied configuration, keeping the 5 previous entries like the optimizer"""
+        self.current_configuration = configuration
+        self.memory = [{"configuration": configuration, "duration": duration}] + self.memory[:5]
+
+    def _configuration_name(self, signal: Dict[str, Any]) -> Optional[str]:
+        """Name of the configuration whose lights match a signal status, if any"""
+        for name, lights in self.traffic_signals.items():
+            if all(signal.get(lane) == status for lane, status in lights.items()):
+                return name
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Decision statistics for the experiment record"""
+        latencies = sorted(self.decision_latencies)
+        latency = None
+        if latencies:
+            latency = {
+                "mean": statistics.mean(latencies),
+                "p50": latencies[len(latencies) // 2],
+                "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                "max": latencies[-1]
+            }
+        return {
+            "decisions": len(latencies),
+            "fallbacks": self.fallback_count,
+            "late_decisions": self.late_count,
+            "failed_decisions": self.error_count,
+            "decision_latency_seconds": latency,
+            "decision_cache": self.traffic_optimizer.cache_stats(),
+            "prompt_tokens": self.traffic_optimizer.token_stats()
+        }
+
     def aggregate_vehicles(self, vehicles: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Aggregate vehicle data to provide a summary for the traffic optimizer.
@@ -67,7 +234,10 @@ class MultiAgentStrategy:
         Returns:
             Dict containing aggregated vehicle data
         """
-       
+        # The simulator's lane index keeps these counts up to date already
+        if hasattr(vehicles, "summary"):
+            return vehicles.summary()
+
         aggregated_data = {
             "total_count": len(vehicles),
             "by_lane": {},
@@ -1,7 +1,9 @@
-import json
 import os
 from typing import Dict, List, Any
 
+from utils.scenario_cache import load_json
+
+
 class SetIntervalStrategy:
     """
     A strategy that cycles through available traffic light configurations
@@ -18,8 +20,7 @@ class SetIntervalStrategy:
         
     def _load_config(self) -> Dict[str, Any]:
         """Load traffic configurations from JSON file"""
-        with open(self.config_path, 'r') as file:
-            return json.load(file)
+        return load_json(self.config_path)
             
     def get_next_signal_status(self, 
                               current_signal: Dict[str, Any], 
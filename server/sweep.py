@@ -0,0 +1,242 @@
+import argparse
+import csv
+import glob
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional
+
+from tqdm import tqdm
+
+from simulator import TrafficSimulator
+
+# Directory for storing scenarios
+SCENARIOS_DIR = "scenarios"
+
+# TrafficSimulator keyword arguments a sweep may vary
+SWEEP_PARAMETERS = ["engine", "mode", "render_radius", "timed_arrivals", "stream_states", "columnar"]
+
+
+def resolve_scenarios(scenarios: List[str], allow_paths: bool = True) -> List[str]:
+    """
+    Turn scenario names, file paths or glob patterns into scenario file paths.
+    The special name "all" expands to every scenario in the scenarios directory.
+    Without allow_paths (requests over HTTP), names and glob patterns only match
+    scenario files inside the scenarios directory.
+    """
+    paths = []
+    for scenario in scenarios:
+        if scenario == "all":
+            paths.extend(sorted(glob.glob(os.path.join(SCENARIOS_DIR, "*.json"))))
+        elif not allow_paths and (os.path.basename(scenario) != scenario or scenario.startswith(".")):
+            raise ValueError(f"Invalid scenario name: {scenario}")
+        elif any(char in scenario for char in "*?["):
+            if allow_paths:
+                paths.extend(sorted(glob.glob(scenario)))
+            else:
+                paths.extend(path for path in sorted(glob.glob(os.path.join(SCENARIOS_DIR, scenario)))
+                             if path.endswith(".json"))
+        elif allow_paths and os.path.exists(scenario):
+            paths.append(scenario)
+        else:
+            name = scenario if scenario.endswith('.json') else scenario + '.json'
+            path = os.path.join(SCENARIOS_DIR, name)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Scenario {name} not found")
+            paths.append(path)
+    return paths
+
+
+def build_grid(scenarios: List[str],
+               strategies: List[str],
+               max_steps: List[int],
+               parameters: Optional[Dict[str, List[Any]]] = None,
+               allow_paths: bool = True) -> List[Dict[str, Any]]:
+    """
+    Expand the sweep axes into one run specification per combination.
+
+    Args:
+        scenarios: Scenario names, paths or glob patterns
+        strategies: Strategy names
+        max_steps: Step limits to try
+        parameters: Extra TrafficSimulator keyword arguments (see SWEEP_PARAMETERS),
+            each with a list of values
+        allow_paths: Accept scenario paths outside the scenarios directory
+
+    Returns:
+        List of run specifications
+
+    Raises:
+        ValueError: If a parameter cannot be swept or a scenario name is invalid
+    """
+    parameters = parameters or {}
+    unknown = [name for name in parameters if name not in SWEEP_PARAMETERS]
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(unknown)}. "
+                         f"Choose from {', '.join(SWEEP_PARAMETERS)}")
+    names = list(parameters)
+    runs = []
+    for scenario_path, strategy, steps, values in itertools.product(
+            resolve_scenarios(scenarios, allow_paths), strategies, max_steps,
+            itertools.product(*(parameters[name] for name in names))):
+        runs.append({
+            "run_id": len(runs),
+            "scenario": os.path.splitext(os.path.basename(scenario_path))[0],
+            "scenario_path": scenario_path,
+            "strategy": strategy,
+            "max_steps": steps,
+            "parameters": dict(zip(names, values))
+        })
+    return runs
+
+
+def _run_one(run: Dict[str, Any], sweep_dir: str) -> Dict[str, Any]:
+    """Run a single simulation of the grid (executed in a worker process)"""
+    result = {key: value for key, value in run.items() if key != "scenario_path"}
+    experiment_dir = os.path.join(sweep_dir, f"run_{run['run_id']:05d}")
+    start = time.perf_counter()
+    try:
+        simulator = TrafficSimulator(
+            run["scenario_path"],
+            strategy=run["strategy"],
+            experiment_dir=experiment_dir,
+            **run["parameters"]
+        )
+        _, metrics, _ = simulator.run(max_steps=run["max_steps"])
+        result["metrics"] = metrics
+        result["error"] = None
+    except Exception as e:
+        result["metrics"] = None
+        result["error"] = str(e)
+    result["experiment_dir"] = experiment_dir
+    result["elapsed_seconds"] = time.perf_counter() - start
+    return result
+
+
+def flatten_metrics(metrics: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Flatten nested metric dicts into dotted column names"""
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def comparison_table(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One flat row per run with its grid coordinates and metrics"""
+    rows = []
+    for result in results:
+        row = {
+            "run_id": result["run_id"],
+            "scenario": result["scenario"],
+            "strategy": result["strategy"],
+            "max_steps": result["max_steps"],
+        }
+        row.update(result["parameters"])
+        if result["metrics"]:
+            row.update(flatten_metrics(result["metrics"]))
+        row["elapsed_seconds"] = round(result["elapsed_seconds"], 3)
+        row["error"] = result["error"]
+        rows.append(row)
+    return rows
+
+
+def run_sweep(runs: List[Dict[str, Any]],
+              workers: Optional[int] = None,
+              sweep_dir: Optional[str] = None,
+              progress: bool = True,
+              on_result: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Fan the runs out over a process pool and collect their metrics.
+
+    Args:
+        runs: Run specifications from build_grid
+        workers: Number of worker processes (defaults to the number of CPUs)
+        sweep_dir: Directory for the per-run experiments and the comparison table
+        progress: Show a progress bar
+        on_result: Called with (finished runs, total runs) after every run; an
+            exception raised by it cancels the runs that have not started
+
+    Returns:
+        Dict with the sweep directory, per-run results and the comparison table
+    """
+    sweep_dir = sweep_dir or f"experiments/sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    os.makedirs(sweep_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    results = []
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(_run_one, run, sweep_dir) for run in runs]
+        with tqdm(total=len(futures), desc="Sweep", unit="run", disable=not progress) as bar:
+            for future in as_completed(futures):
+                results.append(future.result())
+                bar.update(1)
+                if on_result is not None:
+                    on_result(len(results), len(futures))
+    finally:
+        # Runs that have not started are dropped if the sweep is aborted
+        executor.shutdown(wait=True, cancel_futures=True)
+    results.sort(key=lambda result: result["run_id"])
+    table = comparison_table(results)
+
+    # Save the comparison table
+    with open(f"{sweep_dir}/results.json", "w") as file:
+        json.dump(results, file, indent=2)
+    columns = list(dict.fromkeys(column for row in table for column in row))
+    with open(f"{sweep_dir}/results.csv", "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(table)
+
+    return {"sweep_dir": sweep_dir, "results": results, "table": table}
+
+
+def parse_parameter(value: str):
+    """Parse a NAME=V1,V2 command-line parameter, decoding JSON values where possible"""
+    name, _, values = value.partition("=")
+    parsed = []
+    for item in values.split(","):
+        try:
+            parsed.append(json.loads(item))
+        except json.JSONDecodeError:
+            parsed.append(item)
+    return name, parsed
+
+
+def parse_arguments() -> argparse.Namespace:
+    # Setup command-line argument parsing
+    parser = argparse.ArgumentParser(
+        description="Run a scenario x strategy grid of traffic simulations in parallel"
+    )
+    parser.add_argument("--scenarios", nargs="+", default=["all"],
+                        help="Scenario names, paths or glob patterns ('all' for every stored scenario)")
+    parser.add_argument("--strategies", nargs="+", default=["set_interval"],
+                        help="Strategies to compare")
+    parser.add_argument("--max_steps", nargs="+", type=int, default=[10000],
+                        help="Maximum simulation steps")
+    parser.add_argument("--param", action="append", default=[], type=parse_parameter,
+                        help="Extra simulator parameter as NAME=V1,V2 (e.g. engine=dict,numpy), "
+                             f"one of {', '.join(SWEEP_PARAMETERS)}")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (defaults to the number of CPUs)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    runs = build_grid(args.scenarios, args.strategies, args.max_steps, dict(args.param))
+    sweep = run_sweep(runs, workers=args.workers)
+
+    columns = ["scenario", "strategy", "max_steps", *dict(args.param),
+               "throughput_per_hour.vehicles", "average_delay_per_vehicle",
+               "total_stops", "max_queue_length", "error"]
+    print(" | ".join(columns))
+    for row in sweep["table"]:
+        print(" | ".join(str(row.get(column, "")) for column in columns))
+    print(f"Sweep complete. Results saved to {sweep['sweep_dir']}")
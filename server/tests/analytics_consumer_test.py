@@ -0,0 +1,70 @@
+import time
+
+import orjson
+
+from vehicle_estimator.video_streaming import consumer
+from vehicle_estimator.video_streaming.broker import InMemoryBroker
+from vehicle_estimator.video_streaming.consumer import AnalyticsCache, AnalyticsConsumer
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_analytics_are_served_from_the_background_consumer(monkeypatch):
+    broker = InMemoryBroker()
+    analytics = AnalyticsConsumer("video-analytics", AnalyticsCache(history_size=3),
+                                  consumer_factory=broker.consumer, poll_timeout_ms=50)
+    monkeypatch.setattr(consumer, "_analytics_consumer", analytics.start())
+    _wait_for(analytics.connected.is_set)
+
+    producer = broker.producer(value_serializer=orjson.dumps)
+    for index in range(5):
+        producer.send("video-analytics", {"camera_id": "north", "window_end": index, "lane_counts": {"a": index}})
+    producer.send("video-analytics", {"camera_id": "south", "window_end": 0, "lane_counts": {"a": 9}})
+    broker.append("video-analytics", b"not json")
+    _wait_for(lambda: analytics.cache.received == 6 and analytics.invalid_messages == 1)
+
+    try:
+        client = consumer.app.test_client()
+        body = client.get("/analytics").get_json()
+        assert body["latest_frame_data"]["camera_id"] == "south"
+        assert set(body["cameras"]) == {"north", "south"}
+        assert client.get("/analytics?camera_id=north").get_json()["latest_frame_data"]["window_end"] == 4
+
+        recent = client.get("/analytics/recent?camera_id=north&limit=2").get_json()["messages"]
+        assert [message["window_end"] for message in recent] == [3, 4]
+        # The ring buffer keeps the last three windows
+        assert len(client.get("/analytics/recent?camera_id=north").get_json()["messages"]) == 3
+        assert client.get("/analytics/recent?limit=0").status_code == 400
+
+        status = client.get("/analytics/status").get_json()
+        assert status["running"] and status["received"] == 6
+    finally:
+        analytics.stop()
+    assert not analytics.thread.is_alive()
+
+
+def test_consumer_reconnects_after_failures(monkeypatch):
+    monkeypatch.setattr(consumer, "RETRY_SECONDS", 0.01)
+    broker = InMemoryBroker()
+    attempts = []
+
+    def flaky_consumer(topic):
+        attempts.append(topic)
+        if len(attempts) == 1:
+            raise ConnectionError("broker unavailable")
+        return broker.consumer(topic)
+
+    analytics = AnalyticsConsumer("video-analytics", AnalyticsCache(), consumer_factory=flaky_consumer,
+                                  poll_timeout_ms=50).start()
+    try:
+        _wait_for(analytics.connected.is_set)
+        broker.producer(value_serializer=orjson.dumps).send("video-analytics", {"lane_counts": {}})
+        _wait_for(lambda: analytics.cache.get_latest(consumer.DEFAULT_CAMERA) is not None)
+        assert analytics.last_error == "broker unavailable"
+    finally:
+        analytics.stop()
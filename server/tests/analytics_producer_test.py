@@ -0,0 +1,72 @@
+import orjson
+import pytest
+
+from vehicle_estimator.detection.analytics_producer import WindowAggregator, WindowedPublisher
+
+LANES = ["left", "straight"]
+FPS = 30
+
+
+def _frames(seconds, counts=lambda index: {"left": index % 5, "straight": 2}, speeds=None):
+    for index in range(1, int(seconds * FPS) + 1):
+        yield index / FPS, index, counts(index), speeds(index) if speeds else None
+
+
+def test_tumbling_windows_keep_means_and_peaks():
+    aggregator = WindowAggregator(LANES, size_seconds=1.0)
+    windows = []
+    for frame in _frames(3):
+        windows += aggregator.add(*frame)
+    windows += aggregator.flush()
+
+    assert [(window["window_start"], window["window_end"]) for window in windows] == [
+        (0, 1), (1, 2), (2, 3), (3, 4)]
+    assert [window["frames"] for window in windows] == [29, 30, 30, 1]
+    assert windows[1]["first_frame"] == 30 and windows[1]["last_frame"] == 59
+    assert windows[1]["lane_counts"] == {"left": 2.0, "straight": 2.0}
+    assert windows[1]["lane_counts_peak"] == {"left": 4, "straight": 2}
+    assert windows[1]["lane_speeds"] == {"left": None, "straight": None}
+
+
+def test_sliding_windows_overlap_and_cover_gaps():
+    aggregator = WindowAggregator(LANES, size_seconds=2.0, slide_seconds=0.5)
+    windows = []
+    for frame in _frames(1, speeds=lambda index: {"left": 30.0 if index < 15 else 50.0, "straight": None}):
+        windows += aggregator.add(*frame)
+    # A single frame after a gap of several slides
+    windows += aggregator.add(5.0, 150, {"left": 9, "straight": 0})
+    windows += aggregator.flush()
+
+    assert [window["window_end"] for window in windows] == [0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 5.5]
+    assert [window["frames"] for window in windows] == [14, 29, 30, 30, 16, 1, 1]
+    assert windows[2]["lane_speeds"]["left"] == pytest.approx((14 * 30 + 16 * 50) / 30, abs=0.05)
+    assert windows[-1]["lane_counts_peak"] == {"left": 9, "straight": 0}
+
+    with pytest.raises(ValueError):
+        WindowAggregator(LANES, size_seconds=1.0, slide_seconds=0.3)
+
+
+class FakeProducer:
+    def __init__(self):
+        self.sent = []
+        self.flushed = False
+
+    def send(self, topic, value, key):
+        self.sent.append((topic, orjson.dumps(value), key))
+
+    def flush(self):
+        self.flushed = True
+
+
+def test_publisher_sends_one_message_per_window():
+    producer = FakeProducer()
+    publisher = WindowedPublisher(producer, "video-analytics", "camera-1", WindowAggregator(LANES))
+    for frame in _frames(10):
+        publisher.publish(*frame)
+    publisher.close()
+
+    assert publisher.messages == len(producer.sent) == 11
+    assert producer.flushed
+    topic, value, key = producer.sent[0]
+    assert (topic, key) == ("video-analytics", "camera-1")
+    assert orjson.loads(value)["camera_id"] == "camera-1"
@@ -0,0 +1,44 @@
+import json
+
+from benchmark import HIGHER_IS_BETTER, find_regressions, record, run_benchmarks
+
+
+def _run(ticks_per_second, api_run_seconds, machine="ci"):
+    return {"machine": machine,
+            "results": {"100": {"ticks_per_second": ticks_per_second, "api_run_seconds": api_run_seconds}}}
+
+
+def test_regressions_are_measured_against_recent_median():
+    history = [_run(500, 9.0), _run(1000, 1.0), _run(1000, 1.0), _run(1100, 1.2)]
+
+    assert find_regressions(_run(900, 1.1)["results"], history, threshold=0.2, baseline_runs=3) == []
+
+    regressions = find_regressions(_run(700, 1.5)["results"], history, threshold=0.2, baseline_runs=3)
+    assert [(r["metric"], r["baseline"]) for r in regressions] == [
+        ("ticks_per_second", 1000), ("api_run_seconds", 1.0)]
+    # New sizes have nothing to compare with
+    assert find_regressions({"5000": {"ticks_per_second": 1}}, history) == []
+
+
+def test_baseline_only_uses_runs_of_the_same_machine():
+    history = [_run(1000, 1.0), _run(3000, 0.2, machine="workstation")]
+
+    assert find_regressions(_run(900, 1.1)["results"], history, threshold=0.2, machine="ci") == []
+    assert len(find_regressions(_run(900, 1.1)["results"], history, threshold=0.2, machine="workstation")) == 2
+    # Without a machine every run counts
+    assert [r["baseline"] for r in find_regressions(_run(900, 1.1)["results"], history, threshold=0.2)] == [
+        2000, 0.6]
+
+
+def test_benchmarks_measure_every_metric_and_record_history(tmp_path):
+    results = run_benchmarks([30])
+    assert set(HIGHER_IS_BETTER) <= set(results["30"])
+    assert results["30"]["ticks_per_second"] > 0
+
+    history_path = str(tmp_path / "history.json")
+    record(results, history_path)
+    slower = {"30": {**results["30"], "ticks_per_second": results["30"]["ticks_per_second"] / 10}}
+    run = record(slower, history_path, threshold=0.5)
+    assert [regression["metric"] for regression in run["regressions"]] == ["ticks_per_second"]
+    with open(history_path) as file:
+        assert len(json.load(file)) == 2
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from simulator import TrafficSimulator
+from utils.columnar import ColumnarWriter, load_experiment, load_table, load_metrics_inputs
+from utils.metrics import calculate_metrics
+
+
+@pytest.mark.parametrize("mode", ["tick", "event"])
+def test_tables_match_states_and_metrics(tmp_path, mode):
+    simulator = TrafficSimulator("scenarios/scenario4.json", experiment_dir=str(tmp_path),
+                                 mode=mode, columnar=True)
+    _, metrics, states = simulator.run()
+    states = list(states)
+    tables = load_experiment(str(tmp_path))
+
+    assert len(tables["signals"]) == len(states)
+    assert tables["signals"]["queue_length"].tolist() == [state["queue_length"] for state in states]
+    assert tables["signals"]["Northbound_Straight"].tolist() == [
+        state["signal_status"]["Northbound_Straight"] for state in states]
+    assert len(tables["vehicles"]) == sum(len(state["vehicles"]) for state in states)
+    with open(tmp_path / "passed_vehicles.json") as file:
+        passed_ids = [vehicle["vehicle_id"] for vehicle in json.load(file)]
+    assert tables["passed_vehicles"]["vehicle_id"].tolist() == passed_ids
+
+    step = load_table(str(tmp_path), "vehicles", ["vehicle_id", "passed"], filters=[("step", "==", 10)])
+    assert step["vehicle_id"].tolist() == [vehicle["vehicle_id"] for vehicle in states[10]["vehicles"]]
+    # Passed vehicles are the ones beyond the stop line
+    assert step["passed"].tolist() == [
+        vehicle["distance_to_intersection_m"] < 0 for vehicle in states[10]["vehicles"]]
+    assert step["passed"].any() and not step["passed"].all()
+
+    assert calculate_metrics(**load_metrics_inputs(str(tmp_path)), output_dir=str(tmp_path)) == metrics
+
+
+def test_passed_flag_comes_from_the_simulator(tmp_path):
+    writer = ColumnarWriter(str(tmp_path), ["Northbound_Straight"])
+    vehicles = [{"vehicle_id": "passed", "distance_to_intersection_m": -20.0},
+                # Generated vehicles may carry stops before they reach the line
+                {"vehicle_id": "approaching", "distance_to_intersection_m": 80.0, "stops": 1}]
+    writer.write_state({"timestamp": "2025-03-19T08:00:00", "signal_status": {}, "reasoning": "",
+                        "vehicles": vehicles, "pedestrians": {}, "queue_length": 0,
+                        "passed_vehicles_count": 1, "passed_pedestrians_count": 0}, passed=1)
+    writer.close()
+
+    assert load_table(str(tmp_path), "vehicles", ["passed"])["passed"].tolist() == [True, False]
@@ -0,0 +1,10 @@
+import pytest
+
+from tests.stub_client import install_stub_client
+
+
+@pytest.fixture
+def fake_completions(monkeypatch):
+    """Replace the OpenAI client of a TrafficOptimizer: fake_completions(optimizer, **options)"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    return install_stub_client
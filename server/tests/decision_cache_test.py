@@ -0,0 +1,55 @@
+from traffic_optimizer.decision_cache import DecisionCache, quantize
+from traffic_optimizer.traffic_optimizer import TrafficOptimizer
+
+
+def make_optimizer(cache, fake_completions):
+    optimizer = TrafficOptimizer(
+        traffic_config_path="traffic_rules/traffic_configuration.json", cache=cache)
+    return optimizer, fake_completions(optimizer)
+
+
+def state(count):
+    return {
+        "vehicles": {"total_count": count, "by_lane": {"Northbound_Straight": count},
+                     "by_destination": {"Northbound_Straight": count}, "emergency_vehicles": []},
+        "pedestrians": {"crosswalk_north_south": 1, "crosswalk_east_west": 0, "timestamp": "t"},
+        "weather": "Clear",
+        "context": None
+    }
+
+
+def test_quantize_keeps_zero_distinct():
+    assert quantize(0, 5) == 0
+    assert quantize(1, 5) == quantize(5, 5) == 1
+    assert quantize(6, 5) == 2
+
+
+def test_similar_states_share_a_decision(fake_completions):
+    cache = DecisionCache(count_bucket=5)
+    optimizer, completions = make_optimizer(cache, fake_completions)
+
+    first = optimizer.optimize(state(11), custom_memory=[])
+    second = optimizer.optimize(state(14), custom_memory=[])
+    optimizer.optimize(state(30), custom_memory=[])
+
+    assert first == second
+    assert completions.calls == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    assert optimizer.memory[0] == {"configuration": "ns_straight_priority", "duration": 45}
+
+
+def test_lru_eviction_and_persistent_tier(tmp_path):
+    path = str(tmp_path / "decisions.sqlite")
+    cache = DecisionCache(max_size=1, path=path)
+    cache.put("a", {"value": 1})
+    cache.put("b", {"value": 2})
+    assert list(cache.entries) == ["b"]
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("a") == {"value": 1}
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+    reopened = DecisionCache(path=path)
+    assert reopened.get("b") == {"value": 2}
+    reopened.close()
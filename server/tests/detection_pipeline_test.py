@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from vehicle_estimator.detection.pipeline import FPSMeter, Pipeline
+
+
+def test_results_keep_source_order_across_batched_stages():
+    batches = []
+
+    def infer(batch):
+        batches.append(len(batch))
+        # Later items finish faster, order must still hold
+        time.sleep(0.001 * (5 - len(batches) % 5))
+        return [item * 10 for item in batch]
+
+    pipeline = Pipeline(range(23), queue_size=2)
+    pipeline.add_stage("infer", infer, batch_size=4).add_stage("track", lambda item: item + 1)
+    assert list(pipeline.run()) == [item * 10 + 1 for item in range(23)]
+    # Full batches until the stream runs out
+    assert batches == [4, 4, 4, 4, 4, 3]
+    assert pipeline.stats["track"]["items"] == 23
+
+
+def test_full_queues_hold_back_decoding():
+    decoded = []
+
+    def source():
+        for item in range(100):
+            decoded.append(item)
+            yield item
+
+    pipeline = Pipeline(source(), queue_size=2)
+    pipeline.add_stage("infer", lambda item: item)
+    results = pipeline.run()
+    assert next(results) == 0
+    time.sleep(0.2)
+    # Two queues of two plus the items held by the workers
+    assert len(decoded) <= 8
+    results.close()
+    assert pipeline.stopped.is_set()
+    assert all(thread.name not in ["decode", "infer"] for thread in threading.enumerate())
+
+
+def test_stage_errors_stop_the_pipeline():
+    def infer(item):
+        if item == 3:
+            raise RuntimeError("model failed")
+        return item
+
+    pipeline = Pipeline(range(1000), queue_size=4)
+    pipeline.add_stage("infer", infer)
+    results = []
+    with pytest.raises(RuntimeError, match="model failed"):
+        for item in pipeline.run():
+            results.append(item)
+    # Items still queued behind the failure are dropped
+    assert results == [0, 1, 2][:len(results)]
+    assert pipeline.failed_stage == "infer"
+
+
+def test_fps_is_reported_once_per_interval(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "perf_counter", lambda: now[0])
+    meter = FPSMeter(interval=2.0)
+    reports = []
+    for _ in range(48):
+        now[0] += 0.125
+        reports.append(meter.tick())
+    assert [fps for fps in reports if fps is not None] == [8.0] * 3
+    assert meter.average() == 8.0
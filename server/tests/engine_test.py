@@ -0,0 +1,129 @@
+import glob
+import json
+import pytest
+from simulator import TrafficSimulator
+from engine.lanes import LaneQueues
+from strategy.multi_agent import MultiAgentStrategy
+
+
+@pytest.mark.parametrize("scenario_path", sorted(glob.glob("scenarios/*.json")))
+def test_numpy_engine_matches_dict_engine(scenario_path):
+    results = {}
+    for engine in ["dict", "numpy"]:
+        simulator = TrafficSimulator(scenario_path, strategy="set_interval", engine=engine)
+        experiment_dir, metrics, states = simulator.run()
+        with open(f"{experiment_dir}/passed_vehicles.json") as file:
+            results[engine] = (metrics, states, json.load(file))
+
+    assert results["numpy"] == results["dict"]
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        TrafficSimulator("scenarios/scenario1.json", engine="gpu")
+
+
+def _assert_same_vehicles(vehicles, expected):
+    """Vehicles match exactly, except for distances that may differ by rounding"""
+    assert [{**v, "distance_to_intersection_m": None} for v in vehicles] == [
+        {**v, "distance_to_intersection_m": None} for v in expected]
+    assert [v.get("distance_to_intersection_m") for v in vehicles] == pytest.approx(
+        [v.get("distance_to_intersection_m") for v in expected])
+
+
+def _assert_same_state(state, expected):
+    """States match exactly, except for vehicle distances that may differ by rounding"""
+    assert {key: value for key, value in state.items() if key != "vehicles"} == {
+        key: value for key, value in expected.items() if key != "vehicles"}
+    _assert_same_vehicles(state["vehicles"], expected["vehicles"])
+
+
+@pytest.mark.parametrize("engine", ["dict", "numpy"])
+@pytest.mark.parametrize("scenario_path", sorted(glob.glob("scenarios/*.json")))
+def test_event_mode_matches_tick_mode(scenario_path, engine):
+    tick = TrafficSimulator(scenario_path, engine=engine)
+    _, tick_metrics, tick_states = tick.run()
+    event = TrafficSimulator(scenario_path, engine=engine, mode="event")
+    _, event_metrics, event_states = event.run()
+
+    assert event_metrics == tick_metrics
+    assert len(event_states.keyframes) <= len(tick_states)
+    assert len(event_states) == len(tick_states)
+    for event_state, tick_state in zip(event_states, tick_states):
+        _assert_same_state(event_state, tick_state)
+
+
+@pytest.mark.parametrize("engine", ["dict", "numpy"])
+def test_event_mode_skips_idle_ticks(engine):
+    # Vehicles spend most of scenario 4 approaching the line under an unchanged signal
+    _, _, tick_states = TrafficSimulator("scenarios/scenario4.json", engine=engine).run()
+    _, _, event_states = TrafficSimulator("scenarios/scenario4.json", engine=engine, mode="event").run()
+
+    assert len(event_states.keyframes) < len(tick_states) / 2
+    keyframes = set(event_states.offsets)
+    interpolated = [index for index in range(len(event_states)) if index not in keyframes]
+    assert len(interpolated) == len(tick_states) - len(keyframes)
+    for index in interpolated:
+        _assert_same_state(event_states[index], tick_states[index])
+
+
+@pytest.mark.parametrize("engine", ["dict", "numpy"])
+def test_passed_vehicles_beyond_render_radius_are_retired(engine, tmp_path):
+    retired = TrafficSimulator("scenarios/scenario3.json", engine=engine, render_radius=50,
+                               experiment_dir=str(tmp_path / "retired"))
+    _, retired_metrics, retired_states = retired.run()
+    kept = TrafficSimulator("scenarios/scenario3.json", engine=engine, render_radius=None,
+                            experiment_dir=str(tmp_path / "kept"))
+    _, kept_metrics, kept_states = kept.run()
+
+    assert retired_metrics == kept_metrics
+    assert [state["queue_length"] for state in retired_states] == [state["queue_length"] for state in kept_states]
+    for state in retired_states:
+        assert all(vehicle["distance_to_intersection_m"] >= -50 for vehicle in state["vehicles"])
+    assert retired_states[-1]["passed_vehicles_count"] == retired.passed_count
+    assert len(retired_states[-1]["vehicles"]) < len(kept_states[-1]["vehicles"])
+    # Retired vehicles are only kept on disk, carried on to where they are at the end
+    assert len(retired.passed_vehicles) < len(kept.passed_vehicles) == kept.passed_count
+    with open(tmp_path / "retired" / "passed_vehicles.json") as file:
+        _assert_same_vehicles(json.load(file), kept.passed_vehicles)
+
+
+@pytest.mark.parametrize("mode", ["tick", "event"])
+@pytest.mark.parametrize("engine", ["dict", "numpy"])
+@pytest.mark.parametrize("scenario_path", sorted(glob.glob("scenarios/*.json")))
+def test_passed_vehicles_file_does_not_depend_on_render_radius(scenario_path, engine, mode, tmp_path):
+    files = {}
+    for name, render_radius in [("default", 350), ("kept", None)]:
+        simulator = TrafficSimulator(scenario_path, engine=engine, mode=mode, render_radius=render_radius,
+                                     experiment_dir=str(tmp_path / name))
+        simulator.run()
+        with open(tmp_path / name / "passed_vehicles.json") as file:
+            files[name] = json.load(file)
+    _assert_same_vehicles(files["default"], files["kept"])
+
+
+def test_lane_queues_match_full_scans():
+    vehicles = TrafficSimulator("scenarios/scenario4.json").compiled_scenario.new_vehicles()
+    vehicles[0]["speed_kmh"] = 0
+    vehicles[0]["distance_to_intersection_m"] = 0
+    lane_queues = LaneQueues(vehicles)
+    lane_queues.remove(vehicles[3:5])
+    remaining = vehicles[:3] + vehicles[5:]
+
+    assert len(lane_queues) == len(remaining)
+    assert lane_queues.vehicles() == remaining
+    assert lane_queues.summary() == MultiAgentStrategy.aggregate_vehicles(None, remaining)
+    assert lane_queues.queue_length() == sum(
+        1 for v in remaining if v["speed_kmh"] == 0 and v["distance_to_intersection_m"] < 50)
+    for heap in lane_queues.lanes.values():
+        # The head of every lane is its first vehicle to reach the stop line
+        assert heap[0][0] == min(entry[0] for entry in heap)
+
+    # With every signal red, vehicles reaching the line stop there and queue up
+    for _ in range(10):
+        assert lane_queues.update(5, lambda destination, waiting: False) == []
+    current = lane_queues.vehicles()
+    assert lane_queues.queue_length() == sum(
+        1 for v in current if v["speed_kmh"] == 0 and v["distance_to_intersection_m"] < 50)
+    assert sum(len(waiting) for waiting in lane_queues.waiting.values()) == sum(
+        1 for v in current if v["speed_kmh"] == 0 and v["distance_to_intersection_m"] <= 0)
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+import routes.simulator_routes as simulator_routes
+from app import app
+from jobs import get_job_queue, JobQueue, JobCancelled, QueueFull, COMPLETED, CANCELLED
+
+
+def wait_for(job, timeout=10):
+    deadline = time.time() + timeout
+    while job.status not in [COMPLETED, CANCELLED, "failed"] and time.time() < deadline:
+        time.sleep(0.01)
+    return job.status
+
+
+def blocking_job(release):
+    def run(job):
+        step = 0
+        while not release.is_set():
+            step += 1
+            job.report(step=step)
+            time.sleep(0.001)
+        return step
+    return run
+
+
+def test_jobs_run_with_limited_concurrency_and_can_be_cancelled():
+    job_queue = JobQueue(max_workers=1, max_pending=1)
+    release = threading.Event()
+    running = job_queue.submit(blocking_job(release))
+    queued = job_queue.submit(blocking_job(release))
+
+    with pytest.raises(QueueFull):
+        job_queue.submit(blocking_job(release))
+
+    job_queue.cancel(queued.id)
+    assert queued.status == CANCELLED
+
+    job_queue.cancel(running.id)
+    assert wait_for(running) == CANCELLED
+    assert running.progress["step"] > 0
+
+    finished = job_queue.submit(lambda job: "done")
+    assert wait_for(finished) == COMPLETED and finished.result == "done"
+    job_queue.shutdown()
+
+
+def test_run_endpoint_returns_a_job_and_its_result():
+    client = app.test_client()
+    response = client.post("/api/run", json={"scenario": "scenario1", "strategy": "set_interval"})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        status = client.get(f"/api/jobs/{job_id}").get_json()
+        if status["status"] == COMPLETED:
+            break
+        time.sleep(0.05)
+    assert status["status"] == COMPLETED
+    assert status["progress"]["vehicles_remaining"] == 0
+
+    # Finished jobs only keep a reference to their states on disk
+    assert "states" not in get_job_queue().get(job_id).result
+    result = client.get(f"/api/jobs/{job_id}/result").get_json()
+    assert result["scenario"]["vehicle_data"]
+    waited = client.post("/api/run", json={"scenario": "scenario1", "wait": True}).get_json()
+    assert result["metrics"] == waited["metrics"]
+    assert len(result["states"]) == len(waited["states"]) > 0
+    assert client.get("/api/jobs/unknown").status_code == 404
+
+
+def test_waiting_on_a_job_cancelled_while_queued(monkeypatch):
+    job_queue = JobQueue(max_workers=1, max_pending=1)
+    release = threading.Event()
+    job_queue.submit(blocking_job(release))
+    monkeypatch.setattr(simulator_routes, "get_job_queue", lambda: job_queue)
+
+    def cancel_queued():
+        while len(job_queue.list()) < 2 or job_queue.list()[-1].future is None:
+            time.sleep(0.01)
+        job_queue.cancel(job_queue.list()[-1].id)
+
+    canceller = threading.Thread(target=cancel_queued)
+    canceller.start()
+    response = app.test_client().post("/api/run", json={"scenario": "scenario1", "wait": True})
+    canceller.join()
+    assert response.status_code == 409
+    assert response.get_json()["status"] == CANCELLED
+    release.set()
+    job_queue.shutdown()
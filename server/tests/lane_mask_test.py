@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+# The detector's dependencies are only installed on the camera hosts
+pytest.importorskip("cv2")
+sv = pytest.importorskip("supervision")
+
+from vehicle_estimator.detection.lane_mask import LaneMask
+
+SOURCE = np.array([(930, 1700), (2750, 1700), (2600, 50), (1550, 50)])
+
+LANES = {
+    "Northbound_Right": np.array([(930, 1700), (1390, 1700), (1750, 50), (1550, 50)]),
+    "Northbound_Straight": np.array([(1430, 1700), (1800, 1700), (2050, 50), (1790, 50)]),
+    "Northbound_Straight2": np.array([(1850, 1700), (2150, 1700), (2350, 50), (2080, 50)]),
+    "Northbound_Left": np.array([(2200, 1700), (2550, 1700), (2600, 50), (2380, 50)]),
+}
+
+
+def _random_detections(rng, count):
+    x1 = rng.uniform(500, 3000, count)
+    y1 = rng.uniform(0, 1800, count)
+    xyxy = np.stack([x1, y1, x1 + rng.uniform(20, 500, count), y1 + rng.uniform(20, 400, count)], axis=1)
+    return sv.Detections(xyxy=xyxy)
+
+
+def test_counts_match_polygon_zones():
+    lane_mask = LaneMask(SOURCE, LANES)
+    region_zone = sv.PolygonZone(polygon=SOURCE)
+    lane_zones = {lane_name: sv.PolygonZone(polygon=polygon) for lane_name, polygon in LANES.items()}
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        detections = _random_detections(rng, 300)
+        np.testing.assert_array_equal(lane_mask.in_region(detections.xyxy), region_zone.trigger(detections))
+
+        detections = detections[region_zone.trigger(detections)]
+        expected = {lane_name: int(zone.trigger(detections).sum()) for lane_name, zone in lane_zones.items()}
+        assert lane_mask.counts(detections.xyxy) == expected
+
+
+def test_empty_frames_and_overlapping_lanes():
+    lane_mask = LaneMask(SOURCE, LANES)
+    assert lane_mask.counts(np.empty((0, 4))) == {lane_name: 0 for lane_name in LANES}
+    with pytest.raises(ValueError, match="overlaps"):
+        LaneMask(SOURCE, {"a": LANES["Northbound_Left"], "b": LANES["Northbound_Left"] + 10})
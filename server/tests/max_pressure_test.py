@@ -0,0 +1,29 @@
+from strategy.max_pressure import MaxPressureStrategy, duration_for_count
+
+
+def vehicle(destination, speed=0):
+    return {"vehicle_id": destination, "destination": destination, "speed_kmh": speed,
+            "emergency_vehicle": False}
+
+
+def test_duration_bands_match_controller_prompt():
+    assert [duration_for_count(n) for n in [0, 9, 10, 19]] == [30, 39, 40, 58]
+    assert all(60 <= duration_for_count(n) <= 120 for n in range(20, 61))
+    assert all(120 <= duration_for_count(n) <= 150 for n in range(61, 500))
+
+
+def test_selects_configuration_with_highest_pressure():
+    strategy = MaxPressureStrategy()
+    vehicles = [vehicle("Eastbound_Straight") for _ in range(5)] + [vehicle("Northbound_Straight")]
+    signal, reasoning = strategy.get_next_signal_status({}, vehicles, {})
+
+    assert signal["Eastbound_Straight"] == "green"
+    assert signal["duration_seconds"] == 35
+    assert "ew_straight_priority" in reasoning
+
+
+def test_round_robin_without_traffic():
+    strategy = MaxPressureStrategy()
+    chosen = [strategy.get_next_signal_status({}, [], {})[1].split()[3]
+              for _ in strategy.configurations]
+    assert chosen == strategy.configurations
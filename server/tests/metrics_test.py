@@ -0,0 +1,43 @@
+import json
+import random
+
+from simulator import TrafficSimulator
+from utils.metrics import MetricsAccumulator, calculate_metrics
+
+
+def test_accumulator_matches_calculate_metrics(tmp_path):
+    rng = random.Random(0)
+    for _ in range(50):
+        passed_vehicles = [{"vehicle_type": rng.choice(["car", "bus", "truck", "unknown"]),
+                            "wait_time": rng.randint(0, 300), "stops": rng.randint(0, 4)}
+                           for _ in range(rng.randint(0, 40))]
+        timestamps = [f"2025-03-19T08:{minute:02d}:{second:02d}"
+                      for minute in range(rng.randint(0, 3)) for second in range(0, 60, 5)]
+        queue_lengths = [rng.randint(0, 30) for _ in range(rng.randint(0, 40))]
+
+        accumulator = MetricsAccumulator()
+        for timestamp in timestamps:
+            accumulator.add_states(timestamp)
+        for queue_length in queue_lengths:
+            accumulator.add_queue_length(queue_length)
+        accumulator.add_passed_vehicles(passed_vehicles)
+        accumulator.passed_pedestrians = 7
+
+        assert accumulator.metrics() == calculate_metrics(
+            [{"timestamp": timestamp} for timestamp in timestamps],
+            passed_vehicles, 7, queue_lengths, str(tmp_path))
+
+
+def test_live_metrics_are_available_during_the_run(tmp_path):
+    simulator = TrafficSimulator("scenarios/scenario3.json", experiment_dir=str(tmp_path))
+    seen = []
+    _, metrics, states = simulator.run(
+        progress=lambda step, vehicles: seen.append(simulator.live_metrics.metrics()))
+
+    assert seen[-1] == metrics
+    assert all(before["total_stops"] <= after["total_stops"] for before, after in zip(seen, seen[1:]))
+    with open(tmp_path / "passed_vehicles.json") as file:
+        passed_vehicles = json.load(file)
+    assert metrics == calculate_metrics(
+        states, passed_vehicles, simulator.passed_pedestrians,
+        [state["queue_length"] for state in states[1:]], str(tmp_path))
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from simulator import TrafficSimulator
+from traffic_optimizer.decision_cache import DecisionCache
+
+
+def run_with_fake_optimizer(fake_completions, tmp_path, delay, **options):
+    simulator = TrafficSimulator("scenarios/scenario3.json", strategy="multi_agent",
+                                 experiment_dir=str(tmp_path), strategy_options=options)
+    fake_completions(simulator.strategy.traffic_optimizer, duration_seconds=40, delay=delay)
+    simulator.run(max_steps=60)
+    with open(tmp_path / "strategy.json") as file:
+        return simulator, json.load(file)["stats"]
+
+
+def test_decisions_within_deadline_are_applied(fake_completions, tmp_path):
+    simulator, stats = run_with_fake_optimizer(fake_completions, tmp_path, delay=0.0)
+
+    # Without a deadline every decision is waited for
+    assert simulator.strategy.deadline_seconds is None
+    assert stats["decisions"] > 0
+    assert stats["fallbacks"] == 0
+    assert stats["decision_latency_seconds"]["max"] < 1
+    assert simulator.strategy.memory[0] == {"configuration": "ns_straight_priority", "duration": 40}
+
+
+@pytest.mark.parametrize("fallback", ["rotate", "extend"])
+def test_late_decisions_fall_back(fake_completions, tmp_path, fallback):
+    simulator, stats = run_with_fake_optimizer(
+        fake_completions, tmp_path, delay=0.2, deadline_seconds=0.01, fallback=fallback)
+
+    assert stats["decisions"] == 0
+    assert stats["late_decisions"] == stats["fallbacks"] > 0
+    assert "deadline" in simulator.reasoning
+    # The run closes the strategy's background thread
+    assert simulator.strategy.pending is None
+    with pytest.raises(RuntimeError):
+        simulator.strategy.executor.submit(lambda: None)
+
+
+def test_decision_cache_is_opt_in_and_counted_per_run(fake_completions, monkeypatch, tmp_path):
+    monkeypatch.delenv("DECISION_CACHE", raising=False)
+    _, stats = run_with_fake_optimizer(fake_completions, tmp_path / "uncached", delay=0.0)
+    assert stats["decision_cache"] is None
+
+    cache = DecisionCache()
+    _, first = run_with_fake_optimizer(fake_completions, tmp_path / "first", delay=0.0, decision_cache=cache)
+    _, second = run_with_fake_optimizer(fake_completions, tmp_path / "second", delay=0.0, decision_cache=cache)
+    # The second run only reports its own lookups, which all hit the first run's decisions
+    assert first["decision_cache"]["misses"] > 0
+    assert second["decision_cache"]["misses"] == 0
+    assert second["decision_cache"]["hits"] >= second["decisions"] > 0
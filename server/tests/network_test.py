@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from network import (NetworkSimulator, build_corridor_network, build_grid_network,
+                     exit_heading, partition_intersections, validate_network)
+
+
+def test_exit_headings_follow_left_hand_traffic():
+    assert exit_heading("Northbound_Straight") == "Northbound"
+    assert exit_heading("Northbound_Left") == "Westbound"
+    assert exit_heading("Northbound_Right") == "Eastbound"
+    assert exit_heading("Westbound_Left") == "Southbound"
+
+
+def test_grid_roads_and_partitions():
+    network = build_grid_network(2, 3, "scenarios/scenario4.json")
+    assert len(network["intersections"]) == 6
+    # Each of the 7 neighbouring pairs is linked in both directions
+    assert len(network["roads"]) == 14
+    assert partition_intersections(["a", "b", "c", "d", "e"], 2) == [["a", "b", "c"], ["d", "e"]]
+
+    network["roads"][0]["travel_time_seconds"] = 1
+    with pytest.raises(ValueError):
+        validate_network(network)
+
+
+def test_results_do_not_depend_on_workers(tmp_path):
+    network = build_corridor_network(3, "scenarios/scenario4.json")
+    results = [
+        NetworkSimulator(network, workers=workers, network_dir=str(tmp_path / str(workers))).run(max_steps=300)
+        for workers in [1, 2]
+    ]
+    assert results[0]["intersections"] == results[1]["intersections"]
+    for key in ["steps", "vehicles_exited", "average_hops", "average_network_wait_time"]:
+        assert results[0]["metrics"][key] == results[1]["metrics"][key]
+
+    # Every scenario vehicle eventually leaves the corridor, most after several junctions
+    with open("scenarios/scenario4.json") as file:
+        vehicles = len(json.load(file)["vehicle_data"])
+    metrics = results[0]["metrics"]
+    assert metrics["vehicles_exited"] == 3 * vehicles
+    assert metrics["vehicles_in_transit"] == metrics["vehicles_remaining"] == 0
+    assert metrics["average_hops"] > 1
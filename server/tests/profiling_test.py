@@ -0,0 +1,69 @@
+import gc
+import json
+import tracemalloc
+
+from app import app
+from simulator import TrafficSimulator
+from utils.profiling import Histogram
+
+
+def test_profiled_runs_record_phases_without_changing_results(tmp_path):
+    plain = TrafficSimulator("scenarios/scenario3.json", experiment_dir=str(tmp_path / "plain"))
+    _, plain_metrics, plain_states = plain.run()
+    profiled = TrafficSimulator("scenarios/scenario3.json", experiment_dir=str(tmp_path / "profiled"),
+                                profile=True, trace_memory=True, snapshot_interval=10)
+    _, metrics, states = profiled.run()
+    assert metrics == plain_metrics
+    assert list(states) == list(plain_states)
+
+    with open(tmp_path / "profiled" / "profile.json") as file:
+        profile = json.load(file)
+    assert profile["ticks"] == len(states) - 1
+    for phase in ["step", "update_vehicles", "save_state", "strategy", "save_results"]:
+        assert profile["phases"][phase]["calls"] > 0
+    assert profile["strategy_latency_seconds"]["count"] == profile["phases"]["strategy"]["calls"]
+    assert [snapshot["label"] for snapshot in profile["snapshots"]][-1] == "end"
+    assert len(profile["snapshots"]) > 1
+    assert not (tmp_path / "plain" / "profile.json").exists()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram([0.1, 1])
+    for value in [0.05, 0.1, 0.5, 2]:
+        histogram.observe(value)
+    assert histogram.cumulative() == [(0.1, 2), (1, 3), (float("inf"), 4)]
+
+
+def test_metrics_endpoint_exposes_profiles_and_jobs():
+    client = app.test_client()
+    response = client.post("/api/run", json={"scenario": "scenario4", "profile": True, "wait": True})
+    assert response.status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert 'simulator_phase_seconds_total{phase="update_vehicles"}' in text
+    assert "# TYPE simulator_strategy_latency_seconds histogram" in text
+    assert 'simulation_jobs{status="completed"}' in text
+
+
+def test_memory_tracing_lasts_until_the_last_traced_run_finishes(tmp_path):
+    assert not tracemalloc.is_tracing()
+    first = TrafficSimulator("scenarios/scenario3.json", experiment_dir=str(tmp_path / "first"), trace_memory=True)
+    second = TrafficSimulator("scenarios/scenario3.json", experiment_dir=str(tmp_path / "second"), trace_memory=True)
+    first.run()
+    # The second run keeps tracing after the first one finished
+    assert tracemalloc.is_tracing()
+    second.run()
+    assert not tracemalloc.is_tracing()
+    with open(tmp_path / "second" / "profile.json") as file:
+        assert json.load(file)["snapshots"][-1]["top"]
+
+    # A run that never finishes lets go of tracing along with its simulator
+    abandoned = TrafficSimulator("scenarios/scenario3.json", experiment_dir=str(tmp_path / "abandoned"),
+                                 trace_memory=True)
+    assert tracemalloc.is_tracing()
+    del abandoned
+    gc.collect()
+    assert not tracemalloc.is_tracing()
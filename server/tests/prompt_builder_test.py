@@ -0,0 +1,56 @@
+import json
+
+from traffic_optimizer.prompt_builder import PromptBuilder, SYSTEM_PROMPT
+
+
+def load_traffic_config():
+    with open("traffic_rules/traffic_configuration.json") as file:
+        return json.load(file)["movements_description"]
+
+
+def configuration_state(count):
+    return {
+        "vehicles": {
+            "total_count": count,
+            "by_lane": {"1": count},
+            "by_destination": {"north_straight": count},
+            "emergency_vehicles": [{"id": f"EV{i}", "lane_id": 1} for i in range(count)]
+        },
+        "pedestrians": {"crosswalk_north_south": 2},
+        "weather": None,
+        "context": {"event": "concert " * 50}
+    }
+
+
+def test_static_prefix_is_shared_and_dynamic_part_is_compact():
+    builder = PromptBuilder(load_traffic_config())
+    memory = [{"configuration": "ns_straight_priority", "duration": 40}]
+
+    first, first_report = builder.build(configuration_state(3), memory)
+    second, _ = builder.build(configuration_state(8), [])
+
+    assert first[0] == {"role": "system", "content": SYSTEM_PROMPT}
+    static_text, _ = builder.static_prompt(4)
+    assert first[1]["content"].startswith(static_text)
+    assert second[1]["content"].startswith(static_text)
+    assert '{"total_count":3,' in first[1]["content"]
+    assert first_report["prompt_tokens"] == first_report["static_tokens"] + first_report["dynamic_tokens"]
+    assert first_report["trimmed"] == [] and not first_report["over_budget"]
+
+
+def test_dynamic_state_is_trimmed_to_the_budget():
+    builder = PromptBuilder(load_traffic_config())
+    state = configuration_state(40)
+    memory = [{"configuration": "ns_straight_priority", "duration": 40}] * 6
+    _, full = builder.build(state, memory)
+    _, minimal = builder.build({**state, "context": None, "vehicles": {
+        "total_count": 40, "by_lane": {"1": 40}, "emergency_vehicles": state["vehicles"]["emergency_vehicles"][:3]}},
+        memory[:2])
+
+    builder.token_budget = minimal["prompt_tokens"]
+    messages, report = builder.build(state, memory)
+
+    assert full["prompt_tokens"] > builder.token_budget
+    assert report["trimmed"] == ["memory", "context", "by_destination", "emergency_vehicles"]
+    assert report["prompt_tokens"] <= builder.token_budget and not report["over_budget"]
+    assert "by_destination" not in messages[1]["content"]
@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+
+from simulator import TrafficSimulator
+from utils.scenario_cache import ScenarioCache, validate_scenario
+
+
+def _write(path, scenario):
+    with open(path, "w") as file:
+        json.dump(scenario, file)
+
+
+def test_cache_hits_until_file_changes(tmp_path):
+    with open("scenarios/scenario1.json") as file:
+        scenario = json.load(file)
+    path = str(tmp_path / "scenario.json")
+    _write(path, scenario)
+    cache = ScenarioCache()
+
+    compiled = cache.get(path)
+    assert cache.get(path) is compiled
+    assert cache.stats()["misses"] == 1
+
+    # Same content under another name shares the compiled form
+    _write(str(tmp_path / "copy.json"), scenario)
+    assert cache.get(str(tmp_path / "copy.json")) is compiled
+
+    scenario["vehicle_data"] = scenario["vehicle_data"][:1]
+    _write(path, scenario)
+    os.utime(path, ns=(0, 0))
+    changed = cache.get(path)
+    assert changed is not compiled
+    assert len(changed.new_vehicles()) == 1
+
+
+def test_interned_codes_and_fresh_copies():
+    compiled = ScenarioCache().get("scenarios/scenario1.json")
+    vehicles = compiled.new_vehicles()
+    assert [compiled.lane_names[code] for code in compiled.lane_codes] == [v["lane_id"] for v in vehicles]
+    assert [compiled.destination_names[code] for code in compiled.destination_codes] == [
+        v["destination"] for v in vehicles]
+
+    vehicles[0]["speed_kmh"] = -1
+    assert compiled.new_vehicles()[0]["speed_kmh"] != -1
+    assert compiled.scenario["vehicle_data"][0]["speed_kmh"] != -1
+
+
+def test_invalid_scenarios_are_rejected(tmp_path):
+    with open("scenarios/scenario1.json") as file:
+        scenario = json.load(file)
+    del scenario["vehicle_data"][0]["lane_id"]
+    with pytest.raises(ValueError, match="vehicle_data/0"):
+        validate_scenario(scenario)
+
+    path = str(tmp_path / "bad.json")
+    _write(path, {"vehicle_data": [], "pedestrians": {},
+                  "signal_status": {"last_changed": "yesterday", "next_timestamp": "today"}})
+    with pytest.raises(ValueError, match="last_changed"):
+        TrafficSimulator(path, experiment_dir=str(tmp_path))
+
+
+def test_runs_do_not_share_state(tmp_path):
+    first = TrafficSimulator("scenarios/scenario4.json", experiment_dir=str(tmp_path / "a"))
+    _, metrics, _ = first.run()
+    second = TrafficSimulator("scenarios/scenario4.json", experiment_dir=str(tmp_path / "b"))
+    assert second.compiled_scenario is first.compiled_scenario
+    assert second._active_count() == len(first.scenario["vehicle_data"])
+    assert second.run()[1] == metrics
@@ -0,0 +1,72 @@
+from datetime import datetime
+from itertools import islice
+
+import pytest
+
+from scenario_generator import generate_vehicles, scenario_header, write_scenario
+from simulator import TrafficSimulator, entry_time
+from utils.scenario_cache import ScenarioCache
+
+START = datetime(2025, 3, 19, 8, 0)
+
+
+def test_generation_is_seeded_and_ordered():
+    first = list(generate_vehicles(START, 1800, emergency_per_hour=20, seed=7))
+    assert first == list(generate_vehicles(START, 1800, emergency_per_hour=20, seed=7))
+    assert first != list(generate_vehicles(START, 1800, emergency_per_hour=20, seed=8))
+
+    entries = [entry_time(vehicle) for vehicle in first]
+    assert entries == sorted(entries)
+    assert START <= entries[0] and entries[-1] <= datetime(2025, 3, 19, 8, 30)
+    assert len({vehicle["vehicle_id"] for vehicle in first}) == len(first)
+    # 1600 vehicles per hour by default
+    assert 650 < len(first) < 950
+    assert any(vehicle["emergency_vehicle"] for vehicle in first)
+
+
+def test_time_of_day_profile_follows_peaks():
+    night = sum(1 for _ in generate_vehicles(datetime(2025, 3, 19, 2), 3600, profile="time_of_day"))
+    peak = sum(1 for _ in generate_vehicles(datetime(2025, 3, 19, 8), 3600, profile="time_of_day"))
+    assert peak > 10 * night
+
+
+def test_written_scenarios_are_valid(tmp_path):
+    path = str(tmp_path / "generated.json")
+    count = write_scenario(path, scenario_header(START), generate_vehicles(START, 600, seed=1))
+    compiled = ScenarioCache().get(path)
+    assert len(compiled.new_vehicles()) == count
+    assert compiled.new_vehicles() == list(generate_vehicles(START, 600, seed=1))
+
+
+@pytest.mark.parametrize("engine,mode", [("dict", "tick"), ("numpy", "tick"), ("dict", "event")])
+def test_timed_arrivals_match_streamed_arrivals(tmp_path, engine, mode):
+    path = str(tmp_path / "generated.json")
+    write_scenario(path, scenario_header(START), generate_vehicles(START, 600, seed=3))
+
+    timed = TrafficSimulator(path, engine=engine, mode=mode, timed_arrivals=True,
+                             experiment_dir=str(tmp_path / "timed"))
+    # Nobody is on the road at the start, everyone enters later and passes
+    assert timed._active_count() == 0
+    _, timed_metrics, _ = timed.run()
+    assert timed.passed_count == len(timed.scenario["vehicle_data"])
+
+    header = str(tmp_path / "header.json")
+    write_scenario(header, scenario_header(START), iter([]))
+    streamed = TrafficSimulator(header, engine=engine, mode=mode,
+                                arrivals=generate_vehicles(START, 600, seed=3),
+                                experiment_dir=str(tmp_path / "streamed"))
+    _, streamed_metrics, _ = streamed.run()
+    assert ((tmp_path / "streamed" / "passed_vehicles.json").read_text() ==
+            (tmp_path / "timed" / "passed_vehicles.json").read_text())
+    assert streamed_metrics == timed_metrics
+
+
+def test_arrival_stream_is_consumed_lazily(tmp_path):
+    vehicles = generate_vehicles(START, 24 * 3600, seed=0)
+    header = str(tmp_path / "header.json")
+    write_scenario(header, scenario_header(START), iter([]))
+    simulator = TrafficSimulator(header, arrivals=vehicles, experiment_dir=str(tmp_path / "run"))
+    simulator.run(max_steps=12)
+    # About a minute of a day of arrivals has been drawn
+    assert len(list(islice(vehicles, 100))) == 100
+    assert simulator.passed_count + simulator._active_count() < 200
@@ -0,0 +1,70 @@
+import os
+import shutil
+import uuid
+
+import pytest
+
+from app import app
+from simulator import TrafficSimulator
+from utils.state_index import StateIndex
+from utils.state_stream import StateWriter
+
+
+@pytest.mark.parametrize("stream_states", [False, True])
+def test_index_reads_step_ranges_and_time_windows(tmp_path, stream_states):
+    simulator = TrafficSimulator("scenarios/scenario3.json", experiment_dir=str(tmp_path),
+                                 stream_states=stream_states)
+    _, _, states = simulator.run()
+    states = list(states)
+    index = StateIndex(str(tmp_path))
+
+    assert os.path.exists(tmp_path / "states.index.npz")
+    assert len(index) == len(states)
+    assert index.state(7) == states[7]
+    assert [state["timestamp"] for state in map(index.state, range(len(index)))] == \
+        [state["timestamp"] for state in states]
+    assert index.window(states[3]["timestamp"], states[5]["timestamp"]) == (3, 6)
+    assert index.lines(len(index), len(index) + 5) == []
+
+
+def test_index_keeps_states_with_unicode_line_separators(tmp_path):
+    states = [{"timestamp": f"2025-03-19T08:00:0{step}", "context": f"step\u2028{step}\u0085\u2029"}
+              for step in range(3)]
+    writer = StateWriter(str(tmp_path / "states.ndjson"))
+    for state in states:
+        writer.write(state)
+    writer.close()
+    index = StateIndex(str(tmp_path))
+
+    assert len(index.lines(0, 3)) == 3
+    assert [index.state(step) for step in range(3)] == states
+
+
+def test_experiment_state_endpoints():
+    experiment_id = f"test_{uuid.uuid4().hex[:8]}"
+    simulator = TrafficSimulator("scenarios/scenario3.json", experiment_dir=f"experiments/{experiment_id}")
+    _, _, states = simulator.run()
+    try:
+        check_experiment_state_endpoints(experiment_id, states)
+    finally:
+        shutil.rmtree(f"experiments/{experiment_id}")
+
+
+def check_experiment_state_endpoints(experiment_id, states):
+    client = app.test_client()
+
+    page = client.get(f"/api/experiments/{experiment_id}/states?start=10&limit=5").get_json()
+    assert page["states"] == states[10:15]
+    assert page["next"] == 15 and page["total_steps"] == len(states)
+
+    last = client.get(f"/api/experiments/{experiment_id}/states?start={len(states) - 2}").get_json()
+    assert last["states"] == states[-2:] and last["next"] is None
+
+    window = client.get(f"/api/experiments/{experiment_id}/states", query_string={
+        "start_time": states[2]["timestamp"], "end_time": states[4]["timestamp"]}).get_json()
+    assert window["states"] == states[2:5]
+
+    assert client.get(f"/api/experiments/{experiment_id}/states/3").get_json() == states[3]
+    assert client.get(f"/api/experiments/{experiment_id}/states/{len(states)}").status_code == 404
+    assert client.get("/api/experiments/missing/states").status_code == 404
+    assert client.get(f"/api/experiments/{experiment_id}").get_json()["total_steps"] == len(states)
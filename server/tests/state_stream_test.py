@@ -0,0 +1,18 @@
+import os
+from simulator import TrafficSimulator
+from utils.state_stream import iter_states
+
+
+def test_streamed_states_match_in_memory_states(tmp_path):
+    in_memory = TrafficSimulator("scenarios/scenario3.json", experiment_dir=str(tmp_path / "memory"))
+    _, metrics, states = in_memory.run()
+
+    streamed = TrafficSimulator("scenarios/scenario3.json", experiment_dir=str(tmp_path / "stream"),
+                                stream_states=True)
+    experiment_dir, streamed_metrics, streamed_states = streamed.run()
+
+    assert streamed.states == []
+    assert not os.path.exists(os.path.join(experiment_dir, "states.json"))
+    assert list(streamed_states) == states
+    assert list(iter_states(experiment_dir)) == states
+    assert streamed_metrics == metrics
@@ -0,0 +1,37 @@
+import json
+import time
+from types import SimpleNamespace
+
+
+class StubCompletions:
+    """
+    Stands in for the OpenAI chat completions API with a fixed decision, for tests
+    and benchmarks that must not call the model.
+    """
+
+    def __init__(self, duration_seconds: int = 45, delay: float = 0.0):
+        """
+        Args:
+            duration_seconds: Duration of every decision
+            delay: Seconds every call takes
+        """
+        self.duration_seconds = duration_seconds
+        self.delay = delay
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        content = json.dumps({
+            "selected_configuration": "ns_straight_priority",
+            "duration_seconds": self.duration_seconds,
+            "justification": "stub"
+        })
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def install_stub_client(optimizer, **options) -> StubCompletions:
+    """Replace the OpenAI client of a TrafficOptimizer with a StubCompletions(**options)"""
+    completions = StubCompletions(**options)
+    optimizer.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return completions
@@ -0,0 +1,73 @@
+import json
+import time
+
+import pytest
+
+from app import app
+from sweep import build_grid, resolve_scenarios, run_sweep
+
+
+def test_resolve_scenarios_by_name_glob_and_path():
+    assert resolve_scenarios(["scenario1"]) == ["scenarios/scenario1.json"]
+    assert resolve_scenarios(["scenario[12].json"], allow_paths=False) == [
+        "scenarios/scenario1.json", "scenarios/scenario2.json"]
+    assert "scenarios/scenario5.json" in resolve_scenarios(["all"], allow_paths=False)
+    # Paths outside the scenarios directory only resolve for command-line sweeps
+    assert resolve_scenarios(["traffic_rules/traffic_configuration.json"]) == [
+        "traffic_rules/traffic_configuration.json"]
+    with pytest.raises(ValueError):
+        resolve_scenarios(["traffic_rules/traffic_configuration.json"], allow_paths=False)
+    with pytest.raises(ValueError):
+        resolve_scenarios(["../server/scenarios/*.json"], allow_paths=False)
+    with pytest.raises(FileNotFoundError):
+        resolve_scenarios(["missing"])
+
+
+def test_build_grid_expands_every_combination():
+    runs = build_grid(["scenario1", "scenario2"], ["set_interval", "max_pressure"], [50],
+                      {"engine": ["dict", "numpy"]})
+    assert len(runs) == 8
+    assert [run["run_id"] for run in runs] == list(range(8))
+    assert runs[1] == {"run_id": 1, "scenario": "scenario1", "scenario_path": "scenarios/scenario1.json",
+                       "strategy": "set_interval", "max_steps": 50, "parameters": {"engine": "numpy"}}
+
+    with pytest.raises(ValueError):
+        build_grid(["scenario1"], ["set_interval"], [50], {"experiment_dir": ["/tmp"]})
+
+
+def test_run_sweep_collects_metrics_of_every_run(tmp_path):
+    runs = build_grid(["scenario1"], ["set_interval"], [200], {"engine": ["dict", "numpy"]})
+    finished = []
+    sweep = run_sweep(runs, workers=2, sweep_dir=str(tmp_path), progress=False,
+                      on_result=lambda done, total: finished.append((done, total)))
+
+    assert finished == [(1, 2), (2, 2)]
+    assert [result["run_id"] for result in sweep["results"]] == [0, 1]
+    assert all(result["error"] is None for result in sweep["results"])
+    # Both engines simulate the same run
+    assert sweep["results"][0]["metrics"] == sweep["results"][1]["metrics"]
+    assert [row["engine"] for row in sweep["table"]] == ["dict", "numpy"]
+    with open(tmp_path / "results.json") as file:
+        assert len(json.load(file)) == 2
+    assert (tmp_path / "results.csv").exists()
+
+
+def test_sweep_endpoint_queues_a_job():
+    client = app.test_client()
+    assert client.post("/api/sweep", json={"scenarios": ["/etc/*.json"]}).status_code == 400
+    assert client.post("/api/sweep", json={"parameters": {"debug": [True]}}).status_code == 400
+    assert client.post("/api/sweep", json={"workers": 0}).status_code == 400
+
+    response = client.post("/api/sweep", json={"scenarios": ["scenario1"], "max_steps": 50, "workers": 64})
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job["workers"] <= 4 and job["runs"] == 1
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        result = client.get(f"/api/jobs/{job['job_id']}/result")
+        if result.status_code != 202:
+            break
+        time.sleep(0.05)
+    assert result.status_code == 200
+    assert len(result.get_json()["table"]) == 1
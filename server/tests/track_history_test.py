@@ -0,0 +1,57 @@
+from collections import defaultdict, deque
+
+import numpy as np
+
+from vehicle_estimator.detection.track_history import TrackHistory, lane_average_speeds
+
+FPS = 10
+
+
+def test_speeds_match_unbounded_deques():
+    rng = np.random.default_rng(0)
+    history = TrackHistory(length=FPS, max_age=FPS, capacity=32)
+    coordinates = defaultdict(lambda: deque(maxlen=FPS))
+    next_id = 0
+    active = []
+    for _ in range(300):
+        # Tracks come and go, some skip frames
+        active = [tracker_id for tracker_id in active if rng.random() > 0.03]
+        while len(active) < 12:
+            active.append(next_id)
+            next_id += 1
+        tracker_ids = np.array([tracker_id for tracker_id in active if rng.random() > 0.1])
+        ys = rng.integers(0, 30, len(tracker_ids))
+
+        rows = history.update(tracker_ids, ys)
+        speeds = history.speeds(rows, FPS, min_positions=FPS / 2)
+
+        expected = []
+        for tracker_id, y in zip(tracker_ids, ys):
+            coordinates[tracker_id].append(y)
+        for tracker_id in tracker_ids:
+            if len(coordinates[tracker_id]) < FPS / 2:
+                expected.append(np.nan)
+            else:
+                distance = abs(coordinates[tracker_id][-1] - coordinates[tracker_id][0])
+                expected.append(distance / (len(coordinates[tracker_id]) / FPS) * 3.6)
+        np.testing.assert_allclose(speeds, expected)
+
+    # Dropped tracks were evicted while the deques kept every ID ever seen
+    assert len(history) <= 12 * 2
+    assert len(coordinates) > 100
+
+
+def test_full_history_evicts_least_recently_seen():
+    history = TrackHistory(length=4, max_age=100, capacity=2)
+    history.update(np.array([1, 2]), np.array([0, 0]))
+    history.update(np.array([2]), np.array([5]))
+    history.update(np.array([3]), np.array([7]))
+    assert sorted(history.rows) == [2, 3]
+    rows = history.update(np.array([2, 3]), np.array([10, 8]))
+    assert history.counts[rows].tolist() == [3, 2]
+
+
+def test_lane_average_speeds_skip_unknown_speeds():
+    membership = np.array([[True, False], [True, False], [False, False], [False, True]])
+    speeds = np.array([30.0, 50.0, 20.0, np.nan])
+    assert lane_average_speeds(membership, speeds, ["a", "b"]) == {"a": 40.0, "b": None}
@@ -0,0 +1,80 @@
+import json
+
+import orjson
+
+from traffic_optimizer.prompt_builder import PromptBuilder
+from vehicle_estimator.detection.analytics_producer import WindowAggregator
+from vehicle_estimator.video_streaming.broker import InMemoryBroker
+from vehicle_estimator.video_streaming.flink_job import StreamRunner, TrafficStateJob, congestion_level
+
+START = 1_000_000.0
+LANES = ["Northbound_Straight", "Northbound_Straight2", "Northbound_Left"]
+
+
+def _camera_windows(camera_id, seconds, counts):
+    """One-second windows of a camera as the detector publishes them"""
+    aggregator = WindowAggregator(LANES, size_seconds=1.0)
+    windows = []
+    for frame in range(1, seconds * 10 + 1):
+        windows += aggregator.add(frame / 10, frame, counts(frame), {lane: 20.0 for lane in LANES})
+    for window in windows:
+        window.update(camera_id=camera_id, timestamp=START + window["window_end"])
+    return windows
+
+
+def test_lane_windows_become_optimizer_ready_state():
+    broker = InMemoryBroker()
+    producer = broker.producer(value_serializer=orjson.dumps, key_serializer=str.encode)
+    job = TrafficStateJob(window_seconds=10, emit_seconds=5, intersections={"cam-a": "junction-1"})
+    runner = StreamRunner(job, broker.consumer("video-analytics", auto_offset_reset="earliest"), producer)
+
+    busy = _camera_windows("cam-a", 20, lambda frame: {"Northbound_Straight": 3, "Northbound_Straight2": 4,
+                                                       "Northbound_Left": 1 if frame % 2 else 0})
+    for window in busy:
+        producer.send("video-analytics", value=window, key="cam-a")
+    summaries = runner.run_once(timeout_ms=100)
+
+    # A summary every five seconds of event time while windows keep coming
+    assert [summary["timestamp"] - START for summary in summaries] == [5, 10, 15, 20]
+    summary = summaries[-1]
+    assert summary["intersection_id"] == "junction-1"
+    vehicles = summary["configuration_state"]["vehicles"]
+    # Both camera zones of the straight lane add up
+    assert vehicles["by_lane"] == {"Northbound_Left": 1, "Northbound_Straight": 7}
+    assert vehicles["by_destination"] == vehicles["by_lane"]
+    assert vehicles["total_count"] == 8
+    assert summary["lane_counts_average"]["Northbound_Left"] == 0.5
+    assert summary["lane_counts_peak"] == {"Northbound_Left": 1, "Northbound_Straight": 7}
+    assert summary["lane_speeds"]["Northbound_Straight"] == 20.0
+    assert summary["congestion_level"] == "high"
+
+    published = [orjson.loads(record.value) for record in broker.topics["processed-analytics"]]
+    assert published == summaries
+
+    # The summary slots into the optimizer prompt like a simulator state
+    with open("traffic_rules/traffic_configuration.json") as file:
+        builder = PromptBuilder(json.load(file)["movements_description"])
+    messages, _ = builder.build({**summary["configuration_state"], "pedestrians": {}, "weather": None,
+                                 "context": None}, [])
+    assert '"Northbound_Straight":7' in messages[-1]["content"]
+
+
+def test_stale_intersections_stop_reporting():
+    job = TrafficStateJob(window_seconds=10, emit_seconds=5)
+    summaries = []
+    for window in _camera_windows("cam-b", 3, lambda frame: {"Northbound_Left": 2}):
+        summaries += job.process(window, window["timestamp"])
+    # A minute later another camera starts
+    for window in _camera_windows("cam-c", 7, lambda frame: {"Northbound_Left": 0}):
+        summaries += job.process(window, window["timestamp"] + 60)
+
+    assert [(summary["intersection_id"], summary["timestamp"] - START) for summary in summaries] == [
+        ("cam-b", 5), ("cam-b", 10), ("cam-c", 65)]
+    assert summaries[0]["congestion_level"] == "low"
+    assert summaries[-1]["congestion_level"] == "none"
+
+
+def test_slow_moderate_traffic_is_congested():
+    assert congestion_level({"a": 0.4, "b": 0.1}, {"a": 25.0, "b": None}) == "moderate"
+    assert congestion_level({"a": 0.4, "b": 0.1}, {"a": 5.0, "b": None}) == "high"
+    assert congestion_level({"a": 0.1}, {"a": 5.0}) == "low"
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+
+def quantize(count: int, bucket: int) -> int:
+    """Map a count to its bucket, keeping zero distinct from any non-zero count"""
+    if bucket <= 1 or count <= 0:
+        return count
+    return 1 + (count - 1) // bucket
+
+
+class DecisionCache:
+    """
+    Cache of optimizer decisions keyed on a quantized view of the optimizer input.
+
+    Decisions live in an in-memory LRU tier and, when a path is given, in a
+    persistent SQLite tier that survives restarts and is shared between runs.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        path: Optional[str] = None,
+        count_bucket: int = 5,
+        pedestrian_bucket: int = 2,
+        duration_bucket: int = 15
+    ):
+        """
+        Args:
+            max_size: Maximum number of decisions in the in-memory tier
+            path: SQLite file for the persistent tier (memory only if None)
+            count_bucket: Vehicle counts within this many vehicles share a key
+            pedestrian_bucket: Pedestrian counts within this many people share a key
+            duration_bucket: Remembered phase durations within this many seconds share a key
+        """
+        self.max_size = max_size
+        self.path = path
+        self.count_bucket = count_bucket
+        self.pedestrian_bucket = pedestrian_bucket
+        self.duration_bucket = duration_bucket
+
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.db.commit()
+
+    def key(
+        self,
+        configuration_state: Dict[str, Any],
+        memory: List[Dict[str, Any]],
+        max_wait: int,
+        fingerprint: str = ""
+    ) -> str:
+        """
+        Build the cache key for an optimizer call.
+
+        Args:
+            configuration_state: Aggregated vehicles, pedestrians, weather and context
+            memory: Recent configurations and durations (most recent first)
+            max_wait: Maximum number of intervals a direction should wait
+            fingerprint: Identifies the traffic configuration the decision was made for
+        """
+        vehicles = configuration_state.get("vehicles") or {}
+        pedestrians = configuration_state.get("pedestrians") or {}
+        quantized = {
+            "fingerprint": fingerprint,
+            "max_wait": max_wait,
+            "total_count": quantize(vehicles.get("total_count", 0), self.count_bucket),
+            "by_lane": {lane: quantize(count, self.count_bucket)
+                        for lane, count in vehicles.get("by_lane", {}).items()},
+            "by_destination": {destination: quantize(count, self.count_bucket)
+                               for destination, count in vehicles.get("by_destination", {}).items()},
+            # Emergency vehicles matter by where they are, not by their IDs
+            "emergency_vehicles": sorted(
+                [vehicle.get("lane_id"), vehicle.get("destination"), vehicle.get("priority_level")]
+                for vehicle in vehicles.get("emergency_vehicles", [])),
+            "pedestrians": {crosswalk: quantize(count, self.pedestrian_bucket)
+                            for crosswalk, count in pedestrians.items()
+                            if isinstance(count, (int, float))},
+            "weather": configuration_state.get("weather"),
+            "context": configuration_state.get("context"),
+            "memory": [[entry.get("configuration"), quantize(entry.get("duration", 0), self.duration_bucket)]
+                       for entry in memory],
+        }
+        encoded = json.dumps(quantized, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached decision, or None on a miss"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return dict(self.entries[key])
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT value FROM decisions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return dict(value)
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a decision in both tiers"""
+        with self.lock:
+            self._remember(key, dict(value))
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO decisions (key, value) VALUES (?, ?)",
+                    (key, json.dumps(value)))
+                self.db.commit()
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        """Insert into the in-memory tier, evicting the least recently used decisions"""
+        if self.max_size <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "hit_rate": self.hits / lookups if lookups else 0
+        }
+
+    def close(self):
+        """Close the persistent tier"""
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+_shared_cache = None
+
+
+def get_shared_cache() -> Optional[DecisionCache]:
+    """
+    Process-wide decision cache configured from environment variables, so repeated
+    runs in the same server or sweep worker reuse earlier decisions. Only strategies
+    that opt in use it (see MultiAgentStrategy's use_decision_cache):
+
+    DECISION_CACHE_SIZE (0 disables the cache), DECISION_CACHE_PATH,
+    DECISION_CACHE_COUNT_BUCKET, DECISION_CACHE_PEDESTRIAN_BUCKET,
+    DECISION_CACHE_DURATION_BUCKET
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        max_size = int(os.environ.get("DECISION_CACHE_SIZE", 1024))
+        if max_size <= 0:
+            return None
+        _shared_cache = DecisionCache(
+            max_size=max_size,
+            path=os.environ.get("DECISION_CACHE_PATH") or None,
+            count_bucket=int(os.environ.get("DECISION_CACHE_COUNT_BUCKET", 5)),
+            pedestrian_bucket=int(os.environ.get("DECISION_CACHE_PEDESTRIAN_BUCKET", 2)),
+            duration_bucket=int(os.environ.get("DECISION_CACHE_DURATION_BUCKET", 15))
+        )
+    return _shared_cache
@@ -0,0 +1,139 @@
+import json
+from typing import Dict, List, Any, Optional, Tuple
+
+from traffic_optimizer.prompts import CONTROLLER_STATIC_PROMPT, CONTROLLER_STATE_PROMPT
+
+SYSTEM_PROMPT = "You are an intelligent traffic management system optimizer."
+
+# Rough characters per token when the tiktoken encoding cannot be loaded (e.g. offline)
+CHARS_PER_TOKEN = 4
+
+
+def compact_json(value: Any) -> str:
+    """Serialize without indentation or spaces to keep the prompt short"""
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _load_encoding(model: str):
+    """tiktoken encoding for the model, or None when it is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+def _trim_memory(state: Dict[str, Any], memory: List[Dict[str, Any]]):
+    return state, memory[:2]
+
+
+def _drop_context(state: Dict[str, Any], memory: List[Dict[str, Any]]):
+    return {**state, "context": None}, memory
+
+
+def _drop_destinations(state: Dict[str, Any], memory: List[Dict[str, Any]]):
+    vehicles = {key: value for key, value in (state.get("vehicles") or {}).items()
+                if key != "by_destination"}
+    return {**state, "vehicles": vehicles}, memory
+
+
+def _trim_emergency_vehicles(state: Dict[str, Any], memory: List[Dict[str, Any]]):
+    vehicles = dict(state.get("vehicles") or {})
+    vehicles["emergency_vehicles"] = vehicles.get("emergency_vehicles", [])[:3]
+    return {**state, "vehicles": vehicles}, memory
+
+
+# Reductions applied in order until the prompt fits the token budget
+TRIM_STEPS = [
+    ("memory", _trim_memory),
+    ("context", _drop_context),
+    ("by_destination", _drop_destinations),
+    ("emergency_vehicles", _trim_emergency_vehicles),
+]
+
+
+class PromptBuilder:
+    """
+    Builds optimizer prompts with the static content (instructions and traffic
+    configurations) first, serialized and token-counted once, followed by the
+    compact dynamic traffic state, trimmed to fit an optional token budget.
+    """
+
+    def __init__(self, traffic_config: Any, token_budget: Optional[int] = None, model: str = "gpt-4o"):
+        """
+        Args:
+            traffic_config: Movements description of the traffic configurations
+            token_budget: Maximum prompt tokens per call (unlimited if None)
+            model: Model whose tokenizer is used for counting
+        """
+        self.traffic_config_json = compact_json(traffic_config)
+        self.token_budget = token_budget
+        self.encoding = _load_encoding(model)
+        self.system_tokens = self.count_tokens(SYSTEM_PROMPT)
+        # Formatted static prompt and its token count per MAX_WAIT
+        self.static_prompts: Dict[int, Tuple[str, int]] = {}
+
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens in the text (estimated from its length without tiktoken)"""
+        if self.encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text))
+
+    def static_prompt(self, max_wait: int) -> Tuple[str, int]:
+        """Static prompt prefix and its token count, formatted once per MAX_WAIT"""
+        if max_wait not in self.static_prompts:
+            text = CONTROLLER_STATIC_PROMPT.format(
+                TRAFFIC_CONFIGURATION=self.traffic_config_json,
+                MAX_WAIT=max_wait
+            )
+            self.static_prompts[max_wait] = (text, self.count_tokens(text))
+        return self.static_prompts[max_wait]
+
+    def _state_prompt(self, configuration_state: Dict[str, Any], memory: List[Dict[str, Any]]) -> str:
+        return CONTROLLER_STATE_PROMPT.format(
+            CONFIGURATION_STATE=compact_json(configuration_state),
+            MEMORY=compact_json(memory)
+        )
+
+    def build(
+        self,
+        configuration_state: Dict[str, Any],
+        memory: List[Dict[str, Any]],
+        max_wait: int = 4
+    ) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Build the chat messages for one optimizer call.
+
+        Returns:
+            The messages and a token report for the call
+        """
+        static_text, static_tokens = self.static_prompt(max_wait)
+        state_text = self._state_prompt(configuration_state, memory)
+        dynamic_tokens = self.count_tokens(state_text)
+
+        # Reduce the dynamic state until the prompt fits the budget
+        trimmed = []
+        if self.token_budget is not None:
+            for name, trim in TRIM_STEPS:
+                if self.system_tokens + static_tokens + dynamic_tokens <= self.token_budget:
+                    break
+                configuration_state, memory = trim(configuration_state, memory)
+                state_text = self._state_prompt(configuration_state, memory)
+                dynamic_tokens = self.count_tokens(state_text)
+                trimmed.append(name)
+
+        prompt_tokens = self.system_tokens + static_tokens + dynamic_tokens
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": static_text + "\n" + state_text}
+        ]
+        report = {
+            "static_tokens": self.system_tokens + static_tokens,
+            "dynamic_tokens": dynamic_tokens,
+            "prompt_tokens": prompt_tokens,
+            "token_budget": self.token_budget,
+            "over_budget": self.token_budget is not None and prompt_tokens > self.token_budget,
+            "trimmed": trimmed,
+            "exact_count": self.encoding is not None
+        }
+        return messages, report
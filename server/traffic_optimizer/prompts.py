@@ -1,4 +1,6 @@
-CONTROLLER_PROMPT = """
+# Static part of the controller prompt: identical for every decision with the same
+# configuration file and MAX_WAIT, and placed first so provider-side prefix caching applies
+CONTROLLER_STATIC_PROMPT = """
 You are an intelligent traffic management system that optimizes traffic flow at an intersection. Your task is to:
 
 1. Analyze the current traffic volume data and context from the Current Traffic Data
@@ -6,20 +8,10 @@ You are an intelligent traffic management system that optimizes traffic flow at
 3. Select the optimal traffic light configuration for the next interval
 4. Maintain fairness by tracking the history of previous configurations in memory
 
-## Current Traffic Data
-The configuration_state.json file contains the current state of vehicle and pedestrian counts with their
-current lane ids and intended direction of movement,
-as well as the current weather conditions and any additional context data:
-{CONFIGURATION_STATE}
-
 ## Available Traffic Light Configurations
 The traffic_configuration.json file defines all possible traffic light configurations and their description for that configuration:
 {TRAFFIC_CONFIGURATION}
 
-## Previous Configuration History (memory)
-Previous 5 configurations chosen in List format with their respective durations (most recent first, followed by older configurations):
-{MEMORY}
-
 ## Optimization Parameters
 - Prioritize configurations with the highest vehicle and pedestrian throughput
 - Ensure reasonable waiting times for all directions (no direction should wait more than {MAX_WAIT} intervals)
@@ -54,4 +46,20 @@ Always explain how the traffic count directly influenced the duration chosen
   "justification": "Detailed explanation of why this configuration was selected and how the duration was determined based on traffic volumes and waiting time considerations."
 }}
 ```
-"""
\ No newline at end of file
+
+The Current Traffic Data and Previous Configuration History for this decision follow.
+"""
+
+# Dynamic part of the controller prompt: the traffic state of this decision
+CONTROLLER_STATE_PROMPT = """## Current Traffic Data
+The configuration_state.json file contains the current state of vehicle and pedestrian counts with their
+current lane ids and intended direction of movement,
+as well as the current weather conditions and any additional context data:
+{CONFIGURATION_STATE}
+
+## Previous Configuration History (memory)
+Previous 5 configurations chosen in List format with their respective durations (most recent first, followed by older configurations):
+{MEMORY}
+"""
+
+CONTROLLER_PROMPT = CONTROLLER_STATIC_PROMPT + "\n" + CONTROLLER_STATE_PROMPT
@@ -1,10 +1,13 @@
+import hashlib
 import json
 import os
 import time
 from datetime import datetime
 from openai import OpenAI
 from typing import Dict, List, Any, Optional
-from traffic_optimizer.prompts import CONTROLLER_PROMPT
+from traffic_optimizer.prompt_builder import PromptBuilder
+from traffic_optimizer.decision_cache import DecisionCache
+from utils.scenario_cache import load_json
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -20,7 +23,10 @@ class TrafficOptimizer:
         self,
         api_key=None,
         traffic_config_path="backend/traffic_rules/traffic_configuration.json",
-        memory=None
+        memory=None,
+        cache: Optional[DecisionCache] = None,
+        token_budget: Optional[int] = None,
+        model: str = "gpt-4o"
     ):
         """
         Initialize the Traffic Optimizer with API key and load necessary configurations.
@@ -29,6 +35,9 @@ class TrafficOptimizer:
             api_key: OpenAI API key (will use environment variable if None)
             traffic_config_path: Path to the traffic configuration JSON file
             memory: Initial memory state (empty list if None)
+            cache: Optional decision cache consulted before calling the API
+            token_budget: Maximum prompt tokens per call (unlimited if None)
+            model: OpenAI chat model to call
         """
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         self.client = OpenAI(api_key=self.api_key)
@@ -40,6 +49,27 @@ class TrafficOptimizer:
         # Initialize memory - Tracks 5 most recent configurations (from recent to oldest)
         self.memory = memory if memory is not None else []
 
+        # Decisions are only reused for the same set of configurations
+        self.cache = cache
+        # Lookups of this optimizer (the cache's own counters cover everyone sharing it)
+        self.cache_totals = {"hits": 0, "misses": 0}
+        self.config_fingerprint = hashlib.sha256(
+            json.dumps(self.traffic_config, sort_keys=True).encode("utf-8")).hexdigest()
+
+        # Static prompt prefix is serialized once and shared by every call
+        self.model = model
+        self.prompt_builder = PromptBuilder(self.traffic_config, token_budget=token_budget, model=model)
+        self.last_token_report: Optional[Dict[str, Any]] = None
+        self.token_totals = {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "dynamic_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+            "trimmed_calls": 0,
+            "over_budget_calls": 0
+        }
+
     def optimize(
         self,
         configuration_state: Dict[str, Any],
@@ -60,25 +90,30 @@ class TrafficOptimizer:
         # Use custom memory if provided, otherwise use the instance memory
         memory_to_use = custom_memory if custom_memory is not None else self.memory
 
-        # Format the prompt with current data
-        formatted_prompt = CONTROLLER_PROMPT.format(
-            CONFIGURATION_STATE=json.dumps(configuration_state, indent=2),
-            TRAFFIC_CONFIGURATION=json.dumps(self.traffic_config, indent=2),
-            MEMORY=json.dumps(memory_to_use, indent=2),
-            MAX_WAIT=max_wait
-        )
-
-        # Make the API call to GPT-4o-mini
+        # Reuse an earlier decision for a (quantized) identical situation
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(
+                configuration_state, memory_to_use, max_wait, self.config_fingerprint)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.cache_totals["hits"] += 1
+                self._update_memory(cached, memory_to_use)
+                return cached
+            self.cache_totals["misses"] += 1
+
+        # Static prefix first so the provider can reuse its cached prompt prefix
+        messages, report = self.prompt_builder.build(configuration_state, memory_to_use, max_wait)
+
+        # Make the API call
         response = self.client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an intelligent traffic management system optimizer."},
-                {"role": "user", "content": formatted_prompt}
-            ],
+            model=self.model,
+            messages=messages,
             temperature=0.2,  # Lower temperature for more deterministic results
             max_tokens=1024,
             response_format={"type": "json_object"}
         )
+        self._record_usage(report, getattr(response, "usage", None))
 
         # Extract and parse the response
         try:
@@ -91,20 +126,9 @@ class TrafficOptimizer:
                 raise ValueError(
                     f"Response missing required keys: {required_keys}")
 
-            # Create new memory entry
-            new_memory_entry = {
-                "configuration": result["selected_configuration"],
-                "duration": result["duration_seconds"]
-            }
-
-            # Update memory - add the new entry at the beginning, keeping only the 10 most recent entries.
-            updated_memory = [new_memory_entry]
-            if memory_to_use:
-                updated_memory.extend(
-                    memory_to_use[:min(5, len(memory_to_use))])
-
-            # Update the instance memory
-            self.memory = updated_memory
+            self._update_memory(result, memory_to_use)
+            if self.cache is not None:
+                self.cache.put(cache_key, result)
 
             return result
 
@@ -113,11 +137,60 @@ class TrafficOptimizer:
         except Exception as e:
             raise RuntimeError(f"Error processing API response: {str(e)}")
 
+    def _record_usage(self, report: Dict[str, Any], usage: Any):
+        """Add the API's token usage to the call report and the running totals"""
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            report["api_prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+            report["cached_tokens"] = getattr(details, "cached_tokens", None) or 0
+            report["completion_tokens"] = getattr(usage, "completion_tokens", None) or 0
+        self.last_token_report = report
+
+        totals = self.token_totals
+        totals["calls"] += 1
+        totals["prompt_tokens"] += report.get("api_prompt_tokens") or report["prompt_tokens"]
+        totals["dynamic_tokens"] += report["dynamic_tokens"]
+        totals["cached_tokens"] += report.get("cached_tokens", 0)
+        totals["completion_tokens"] += report.get("completion_tokens", 0)
+        totals["trimmed_calls"] += bool(report["trimmed"])
+        totals["over_budget_calls"] += report["over_budget"]
+
+    def token_stats(self) -> Dict[str, Any]:
+        """Token totals of all API calls plus the report of the latest one"""
+        return {**self.token_totals, "last_call": self.last_token_report}
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Decision cache hits and misses of this optimizer's calls (None without a cache)"""
+        if self.cache is None:
+            return None
+        lookups = self.cache_totals["hits"] + self.cache_totals["misses"]
+        return {
+            **self.cache_totals,
+            "hit_rate": self.cache_totals["hits"] / lookups if lookups else 0,
+            "size": len(self.cache.entries)
+        }
+
+    def _update_memory(self, result: Dict[str, Any], memory_to_use: List[Dict[str, Any]]):
+        """Record a decision at the front of the memory"""
+        # Create new memory entry
+        new_memory_entry = {
+            "configuration": result["selected_configuration"],
+            "duration": result["duration_seconds"]
+        }
+
+        # Update memory - add the new entry at the beginning, keeping only the 10 most recent entries.
+        updated_memory = [new_memory_entry]
+        if memory_to_use:
+            updated_memory.extend(
+                memory_to_use[:min(5, len(memory_to_use))])
+
+        # Update the instance memory
+        self.memory = updated_memory
+
     @staticmethod
     def load_json_file(file_path: str) -> Dict:
-        """Load and parse a JSON file."""
-        with open(file_path, 'r') as file:
-            return json.load(file)
+        """Load and parse a JSON file (re-read only when it changes)."""
+        return load_json(file_path)
 
 # if __name__ == "__main__":
 #     # Create optimizer instance with empty memory
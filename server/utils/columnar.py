@@ -0,0 +1,211 @@
+import os
+from typing import Dict, List, Any, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows buffered per table before they are written out as one Parquet row group
+ROW_GROUP_SIZE = 65536
+
+# One row per vehicle (approaching or passed) per step
+VEHICLES_SCHEMA = pa.schema([
+    ("step", pa.int32()),
+    ("timestamp", pa.string()),
+    ("vehicle_id", pa.string()),
+    ("vehicle_type", pa.string()),
+    ("lane_id", pa.string()),
+    ("destination", pa.string()),
+    ("distance_to_intersection_m", pa.float64()),
+    ("speed_kmh", pa.float64()),
+    ("emergency_vehicle", pa.bool_()),
+    ("passed", pa.bool_()),
+])
+
+# One row per vehicle that passed the intersection
+PASSED_VEHICLES_SCHEMA = pa.schema([
+    ("vehicle_id", pa.string()),
+    ("vehicle_type", pa.string()),
+    ("lane_id", pa.string()),
+    ("destination", pa.string()),
+    ("timestamp", pa.string()),
+    ("emergency_vehicle", pa.bool_()),
+    ("speed", pa.float64()),
+    ("wait_time", pa.int64()),
+    ("stops", pa.int64()),
+])
+
+# Per-step columns of the signal timeline besides the signal of every movement
+SIGNAL_COLUMNS = [
+    ("step", pa.int32()),
+    ("timestamp", pa.string()),
+    ("reasoning", pa.string()),
+    ("last_changed", pa.string()),
+    ("next_timestamp", pa.string()),
+    ("duration_seconds", pa.float64()),
+    ("queue_length", pa.int64()),
+    ("passed_vehicles_count", pa.int64()),
+    ("passed_pedestrians_count", pa.int64()),
+    ("pedestrians_north_south", pa.int64()),
+    ("pedestrians_east_west", pa.int64()),
+]
+
+TABLES = ["vehicles", "signals", "passed_vehicles"]
+
+
+class _TableWriter:
+    """Column buffers of one Parquet file, flushed as a row group when full"""
+
+    def __init__(self, path: str, schema: pa.Schema, row_group_size: int):
+        self.path = path
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.columns: Dict[str, List[Any]] = {name: [] for name in schema.names}
+        self.rows = 0
+        self.writer = pq.ParquetWriter(path, schema, compression="zstd")
+
+    def extend(self, rows: List[Dict[str, Any]], **values):
+        """
+        Add rows, taking each column from the row dicts unless it is given in values
+        (either one value for all rows or a list with a value per row)
+        """
+        for name, column in self.columns.items():
+            if name in values:
+                value = values[name]
+                column.extend(value if isinstance(value, list) else [value] * len(rows))
+            else:
+                column.extend([row.get(name) for row in rows])
+        self.rows += len(rows)
+        if self.rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(pa.table(self.columns, schema=self.schema))
+            for column in self.columns.values():
+                column.clear()
+            self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class ColumnarWriter:
+    """
+    Writes the states and passed vehicles of a run as Parquet tables while it runs:
+
+    vehicles.parquet: one row per vehicle per step (passed vehicles flagged)
+    signals.parquet: one row per step with the status of every signal and the step counters
+    passed_vehicles.parquet: one row per vehicle that passed the intersection
+    """
+
+    def __init__(self, experiment_dir: str, signals: List[str], row_group_size: int = ROW_GROUP_SIZE):
+        """
+        Args:
+            experiment_dir: Directory the tables are written to
+            signals: Movement and crosswalk signals, one column each in the signal timeline
+            row_group_size: Rows per Parquet row group
+        """
+        self.signals = signals
+        self.step = 0
+        signal_schema = pa.schema(SIGNAL_COLUMNS + [(signal, pa.string()) for signal in signals])
+        self.vehicles = _TableWriter(
+            os.path.join(experiment_dir, "vehicles.parquet"), VEHICLES_SCHEMA, row_group_size)
+        self.signal_timeline = _TableWriter(
+            os.path.join(experiment_dir, "signals.parquet"), signal_schema, row_group_size)
+        self.passed_vehicles = _TableWriter(
+            os.path.join(experiment_dir, "passed_vehicles.parquet"), PASSED_VEHICLES_SCHEMA, row_group_size)
+
+    def write_state(self, state: Dict[str, Any], passed: int):
+        """
+        Add the rows of one step.
+
+        Args:
+            state: Simulation state
+            passed: Number of passed vehicle records at the front of the state's vehicles
+        """
+        vehicles = state["vehicles"]
+        self.vehicles.extend(
+            vehicles,
+            step=self.step,
+            timestamp=state["timestamp"],
+            passed=[True] * passed + [False] * (len(vehicles) - passed))
+
+        signal_status = state["signal_status"]
+        pedestrians = state["pedestrians"]
+        self.signal_timeline.extend([{
+            **{signal: signal_status.get(signal) for signal in self.signals},
+            "step": self.step,
+            "timestamp": state["timestamp"],
+            "reasoning": state["reasoning"],
+            "last_changed": signal_status.get("last_changed"),
+            "next_timestamp": signal_status.get("next_timestamp"),
+            "duration_seconds": signal_status.get("duration_seconds"),
+            "queue_length": state["queue_length"],
+            "passed_vehicles_count": state["passed_vehicles_count"],
+            "passed_pedestrians_count": state["passed_pedestrians_count"],
+            "pedestrians_north_south": pedestrians.get("crosswalk_north_south"),
+            "pedestrians_east_west": pedestrians.get("crosswalk_east_west"),
+        }])
+        self.step += 1
+
+    def write_passed(self, records: List[Dict[str, Any]]):
+        """Add the records of vehicles that just passed the intersection"""
+        self.passed_vehicles.extend(records)
+
+    def close(self):
+        """Write the remaining rows and the Parquet footers"""
+        self.vehicles.close()
+        self.signal_timeline.close()
+        self.passed_vehicles.close()
+
+
+def load_table(experiment_dir: str, table: str, columns: Optional[List[str]] = None, filters=None):
+    """
+    Load one table of a run as a pandas DataFrame, reading only the requested columns.
+
+    Args:
+        experiment_dir: Experiment directory of the run
+        table: "vehicles", "signals" or "passed_vehicles"
+        columns: Columns to read (all if None)
+        filters: Optional pyarrow row filters, e.g. [("step", ">=", 100)]
+    """
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    return pq.read_table(os.path.join(experiment_dir, f"{table}.parquet"),
+                         columns=columns, filters=filters).to_pandas()
+
+
+def load_experiment(experiment_dir: str, columns: Optional[Dict[str, List[str]]] = None):
+    """
+    Load every table of a run as pandas DataFrames.
+
+    Args:
+        experiment_dir: Experiment directory of the run
+        columns: Optional columns to read per table name
+
+    Returns:
+        Dict mapping table name to DataFrame
+    """
+    columns = columns or {}
+    return {table: load_table(experiment_dir, table, columns.get(table)) for table in TABLES}
+
+
+def load_metrics_inputs(experiment_dir: str) -> Dict[str, Any]:
+    """
+    Read only the columns calculate_metrics needs from the tables of a run.
+
+    Returns:
+        Keyword arguments for calculate_metrics (except output_dir)
+    """
+    signals = load_table(experiment_dir, "signals",
+                         ["timestamp", "queue_length", "passed_pedestrians_count"])
+    passed_vehicles = load_table(experiment_dir, "passed_vehicles",
+                                 ["vehicle_type", "wait_time", "stops"])
+    return {
+        "states": [{"timestamp": timestamp} for timestamp in signals["timestamp"]],
+        "passed_vehicles": passed_vehicles.to_dict("records"),
+        "passed_pedestrians": int(signals["passed_pedestrians_count"].iloc[-1]) if len(signals) else 0,
+        # The simulator records queue lengths from the first step on, not for the initial state
+        "queue_lengths": signals["queue_length"].tolist()[1:]
+    }
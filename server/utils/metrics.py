@@ -1,8 +1,138 @@
 import json
-import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable
 from datetime import datetime
-import statistics
+
+# Use approximate emission factors based on vehicle type
+EMISSION_FACTORS = {
+    "car": {"CO2_kg_per_km": 0.120, "NOx_g_per_km": 0.040, "particulates_g_per_km": 0.002},
+    "suv": {"CO2_kg_per_km": 0.180, "NOx_g_per_km": 0.060, "particulates_g_per_km": 0.003},
+    "sedan": {"CO2_kg_per_km": 0.130, "NOx_g_per_km": 0.045, "particulates_g_per_km": 0.002},
+    "truck": {"CO2_kg_per_km": 0.500, "NOx_g_per_km": 0.200, "particulates_g_per_km": 0.010},
+    "bus": {"CO2_kg_per_km": 0.800, "NOx_g_per_km": 0.300, "particulates_g_per_km": 0.015},
+    "van": {"CO2_kg_per_km": 0.200, "NOx_g_per_km": 0.080, "particulates_g_per_km": 0.004},
+    "motorcycle": {"CO2_kg_per_km": 0.080, "NOx_g_per_km": 0.020, "particulates_g_per_km": 0.001},
+    "ambulance": {"CO2_kg_per_km": 0.250, "NOx_g_per_km": 0.100, "particulates_g_per_km": 0.005},
+    "default": {"CO2_kg_per_km": 0.150, "NOx_g_per_km": 0.050, "particulates_g_per_km": 0.002}
+}
+
+ENERGY_FACTORS = {
+    "car": 0.20,  # kWh per km
+    "suv": 0.30,
+    "sedan": 0.22,
+    "truck": 0.80,
+    "bus": 1.20,
+    "van": 0.35,
+    "motorcycle": 0.10,
+    "ambulance": 0.40,
+    "default": 0.25
+}
+
+# Assume each vehicle travels approximately 0.3 km through the intersection
+DISTANCE_KM = 0.3
+
+
+class MetricsAccumulator:
+    """
+    Running totals behind calculate_metrics, updated as the simulation goes.
+
+    Only the first and last timestamps, counts and sums are kept, so the metrics
+    are available at any point of a run without holding on to states, queue
+    lengths or passed vehicles. Values are accumulated in the same order as
+    calculate_metrics does, so the final metrics are identical.
+    """
+
+    def __init__(self):
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.state_count = 0
+        self.vehicle_count = 0
+        self.passed_pedestrians = 0
+        self.total_wait_time = 0
+        self.total_stops = 0
+        self.queue_length_count = 0
+        self.queue_length_sum = 0
+        self.max_queue_length = 0
+        self.total_co2 = 0
+        self.total_nox = 0
+        self.total_particulates = 0
+        self.total_energy = 0
+
+    def add_states(self, timestamp: str, count: int = 1):
+        """Record `count` saved states, the last of them at `timestamp`"""
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+        self.state_count += count
+
+    def add_queue_length(self, queue_length: int, count: int = 1):
+        """Record the queue length of `count` steps"""
+        if self.queue_length_count == 0 or queue_length > self.max_queue_length:
+            self.max_queue_length = queue_length
+        self.queue_length_count += count
+        self.queue_length_sum += queue_length * count
+
+    def add_passed_vehicles(self, passed_vehicles: Iterable[Dict[str, Any]]):
+        """Record vehicles that passed the intersection"""
+        for vehicle in passed_vehicles:
+            self.vehicle_count += 1
+            self.total_wait_time += vehicle["wait_time"]
+            self.total_stops += vehicle["stops"]
+
+            vehicle_type = vehicle.get("vehicle_type", "default")
+            emission = EMISSION_FACTORS.get(vehicle_type, EMISSION_FACTORS["default"])
+            energy = ENERGY_FACTORS.get(vehicle_type, ENERGY_FACTORS["default"])
+
+            # Adjust for stop-and-go traffic which increases emissions
+            stops_factor = 1.0 + (0.1 * vehicle["stops"])
+            wait_factor = 1.0 + (0.01 * vehicle["wait_time"])
+
+            # Calculate emissions
+            self.total_co2 += emission["CO2_kg_per_km"] * DISTANCE_KM * stops_factor * wait_factor
+            self.total_nox += emission["NOx_g_per_km"] * DISTANCE_KM * stops_factor * wait_factor
+            self.total_particulates += emission["particulates_g_per_km"] * DISTANCE_KM * stops_factor * wait_factor
+
+            # Calculate energy
+            self.total_energy += energy * DISTANCE_KM * stops_factor
+
+    def metrics(self) -> Dict[str, Any]:
+        """Metrics of the run so far, in the format of calculate_metrics"""
+        # Simulation duration in hours
+        if self.state_count > 1:
+            start_time = datetime.fromisoformat(self.first_timestamp)
+            end_time = datetime.fromisoformat(self.last_timestamp)
+            duration_hours = (end_time - start_time).total_seconds() / 3600
+        else:
+            duration_hours = 0.01  # Prevent division by zero
+
+        vehicle_count = self.vehicle_count
+        passed_pedestrians = self.passed_pedestrians
+        return {
+            "throughput_per_hour": {
+                "vehicles": round(vehicle_count / duration_hours),
+                "pedestrians": round(passed_pedestrians / duration_hours),
+                "total": round((vehicle_count + passed_pedestrians) / duration_hours)
+            },
+            "average_delay_per_vehicle": self.total_wait_time / vehicle_count if vehicle_count else 0,
+            "total_stops": self.total_stops,
+            "max_queue_length": self.max_queue_length,
+            "average_queue_length": (self.queue_length_sum / self.queue_length_count
+                                     if self.queue_length_count else 0),
+            "carbon_emissions": {
+                "CO2_kg": self.total_co2,
+                "NOx_g": self.total_nox,
+                "particulates_g": self.total_particulates
+            },
+            # Energy efficiency lower is better, normalized by vehicle throughput for fair comparison
+            "energy_efficiency": self.total_energy / vehicle_count if vehicle_count else 0
+        }
+
+    def save(self, output_dir: str) -> Dict[str, Any]:
+        """Write the metrics to metrics.json in the output directory and return them"""
+        metrics = self.metrics()
+        with open(f"{output_dir}/metrics.json", "w") as file:
+            json.dump(metrics, file, indent=2)
+        return metrics
+
 
 def calculate_metrics(states: List[Dict[str, Any]], 
                       passed_vehicles: List[Dict[str, Any]],
@@ -12,120 +142,15 @@ def calculate_metrics(states: List[Dict[str, Any]],
     """
     Calculate traffic metrics based on simulation results
     """
-    # Initialize metrics dict
-    metrics = {
-        "throughput_per_hour": {
-            "vehicles": 0,
-            "pedestrians": 0,
-            "total": 0
-        },
-        "average_delay_per_vehicle": 0,
-        "total_stops": 0,
-        "max_queue_length": 0,
-        "average_queue_length": 0,
-        "carbon_emissions": {
-            "CO2_kg": 0,
-            "NOx_g": 0,
-            "particulates_g": 0
-        },
-        "energy_efficiency": 0
-    }
-    
-    # Simulation duration in hours
+    accumulator = MetricsAccumulator()
+    if states:
+        accumulator.add_states(states[0]["timestamp"])
     if len(states) > 1:
-        start_time = datetime.fromisoformat(states[0]["timestamp"])
-        end_time = datetime.fromisoformat(states[-1]["timestamp"])
-        duration_seconds = (end_time - start_time).total_seconds()
-        duration_hours = duration_seconds / 3600
-    else:
-        duration_hours = 0.01  # Prevent division by zero
-    
-    # Calculate throughput
-    vehicle_count = len(passed_vehicles)
-    metrics["throughput_per_hour"]["vehicles"] = round(vehicle_count / duration_hours)
-    metrics["throughput_per_hour"]["pedestrians"] = round(passed_pedestrians / duration_hours)
-    metrics["throughput_per_hour"]["total"] = round((vehicle_count + passed_pedestrians) / duration_hours)
-    
-    # Calculate delay and stops
-    if passed_vehicles:
-        total_wait_time = sum(v["wait_time"] for v in passed_vehicles)
-        total_stops = sum(v["stops"] for v in passed_vehicles)
-        
-        metrics["average_delay_per_vehicle"] = total_wait_time / vehicle_count
-        metrics["total_stops"] = total_stops
-    
-    # Calculate queue lengths
-    if queue_lengths:
-        metrics["max_queue_length"] = max(queue_lengths)
-        metrics["average_queue_length"] = sum(queue_lengths) / len(queue_lengths)
-    
-    # Calculate emissions and energy efficiency
-    # Use approximate emission factors based on vehicle type
-    emission_factors = {
-        "car": {"CO2_kg_per_km": 0.120, "NOx_g_per_km": 0.040, "particulates_g_per_km": 0.002},
-        "suv": {"CO2_kg_per_km": 0.180, "NOx_g_per_km": 0.060, "particulates_g_per_km": 0.003}, 
-        "sedan": {"CO2_kg_per_km": 0.130, "NOx_g_per_km": 0.045, "particulates_g_per_km": 0.002},
-        "truck": {"CO2_kg_per_km": 0.500, "NOx_g_per_km": 0.200, "particulates_g_per_km": 0.010},
-        "bus": {"CO2_kg_per_km": 0.800, "NOx_g_per_km": 0.300, "particulates_g_per_km": 0.015},
-        "van": {"CO2_kg_per_km": 0.200, "NOx_g_per_km": 0.080, "particulates_g_per_km": 0.004},
-        "motorcycle": {"CO2_kg_per_km": 0.080, "NOx_g_per_km": 0.020, "particulates_g_per_km": 0.001},
-        "ambulance": {"CO2_kg_per_km": 0.250, "NOx_g_per_km": 0.100, "particulates_g_per_km": 0.005},
-        "default": {"CO2_kg_per_km": 0.150, "NOx_g_per_km": 0.050, "particulates_g_per_km": 0.002}
-    }
-    
-    energy_factors = {
-        "car": 0.20,  # kWh per km
-        "suv": 0.30,
-        "sedan": 0.22,
-        "truck": 0.80,
-        "bus": 1.20,
-        "van": 0.35,
-        "motorcycle": 0.10,
-        "ambulance": 0.40,
-        "default": 0.25
-    }
-    
-    # Assume each vehicle travels approximately 0.3 km through the intersection
-    distance_km = 0.3
-    
-    # Calculate total emissions and energy use
-    total_co2 = 0
-    total_nox = 0
-    total_particulates = 0
-    total_energy = 0
-    
-    for vehicle in passed_vehicles:
-        vehicle_type = vehicle.get("vehicle_type", "default")
-        emission = emission_factors.get(vehicle_type, emission_factors["default"])
-        energy = energy_factors.get(vehicle_type, energy_factors["default"])
-        
-        # Adjust for stop-and-go traffic which increases emissions
-        stops_factor = 1.0 + (0.1 * vehicle["stops"])
-        wait_factor = 1.0 + (0.01 * vehicle["wait_time"])
-        
-        # Calculate emissions
-        co2 = emission["CO2_kg_per_km"] * distance_km * stops_factor * wait_factor
-        nox = emission["NOx_g_per_km"] * distance_km * stops_factor * wait_factor
-        particulates = emission["particulates_g_per_km"] * distance_km * stops_factor * wait_factor
-        
-        total_co2 += co2
-        total_nox += nox
-        total_particulates += particulates
-        
-        # Calculate energy
-        energy_use = energy * distance_km * stops_factor
-        total_energy += energy_use
-    
-    metrics["carbon_emissions"]["CO2_kg"] = total_co2
-    metrics["carbon_emissions"]["NOx_g"] = total_nox
-    metrics["carbon_emissions"]["particulates_g"] = total_particulates
-    
-    # Energy efficiency lower is better, normalized by vehicle throughput for fair comparison
-    if vehicle_count > 0:
-        metrics["energy_efficiency"] = total_energy / vehicle_count
-    
+        accumulator.add_states(states[-1]["timestamp"], len(states) - 1)
+    for queue_length in queue_lengths:
+        accumulator.add_queue_length(queue_length)
+    accumulator.add_passed_vehicles(passed_vehicles)
+    accumulator.passed_pedestrians = passed_pedestrians
+
     # Save metrics to output directory
-    with open(f"{output_dir}/metrics.json", "w") as file:
-        json.dump(metrics, file, indent=2)
-    
-    return metrics
\ No newline at end of file
+    return accumulator.save(output_dir)
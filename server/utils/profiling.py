@@ -0,0 +1,327 @@
+import json
+import threading
+import time
+import tracemalloc
+import weakref
+from bisect import bisect_left
+from typing import Dict, List, Any, Callable, Optional
+
+# Upper bounds in seconds of the strategy latency histogram buckets
+LATENCY_BUCKETS = [0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30]
+
+# Simulator methods timed as phases (phases may nest: change_signal includes strategy,
+# save_state includes build_state)
+SIMULATOR_PHASES = {
+    "advance": "step",
+    "_change_signal": "change_signal",
+    "_update_pedestrians": "update_pedestrians",
+    "_update_vehicles": "update_vehicles",
+    "_update_passed_vehicles": "update_passed_vehicles",
+    "_save_state": "save_state",
+    "_current_state": "build_state",
+    "_track_queue_length": "track_queue_length",
+    "_request_signal_change": "request_signal_change",
+    "_fast_forward": "fast_forward",
+    "_save_results": "save_results",
+}
+
+# Allocation sites kept per tracemalloc snapshot
+SNAPSHOT_TOP = 10
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, in the shape Prometheus expects"""
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the overflow (+Inf) bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self) -> List[tuple]:
+        """(upper bound, observations up to it) per bucket, ending with +Inf"""
+        total = 0
+        rows = []
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            total += count
+            rows.append((bound, total))
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "buckets": {("+Inf" if bound == float("inf") else str(bound)): count
+                        for bound, count in self.cumulative()},
+            "sum": self.sum,
+            "count": self.count
+        }
+
+
+class Profiler:
+    """
+    Per-phase wall time of a simulation run, its tick counts, a strategy latency
+    histogram and optional tracemalloc snapshots.
+
+    The profiler replaces the simulator's phase methods with timed wrappers on the
+    instance, so runs without a profiler execute exactly the same code as before.
+    """
+
+    def __init__(self, name: str, trace_memory: bool = False, snapshot_interval: Optional[int] = None):
+        """
+        Args:
+            name: Label of the run (the experiment directory name)
+            trace_memory: Record tracemalloc snapshots
+            snapshot_interval: Steps between snapshots (only at the end if None)
+        """
+        self.name = name
+        self.trace_memory = trace_memory
+        self.snapshot_interval = snapshot_interval
+        # Phase name -> [seconds, calls]
+        self.phases: Dict[str, List[float]] = {}
+        self.skipped_ticks = 0
+        self.strategy_latency = Histogram()
+        self.snapshots: List[Dict[str, Any]] = []
+        self.snapshot_tick = 0
+        # Releases this run's hold on tracemalloc, at the latest when the profiler is dropped
+        self.release_tracing = None
+        self.started_at = time.perf_counter()
+        _register(self)
+
+    @property
+    def ticks(self) -> int:
+        """Steps processed one by one plus steps skipped in event mode"""
+        return int(self.phases.get("step", [0, 0])[1]) + self.skipped_ticks
+
+    def wrap(self, phase: str, function: Callable, histogram: Optional[Histogram] = None) -> Callable:
+        """Time every call of function as the phase"""
+        totals = self.phases.setdefault(phase, [0.0, 0])
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                totals[0] += elapsed
+                totals[1] += 1
+                if histogram is not None:
+                    histogram.observe(elapsed)
+        return timed
+
+    def instrument(self, simulator):
+        """Wrap the phases of a TrafficSimulator and its strategy"""
+        for method, phase in SIMULATOR_PHASES.items():
+            setattr(simulator, method, self.wrap(phase, getattr(simulator, method)))
+
+        fast_forward = simulator._fast_forward
+
+        def counted_fast_forward(ticks, delta_time):
+            self.skipped_ticks += ticks
+            return fast_forward(ticks, delta_time)
+        simulator._fast_forward = counted_fast_forward
+
+        if self.snapshot_interval:
+            advance = simulator.advance
+
+            def advance_with_snapshots(*args, **kwargs):
+                result = advance(*args, **kwargs)
+                if self.ticks >= self.snapshot_tick + self.snapshot_interval:
+                    self.snapshot_tick = self.ticks
+                    self.snapshot(f"step {self.ticks}")
+                return result
+            simulator.advance = advance_with_snapshots
+
+        strategy = simulator.strategy
+        strategy.get_next_signal_status = self.wrap(
+            "strategy", strategy.get_next_signal_status, self.strategy_latency)
+        if hasattr(strategy, "request_next_signal_status"):
+            strategy.request_next_signal_status = self.wrap(
+                "strategy_request", strategy.request_next_signal_status)
+
+        if self.trace_memory and self.release_tracing is None:
+            _acquire_tracing()
+            self.release_tracing = weakref.finalize(self, _release_tracing)
+
+    def snapshot(self, label: str):
+        """Record the current and peak traced memory and the largest allocation sites"""
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:SNAPSHOT_TOP]
+        self.snapshots.append({
+            "label": label,
+            "current_mb": round(current / 2 ** 20, 3),
+            "peak_mb": round(peak / 2 ** 20, 3),
+            "top": [{"location": str(stat.traceback), "size_kb": round(stat.size / 1024, 1),
+                     "count": stat.count} for stat in top]
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "wall_seconds": round(time.perf_counter() - self.started_at, 6),
+            "ticks": self.ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "phases": {phase: {"seconds": round(seconds, 6), "calls": int(calls)}
+                       for phase, (seconds, calls) in self.phases.items()},
+            "strategy_latency_seconds": self.strategy_latency.to_dict(),
+            "snapshots": self.snapshots
+        }
+
+    def save(self, output_dir: str) -> Dict[str, Any]:
+        """Write profile.json to the experiment directory and add the run to the process totals"""
+        if self.trace_memory:
+            self.snapshot("end")
+            if self.release_tracing is not None:
+                self.release_tracing()
+        profile = self.to_dict()
+        with open(f"{output_dir}/profile.json", "w") as file:
+            json.dump(profile, file, indent=2)
+        _unregister(self)
+        return profile
+
+
+# Profilers of running simulations and the totals of finished ones, for /metrics
+# (runs that never finish, e.g. cancelled jobs, drop out with their simulator)
+_lock = threading.Lock()
+_active: "weakref.WeakValueDictionary[int, Profiler]" = weakref.WeakValueDictionary()
+_totals = {"runs": 0, "ticks": 0, "phases": {}, "strategy_latency": Histogram()}
+
+# tracemalloc is process-wide: it runs while any profiled run traces memory, and is
+# only stopped by the last of them if a profiler started it
+_tracing = {"users": 0, "started": False}
+
+
+def _acquire_tracing():
+    with _lock:
+        if _tracing["users"] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing["started"] = True
+        _tracing["users"] += 1
+
+
+def _release_tracing():
+    with _lock:
+        _tracing["users"] -= 1
+        if _tracing["users"] == 0 and _tracing["started"]:
+            tracemalloc.stop()
+            _tracing["started"] = False
+
+
+def _register(profiler: Profiler):
+    with _lock:
+        _active[id(profiler)] = profiler
+
+
+def _unregister(profiler: Profiler):
+    with _lock:
+        if _active.pop(id(profiler), None) is None:
+            return
+        _totals["runs"] += 1
+        _totals["ticks"] += profiler.ticks
+        for phase, (seconds, calls) in profiler.phases.items():
+            totals = _totals["phases"].setdefault(phase, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += calls
+        _totals["strategy_latency"].merge(profiler.strategy_latency)
+
+
+def collect() -> Dict[str, Any]:
+    """Totals over every profiled run of the process, finished or running"""
+    with _lock:
+        active = list(_active.values())
+        phases = {phase: list(values) for phase, values in _totals["phases"].items()}
+        latency = Histogram()
+        latency.merge(_totals["strategy_latency"])
+        collected = {"runs_finished": _totals["runs"], "ticks": _totals["ticks"]}
+    for profiler in active:
+        collected["ticks"] += profiler.ticks
+        for phase, (seconds, calls) in list(profiler.phases.items()):
+            totals = phases.setdefault(phase, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += calls
+        latency.merge(profiler.strategy_latency)
+    collected.update({
+        "runs_active": len(active),
+        "phases": phases,
+        "strategy_latency": latency,
+        "active": [{"name": profiler.name, "ticks": profiler.ticks} for profiler in active]
+    })
+    return collected
+
+
+def _labels(**labels) -> str:
+    """Prometheus label set, with backslashes, quotes and newlines escaped"""
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus(job_stats: Optional[Dict[str, Any]] = None,
+                      jobs: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    Prometheus text exposition of the profiled runs and, if given, the job queue.
+
+    Args:
+        job_stats: JobQueue.stats()
+        jobs: to_dict() of the running jobs, for their live progress
+    """
+    collected = collect()
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, samples: List[tuple]):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_labels(**labels)} {value}")
+
+    metric("simulator_profiled_runs_active", "gauge", "Profiled simulation runs in progress",
+           [("", {}, collected["runs_active"])])
+    metric("simulator_profiled_runs_total", "counter", "Profiled simulation runs finished",
+           [("", {}, collected["runs_finished"])])
+    metric("simulator_ticks_total", "counter", "Simulation steps of profiled runs (including skipped steps)",
+           [("", {}, collected["ticks"])])
+    metric("simulator_phase_seconds_total", "counter", "Wall time per simulator phase",
+           [("", {"phase": phase}, round(seconds, 6))
+            for phase, (seconds, _) in sorted(collected["phases"].items())])
+    metric("simulator_phase_calls_total", "counter", "Calls per simulator phase",
+           [("", {"phase": phase}, int(calls))
+            for phase, (_, calls) in sorted(collected["phases"].items())])
+
+    latency = collected["strategy_latency"]
+    metric("simulator_strategy_latency_seconds", "histogram", "Signal strategy decision latency",
+           [("_bucket", {"le": "+Inf" if bound == float("inf") else bound}, count)
+            for bound, count in latency.cumulative()] +
+           [("_sum", {}, round(latency.sum, 6)), ("_count", {}, latency.count)])
+    metric("simulator_run_ticks", "gauge", "Steps simulated so far by each profiled run",
+           [("", {"experiment": run["name"]}, run["ticks"]) for run in collected["active"]])
+
+    if job_stats is not None:
+        metric("simulation_jobs", "gauge", "Simulation jobs per status",
+               [("", {"status": status}, job_stats[status])
+                for status in ["queued", "running", "completed", "failed", "cancelled"]])
+        metric("simulation_workers", "gauge", "Simulation worker threads",
+               [("", {}, job_stats["max_workers"])])
+    if jobs is not None:
+        metric("simulation_job_step", "gauge", "Current step of each running simulation job",
+               [("", {"job_id": job["job_id"]}, job["progress"].get("step", 0)) for job in jobs])
+        metric("simulation_job_vehicles_remaining", "gauge",
+               "Vehicles still approaching in each running simulation job",
+               [("", {"job_id": job["job_id"]}, job["progress"].get("vehicles_remaining", 0))
+                for job in jobs])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Any, Tuple
+
+import jsonschema
+import orjson
+
+from engine.vectorized import intern_strings
+
+# Structure the simulator relies on; everything else in a scenario is passed through
+SCENARIO_SCHEMA = {
+    "type": "object",
+    "required": ["vehicle_data", "pedestrians", "signal_status"],
+    "properties": {
+        "vehicle_data": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["vehicle_id", "lane_id", "destination", "vehicle_type",
+                             "speed_kmh", "distance_to_intersection_m", "emergency_vehicle"],
+                "properties": {
+                    "vehicle_id": {"type": "string"},
+                    "lane_id": {"type": "string"},
+                    "destination": {"type": "string"},
+                    "vehicle_type": {"type": "string"},
+                    "speed_kmh": {"type": "number", "minimum": 0},
+                    "distance_to_intersection_m": {"type": "number"},
+                    "emergency_vehicle": {"type": "boolean"}
+                }
+            }
+        },
+        "pedestrians": {
+            "type": "object",
+            "properties": {
+                "crosswalk_north_south": {"type": "integer", "minimum": 0},
+                "crosswalk_east_west": {"type": "integer", "minimum": 0}
+            }
+        },
+        "signal_status": {
+            "type": "object",
+            "required": ["last_changed", "next_timestamp"],
+            "properties": {
+                "last_changed": {"type": "string"},
+                "next_timestamp": {"type": "string"}
+            }
+        },
+        "context": {"type": ["object", "null"]}
+    }
+}
+
+# Checked once at import, then reused for every scenario
+SCENARIO_VALIDATOR = jsonschema.Draft7Validator(SCENARIO_SCHEMA)
+SCENARIO_VALIDATOR.check_schema(SCENARIO_SCHEMA)
+VEHICLE_VALIDATOR = jsonschema.Draft7Validator(SCENARIO_SCHEMA["properties"]["vehicle_data"]["items"])
+
+# Python types of the vehicle fields, for a fast pass over large vehicle lists
+# (bool is excluded from the numbers like JSON Schema does)
+_VEHICLE_FIELD_TYPES = [
+    (name, (str,) if spec["type"] == "string" else (bool,) if spec["type"] == "boolean" else (int, float))
+    for name, spec in SCENARIO_SCHEMA["properties"]["vehicle_data"]["items"]["properties"].items()
+]
+
+
+def _vehicle_is_valid(vehicle: Any) -> bool:
+    """Fast check equivalent to VEHICLE_VALIDATOR for the common case of a valid vehicle"""
+    if type(vehicle) is not dict:
+        return False
+    for name, types in _VEHICLE_FIELD_TYPES:
+        if type(vehicle.get(name)) not in types:
+            return False
+    return vehicle["speed_kmh"] >= 0
+
+
+def _raise_first_error(validator: jsonschema.Draft7Validator, value: Any, prefix: List[Any]):
+    error = jsonschema.exceptions.best_match(validator.iter_errors(value))
+    if error is not None:
+        location = "/".join(str(part) for part in prefix + list(error.absolute_path)) or "scenario"
+        raise ValueError(f"Invalid scenario at {location}: {error.message}")
+
+
+def validate_scenario(scenario: Any):
+    """
+    Check a scenario against SCENARIO_SCHEMA.
+
+    Raises:
+        ValueError: Describing the first problem found
+    """
+    vehicles = scenario.get("vehicle_data") if isinstance(scenario, dict) else None
+    if not isinstance(vehicles, list):
+        _raise_first_error(SCENARIO_VALIDATOR, scenario, [])
+    # Everything but the vehicles goes through the schema validator, the vehicles
+    # through the fast check (and the validator only for the error message)
+    _raise_first_error(SCENARIO_VALIDATOR, {**scenario, "vehicle_data": []}, [])
+    for index, vehicle in enumerate(vehicles):
+        if not _vehicle_is_valid(vehicle):
+            _raise_first_error(VEHICLE_VALIDATOR, vehicle, ["vehicle_data", index])
+    for key in ["last_changed", "next_timestamp"]:
+        try:
+            datetime.fromisoformat(scenario["signal_status"][key])
+        except ValueError:
+            raise ValueError(f"Invalid scenario at signal_status/{key}: not an ISO timestamp")
+
+
+class CompiledScenario:
+    """
+    A validated scenario ready to start runs from.
+
+    The scenario is parsed and validated once. Its timestamps are parsed, its lane,
+    destination and vehicle type strings are interned to integer codes, and the
+    parts every run mutates are kept as compact JSON so each run gets fresh copies
+    with a single C-level parse instead of a deep copy.
+    """
+
+    def __init__(self, data: bytes, content_hash: str):
+        self.content_hash = content_hash
+        self.scenario: Dict[str, Any] = orjson.loads(data)
+        validate_scenario(self.scenario)
+
+        signal_status = self.scenario["signal_status"]
+        self.last_changed = datetime.fromisoformat(signal_status["last_changed"])
+        self.next_timestamp = datetime.fromisoformat(signal_status["next_timestamp"])
+
+        vehicles = self.scenario["vehicle_data"]
+        self.lane_names, self.lane_codes = intern_strings([v["lane_id"] for v in vehicles])
+        self.destination_names, self.destination_codes = intern_strings([v["destination"] for v in vehicles])
+        self.vehicle_type_names, self.vehicle_type_codes = intern_strings([v["vehicle_type"] for v in vehicles])
+
+        self.vehicles_json = orjson.dumps(vehicles)
+        self.pedestrians_json = orjson.dumps(self.scenario["pedestrians"])
+        self.signal_status_json = orjson.dumps(signal_status)
+
+    def new_vehicles(self) -> List[Dict[str, Any]]:
+        """Fresh copies of the scenario's vehicles for a run"""
+        return orjson.loads(self.vehicles_json)
+
+    def new_pedestrians(self) -> Dict[str, Any]:
+        """Fresh copy of the scenario's pedestrians for a run"""
+        return orjson.loads(self.pedestrians_json)
+
+    def new_signal_status(self) -> Dict[str, Any]:
+        """Fresh copy of the scenario's signal status for a run"""
+        return orjson.loads(self.signal_status_json)
+
+
+class ScenarioCache:
+    """
+    Compiled scenarios keyed by content hash.
+
+    A file is only re-read when its modification time or size changes, and only
+    recompiled when its content hash is new, so starting a run from an unchanged
+    scenario costs a stat call.
+    """
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        # path -> (mtime_ns, size, content hash)
+        self.files: Dict[str, Tuple[int, int, str]] = {}
+        self.compiled: "OrderedDict[str, CompiledScenario]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> CompiledScenario:
+        """
+        Compiled scenario of a file.
+
+        Raises:
+            ValueError: If the scenario is invalid
+        """
+        stat = os.stat(path)
+        with self.lock:
+            known = self.files.get(path)
+            if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                compiled = self.compiled.get(known[2])
+                if compiled is not None:
+                    self.compiled.move_to_end(known[2])
+                    self.hits += 1
+                    return compiled
+
+        with open(path, "rb") as file:
+            data = file.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        with self.lock:
+            compiled = self.compiled.get(content_hash)
+            if compiled is None:
+                self.misses += 1
+                compiled = CompiledScenario(data, content_hash)
+                self.compiled[content_hash] = compiled
+                while len(self.compiled) > self.max_size:
+                    self.compiled.popitem(last=False)
+            else:
+                self.hits += 1
+            self.compiled.move_to_end(content_hash)
+            self.files[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+            return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the cache"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.compiled)}
+
+
+_scenario_cache = None
+_json_files: Dict[str, Tuple[int, int, bytes]] = {}
+
+
+def get_scenario_cache() -> ScenarioCache:
+    """Process-wide scenario cache (SCENARIO_CACHE_SIZE compiled scenarios)"""
+    global _scenario_cache
+    if _scenario_cache is None:
+        _scenario_cache = ScenarioCache(max_size=int(os.environ.get("SCENARIO_CACHE_SIZE", 64)))
+    return _scenario_cache
+
+
+def load_scenario(path: str) -> CompiledScenario:
+    """Compiled scenario of a file from the process-wide cache"""
+    return get_scenario_cache().get(path)
+
+
+def load_json(path: str) -> Any:
+    """
+    Fresh copy of a small JSON file (e.g. the traffic configuration), re-reading
+    the file only when its modification time or size changes.
+    """
+    stat = os.stat(path)
+    cached = _json_files.get(path)
+    if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+        with open(path, "rb") as file:
+            cached = (stat.st_mtime_ns, stat.st_size, file.read())
+        _json_files[path] = cached
+    return orjson.loads(cached[2])
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+import orjson
+
+from utils.state_stream import StateWriter, index_path, write_index
+
+# Directory the simulator writes experiments to
+EXPERIMENTS_DIR = "experiments"
+
+# Serializes index builds of concurrent requests
+_build_lock = threading.Lock()
+
+
+class StateIndex:
+    """
+    Random access to the states of an experiment through an on-disk offset index.
+
+    The index holds the byte offset and timestamp of every line of states.ndjson,
+    so a range of steps is a single seek and read of exactly those bytes. Runs that
+    only saved states.json are converted to NDJSON (and indexed) on first access.
+    """
+
+    def __init__(self, experiment_dir: str):
+        self.experiment_dir = experiment_dir
+        self.path = os.path.join(experiment_dir, "states.ndjson")
+        self.index_path = index_path(self.path)
+        with _build_lock:
+            if not self._is_current():
+                self._build()
+        with np.load(self.index_path) as index:
+            self.offsets = index["offsets"]
+            self.timestamps = index["timestamps"]
+
+    def _is_current(self) -> bool:
+        """Whether an index exists and is at least as new as the states file"""
+        return (os.path.exists(self.path) and os.path.exists(self.index_path) and
+                os.path.getmtime(self.index_path) >= os.path.getmtime(self.path))
+
+    def _build(self):
+        """Write the index, converting states.json to NDJSON first if needed"""
+        if not os.path.exists(self.path):
+            # The writer records the offsets and writes the index when closed
+            with open(os.path.join(self.experiment_dir, "states.json"), "r") as file:
+                states = json.load(file)
+            writer = StateWriter(self.path)
+            for state in states:
+                writer.write(state)
+            writer.close()
+            return
+
+        # Index an existing NDJSON file in one pass
+        offsets = [0]
+        timestamps = []
+        with open(self.path, "rb") as file:
+            for line in file:
+                offsets.append(offsets[-1] + len(line))
+                timestamps.append(orjson.loads(line)["timestamp"])
+        write_index(self.index_path, offsets, timestamps)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def lines(self, start: int, stop: int) -> List[str]:
+        """Raw JSON text of the states in [start, stop), read with a single seek"""
+        start = max(0, min(start, len(self)))
+        stop = max(start, min(stop, len(self)))
+        if start == stop:
+            return []
+        with open(self.path, "rb") as file:
+            file.seek(int(self.offsets[start]))
+            data = file.read(int(self.offsets[stop] - self.offsets[start]))
+        # Split on newlines only: orjson leaves U+2028 and the like unescaped in strings
+        return [line.decode("utf-8") for line in data.split(b"\n") if line]
+
+    def state(self, step: int) -> Dict[str, Any]:
+        """Parsed state of a single step"""
+        if not 0 <= step < len(self):
+            raise IndexError(f"Step {step} out of range (0-{len(self) - 1})")
+        return orjson.loads(self.lines(step, step + 1)[0])
+
+    def window(self, start_time: Optional[str] = None, end_time: Optional[str] = None):
+        """Step range [start, stop) of the states with start_time <= timestamp <= end_time"""
+        start = 0
+        stop = len(self)
+        if start_time is not None:
+            start = int(np.searchsorted(
+                self.timestamps, datetime.fromisoformat(start_time).timestamp(), side="left"))
+        if end_time is not None:
+            stop = int(np.searchsorted(
+                self.timestamps, datetime.fromisoformat(end_time).timestamp(), side="right"))
+        return start, max(start, stop)
+
+
+def open_experiment(experiment_id: str, experiments_dir: str = EXPERIMENTS_DIR) -> Optional[StateIndex]:
+    """State index of an experiment by ID, or None if there is no such experiment"""
+    if not experiment_id or os.path.basename(experiment_id) != experiment_id or experiment_id.startswith("."):
+        return None
+    experiment_dir = os.path.join(experiments_dir, experiment_id)
+    if not (os.path.exists(os.path.join(experiment_dir, "states.ndjson")) or
+            os.path.exists(os.path.join(experiment_dir, "states.json"))):
+        return None
+    return StateIndex(experiment_dir)
@@ -0,0 +1,152 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterator, List, Any
+
+import numpy as np
+import orjson
+
+# Buffer size for the NDJSON state writer
+STATE_BUFFER_BYTES = 1 << 20
+
+
+def index_path(path: str) -> str:
+    """Offset index file of an NDJSON states file (states.ndjson -> states.index.npz)"""
+    return os.path.splitext(path)[0] + ".index.npz"
+
+
+def write_index(path: str, offsets: List[int], timestamps: List[str]):
+    """
+    Write the offset index of an NDJSON states file.
+
+    Args:
+        path: Index file path
+        offsets: Byte offset of every line, followed by the file size
+        timestamps: ISO timestamp of every state
+    """
+    with open(path, "wb") as file:
+        np.savez(
+            file,
+            offsets=np.array(offsets, dtype=np.int64),
+            timestamps=np.array([datetime.fromisoformat(timestamp).timestamp()
+                                 for timestamp in timestamps], dtype=np.float64))
+
+
+class StateWriter:
+    """
+    Append simulation states to an NDJSON file (one compact JSON object per line)
+    through a buffered writer, so states never have to be held in memory.
+    """
+
+    def __init__(self, path: str, buffer_size: int = STATE_BUFFER_BYTES):
+        self.path = path
+        self.count = 0
+        self.file = open(path, "wb", buffering=buffer_size)
+        # Line offsets and timestamps for the offset index written on close
+        self.offsets = [0]
+        self.timestamps = []
+
+    def write(self, state: Dict[str, Any]):
+        """Serialize a state immediately and append it as one line"""
+        line = orjson.dumps(state)
+        self.file.write(line)
+        self.file.write(b"\n")
+        self.offsets.append(self.offsets[-1] + len(line) + 1)
+        self.timestamps.append(state["timestamp"])
+        self.count += 1
+
+    def close(self):
+        """Flush the buffer, close the file and write its offset index"""
+        if not self.file.closed:
+            self.file.close()
+            write_index(index_path(self.path), self.offsets, self.timestamps)
+
+
+class PassedVehicleWriter:
+    """
+    Write the records of passed vehicles to a JSON array file as they retire, so they
+    do not have to be held in memory until the end of the run.
+
+    Passed vehicles keep moving at a constant speed after they retire, so a record's
+    final distance follows from its distance and the clock it retired at. Records are
+    spooled as NDJSON lines of [clock, record] and written to the array with their
+    final distance on close.
+    """
+
+    def __init__(self, path: str, buffer_size: int = STATE_BUFFER_BYTES):
+        self.path = path
+        self.spool_path = os.path.splitext(path)[0] + ".spool.ndjson"
+        self.buffer_size = buffer_size
+        self.count = 0
+        self.spool = open(self.spool_path, "wb", buffering=buffer_size)
+
+    def write(self, records: List[Dict[str, Any]], clock: float):
+        """Spool records that retired at `clock` (seconds the passed vehicles have moved)"""
+        for record in records:
+            self.spool.write(orjson.dumps([clock, record]))
+            self.spool.write(b"\n")
+            self.count += 1
+
+    @property
+    def closed(self) -> bool:
+        return self.spool.closed
+
+    def close(self, clock: float, remaining: List[Dict[str, Any]]):
+        """
+        Write the JSON array and remove the spool.
+
+        Args:
+            clock: Seconds the passed vehicles have moved by the end of the run
+            remaining: Records that never retired, with their final distance already
+        """
+        if self.spool.closed:
+            return
+        self.spool.close()
+        with open(self.spool_path, "rb") as spool, open(self.path, "wb", buffering=self.buffer_size) as file:
+            file.write(b"[")
+            for index, line in enumerate(spool):
+                retired, record = orjson.loads(line)
+                record["distance_to_intersection_m"] -= record["speed_kmh"] / 3.6 * (clock - retired)
+                file.write(b",\n" if index else b"\n")
+                file.write(orjson.dumps(record))
+            for index, record in enumerate(remaining, start=self.count):
+                file.write(b",\n" if index else b"\n")
+                file.write(orjson.dumps(record))
+            file.write(b"\n]\n")
+        os.remove(self.spool_path)
+
+
+class StateReader:
+    """
+    Lazy, re-iterable view over an NDJSON states file.
+    Iterating yields parsed state dicts one line at a time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for line in self.lines():
+            yield orjson.loads(line)
+
+    def lines(self) -> Iterator[str]:
+        """Yield the raw JSON text of each state without parsing it"""
+        with open(self.path, "rb") as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield line.decode("utf-8")
+
+
+def iter_states(experiment_dir: str) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate the states of an experiment, preferring the streamed states.ndjson
+    and falling back to the monolithic states.json of non-streaming runs.
+    """
+    ndjson_path = os.path.join(experiment_dir, "states.ndjson")
+    if os.path.exists(ndjson_path):
+        yield from StateReader(ndjson_path)
+        return
+
+    with open(os.path.join(experiment_dir, "states.json"), "r") as file:
+        yield from json.load(file)
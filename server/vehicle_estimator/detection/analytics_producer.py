@@ -0,0 +1,176 @@
+import math
+import time
+from collections import deque
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+import orjson
+from kafka import KafkaProducer
+
+# Producer settings: wait up to LINGER_MS to fill batches of up to BATCH_BYTES, compressed
+LINGER_MS = 500
+BATCH_BYTES = 64 * 1024
+COMPRESSION_TYPE = "gzip"
+
+
+def create_producer(bootstrap_servers: str = "localhost:9092", linger_ms: int = LINGER_MS,
+                    batch_size: int = BATCH_BYTES, compression_type: str = COMPRESSION_TYPE) -> KafkaProducer:
+    """Kafka producer for the windowed analytics, keyed by camera and serialized with orjson"""
+    return KafkaProducer(
+        bootstrap_servers=bootstrap_servers,
+        key_serializer=lambda key: key.encode("utf-8"),
+        value_serializer=orjson.dumps,
+        linger_ms=linger_ms,
+        batch_size=batch_size,
+        compression_type=compression_type,
+    )
+
+
+class _Pane:
+    """Aggregate of the frames of one slide interval"""
+
+    def __init__(self, index: int, lanes: int):
+        self.index = index
+        self.frames = 0
+        self.first_frame = None
+        self.last_frame = None
+        self.count_sums = np.zeros(lanes)
+        self.count_peaks = np.zeros(lanes, dtype=np.int64)
+        self.speed_sums = np.zeros(lanes)
+        self.speed_frames = np.zeros(lanes, dtype=np.int64)
+
+
+class WindowAggregator:
+    """
+    Aggregates per-frame lane counts and speeds over time windows.
+
+    Frames are summed into panes of slide_seconds; a window is the last
+    size_seconds / slide_seconds panes and is emitted whenever a pane closes. Without
+    slide_seconds the windows are tumbling (one pane each). Each window carries the mean
+    and the peak count of every lane and the mean of the known lane speeds.
+    """
+
+    def __init__(self, lane_names: List[str], size_seconds: float = 1.0, slide_seconds: Optional[float] = None):
+        """
+        Args:
+            lane_names: Lanes of the camera
+            size_seconds: Length of a window
+            slide_seconds: Interval between two windows (defaults to size_seconds)
+        """
+        slide_seconds = slide_seconds or size_seconds
+        panes = size_seconds / slide_seconds
+        if slide_seconds <= 0 or panes < 1 or not math.isclose(panes, round(panes)):
+            raise ValueError("size_seconds must be a positive multiple of slide_seconds")
+        self.lane_names = list(lane_names)
+        self.size_seconds = size_seconds
+        self.slide_seconds = slide_seconds
+        self.panes = deque(maxlen=round(panes))
+        self.current: Optional[_Pane] = None
+
+    def add(self, timestamp: float, frame_index: int, lane_counts: Dict[str, int],
+            lane_speeds: Dict[str, Optional[float]] = None) -> List[Dict[str, Any]]:
+        """
+        Add one frame at timestamp (seconds of stream time).
+
+        Returns:
+            The windows closed by this frame (usually none)
+        """
+        index = math.floor(timestamp / self.slide_seconds)
+        windows = []
+        if self.current is not None and index > self.current.index:
+            windows = self._close(index)
+        if self.current is None:
+            self.current = _Pane(index, len(self.lane_names))
+
+        pane = self.current
+        counts = np.array([lane_counts.get(lane_name, 0) for lane_name in self.lane_names])
+        pane.frames += 1
+        pane.first_frame = frame_index if pane.first_frame is None else pane.first_frame
+        pane.last_frame = frame_index
+        pane.count_sums += counts
+        np.maximum(pane.count_peaks, counts, out=pane.count_peaks)
+        if lane_speeds:
+            speeds = np.array([np.nan if lane_speeds.get(lane_name) is None else lane_speeds[lane_name]
+                               for lane_name in self.lane_names])
+            known = ~np.isnan(speeds)
+            pane.speed_sums[known] += speeds[known]
+            pane.speed_frames += known
+        return windows
+
+    def _close(self, next_index: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Close the current pane and emit the windows ending before next_index"""
+        pane = self.current
+        self.current = None
+        self.panes.append(pane)
+        # Intervals skipped without frames still end windows holding earlier panes
+        last = pane.index + 1 if next_index is None else min(next_index, pane.index + self.panes.maxlen)
+        windows = []
+        for end in range(pane.index + 1, last + 1):
+            window = self._window(end)
+            if window is None:
+                break
+            windows.append(window)
+        return windows
+
+    def _window(self, end: int) -> Optional[Dict[str, Any]]:
+        """The window of the panes in [end - panes, end)"""
+        panes = [pane for pane in self.panes if end - self.panes.maxlen <= pane.index < end]
+        if not panes:
+            return None
+        frames = sum(pane.frames for pane in panes)
+        count_sums = sum(pane.count_sums for pane in panes)
+        count_peaks = np.max([pane.count_peaks for pane in panes], axis=0)
+        speed_sums = sum(pane.speed_sums for pane in panes)
+        speed_frames = sum(pane.speed_frames for pane in panes)
+        return {
+            "window_start": round((end - self.panes.maxlen) * self.slide_seconds, 3),
+            "window_end": round(end * self.slide_seconds, 3),
+            "frames": frames,
+            "first_frame": panes[0].first_frame,
+            "last_frame": panes[-1].last_frame,
+            "lane_counts": {lane_name: round(float(total / frames), 2)
+                            for lane_name, total in zip(self.lane_names, count_sums)},
+            "lane_counts_peak": {lane_name: int(peak) for lane_name, peak in zip(self.lane_names, count_peaks)},
+            "lane_speeds": {lane_name: round(float(total / count), 1) if count else None
+                            for lane_name, total, count in zip(self.lane_names, speed_sums, speed_frames)},
+        }
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Close the pane in progress at the end of the stream"""
+        if self.current is None:
+            return []
+        return self._close()
+
+
+class WindowedPublisher:
+    """Publishes the windows of a camera's frames to Kafka instead of every frame"""
+
+    def __init__(self, producer, topic: str, camera_id: str, aggregator: WindowAggregator):
+        """
+        Args:
+            producer: KafkaProducer (see create_producer) or anything with send(topic, value=, key=)
+            topic: Topic of the windows
+            camera_id: Key of the messages, so every window of a camera lands on the same partition
+            aggregator: Window definition and state
+        """
+        self.producer = producer
+        self.topic = topic
+        self.camera_id = camera_id
+        self.aggregator = aggregator
+        self.messages = 0
+
+    def _send(self, windows: List[Dict[str, Any]]):
+        for window in windows:
+            window.update(camera_id=self.camera_id, timestamp=time.time())
+            self.producer.send(self.topic, value=window, key=self.camera_id)
+            self.messages += 1
+
+    def publish(self, timestamp: float, frame_index: int, lane_counts: Dict[str, int],
+                lane_speeds: Dict[str, Optional[float]] = None):
+        """Add a frame and send the windows it closes"""
+        self._send(self.aggregator.add(timestamp, frame_index, lane_counts, lane_speeds))
+
+    def close(self):
+        """Send the last partial window and wait for every batch to be delivered"""
+        self._send(self.aggregator.flush())
+        self.producer.flush()
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+from typing import Dict
+
+
+def _fill(polygon: np.ndarray, width: int, height: int) -> np.ndarray:
+    # Same rasterization as supervision's polygon_to_mask
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.fillPoly(mask, [polygon.astype(int)], color=1)
+    return mask.astype(bool)
+
+
+class LaneMask:
+    """
+    Lane lookup of one camera, rasterized once from its polygons.
+
+    Every pixel holds the index of the lane it belongs to (-1 for none), so the lanes of
+    all detections come from a single indexing operation instead of one PolygonZone
+    trigger per lane. Anchors follow sv.PolygonZone exactly (bottom center of the box
+    clipped to the extent of each zone, rounded up), so the counts are the same.
+    """
+
+    def __init__(self, region: np.ndarray, lanes: Dict[str, np.ndarray]):
+        """
+        Args:
+            region: Polygon of the overall area of interest
+            lanes: Lane name -> polygon (lanes may not overlap)
+        """
+        self.lane_names = list(lanes)
+
+        # Each zone clips boxes to its own polygon: (x_max + 1, y_max + 1)
+        region = region.astype(int)
+        self.region_wh = region.max(axis=0) + 1
+        self.region = _fill(region, *(self.region_wh + 1))
+
+        polygons = [polygon.astype(int) for polygon in lanes.values()]
+        self.lane_wh = np.array([polygon.max(axis=0) + 1 for polygon in polygons])
+        width, height = self.lane_wh.max(axis=0) + 1
+        self.labels = np.full((height, width), -1, dtype=np.int16)
+        for index, polygon in enumerate(polygons):
+            mask = _fill(polygon, width, height)
+            overlap = np.unique(self.labels[mask & (self.labels >= 0)])
+            if overlap.size:
+                raise ValueError(f"Lane {self.lane_names[index]} overlaps lane {self.lane_names[overlap[0]]}")
+            self.labels[mask] = index
+
+    @staticmethod
+    def _anchors(xyxy: np.ndarray, resolution_wh: np.ndarray):
+        """Bottom-center anchors of the boxes clipped to each resolution, shape (boxes, resolutions)"""
+        width = resolution_wh[..., 0]
+        height = resolution_wh[..., 1]
+        x1 = np.clip(xyxy[:, None, 0], 0, width)
+        x2 = np.clip(xyxy[:, None, 2], 0, width)
+        y2 = np.clip(xyxy[:, None, 3], 0, height)
+        return np.ceil((x1 + x2) / 2).astype(int), np.ceil(y2).astype(int)
+
+    def in_region(self, xyxy: np.ndarray) -> np.ndarray:
+        """Whether each box is in the area of interest (like sv.PolygonZone(region).trigger)"""
+        x, y = self._anchors(xyxy, self.region_wh)
+        return self.region[y[:, 0], x[:, 0]]
+
+    def membership(self, xyxy: np.ndarray) -> np.ndarray:
+        """
+        Lanes of each box.
+
+        Returns:
+            Boolean array of shape (boxes, lanes); column i is what the PolygonZone of lane i
+            would trigger on. A box clipped differently per lane may match more than one lane.
+        """
+        x, y = self._anchors(xyxy, self.lane_wh)
+        return self.labels[y, x] == np.arange(len(self.lane_names))
+
+    def counts(self, xyxy: np.ndarray) -> Dict[str, int]:
+        """Number of boxes in each lane"""
+        totals = self.membership(xyxy).sum(axis=0)
+        return {lane_name: int(total) for lane_name, total in zip(self.lane_names, totals)}
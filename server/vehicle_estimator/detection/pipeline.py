@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional
+
+# Marks the end of the stream as it travels down the stages
+_END = object()
+
+# Seconds a blocked worker waits before checking whether the pipeline was stopped
+POLL_SECONDS = 0.1
+
+
+class Pipeline:
+    """
+    Runs the stages of a frame pipeline (e.g. decode -> inference -> tracking -> annotation)
+    each on its own worker thread, connected by bounded queues.
+
+    Every stage has a single worker and the queues are FIFO, so results come out in the
+    order of the source. A full queue blocks the stage before it (backpressure), so a slow
+    stage throttles decoding instead of frames piling up in memory. The last step runs in
+    the thread iterating over run(), which is where GUI calls such as cv2.imshow belong.
+    """
+
+    def __init__(self, source: Iterable, queue_size: int = 8):
+        """
+        Args:
+            source: Iterable of items (frames), consumed by the decode worker
+            queue_size: Capacity of each queue between two stages
+        """
+        self.source = source
+        self.queue_size = queue_size
+        self.stages: List[tuple] = []
+        self.stopped = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.failed_stage: Optional[str] = None
+        # Stage name -> items processed and seconds spent processing them
+        self.stats: Dict[str, Dict[str, float]] = {"decode": {"items": 0, "seconds": 0.0}}
+
+    def add_stage(self, name: str, function: Callable, batch_size: Optional[int] = None) -> "Pipeline":
+        """
+        Append a stage. function maps one item to one result; with batch_size, it maps a
+        list of up to batch_size items (fewer only at the end of the stream) to a list of
+        as many results, e.g. to run one inference call over several frames.
+        """
+        self.stages.append((name, function, batch_size))
+        self.stats[name] = {"items": 0, "seconds": 0.0}
+        return self
+
+    def _put(self, output: queue.Queue, item) -> bool:
+        """Put an item, blocking while the queue is full. False if the pipeline was stopped"""
+        while not self.stopped.is_set():
+            try:
+                output.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, inbox: queue.Queue):
+        """Next item of the queue, or _END once the pipeline was stopped"""
+        while not self.stopped.is_set():
+            try:
+                return inbox.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, name: str, error: BaseException):
+        if self.error is None:
+            self.error = error
+            self.failed_stage = name
+        self.stopped.set()
+
+    def _decode(self, output: queue.Queue):
+        stats = self.stats["decode"]
+        try:
+            iterator = iter(self.source)
+            while True:
+                start = time.perf_counter()
+                item = next(iterator, _END)
+                stats["seconds"] += time.perf_counter() - start
+                if item is _END:
+                    break
+                stats["items"] += 1
+                if not self._put(output, item):
+                    return
+        except Exception as error:
+            self._fail("decode", error)
+            return
+        self._put(output, _END)
+
+    def _work(self, name: str, function: Callable, batch_size: Optional[int],
+              inbox: queue.Queue, output: queue.Queue):
+        stats = self.stats[name]
+        try:
+            ended = False
+            while not ended:
+                # Gather a full batch unless the stream ends first
+                batch = []
+                while len(batch) < (batch_size or 1):
+                    item = self._get(inbox)
+                    if item is _END:
+                        ended = True
+                        break
+                    batch.append(item)
+                if not batch:
+                    break
+
+                start = time.perf_counter()
+                results = function(batch) if batch_size else [function(batch[0])]
+                stats["seconds"] += time.perf_counter() - start
+                stats["items"] += len(batch)
+                if len(results) != len(batch):
+                    raise ValueError(f"Stage {name} returned {len(results)} results for {len(batch)} items")
+
+                for result in results:
+                    if not self._put(output, result):
+                        return
+        except Exception as error:
+            self._fail(name, error)
+            return
+        self._put(output, _END)
+
+    def run(self) -> Iterator[Any]:
+        """
+        Start the workers and yield the results of the last stage in source order.
+        Closing the iterator early (e.g. breaking out of the loop) stops every worker;
+        an exception raised by a stage is re-raised here.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        workers = [threading.Thread(target=self._decode, args=(queues[0],), name="decode", daemon=True)]
+        for index, (name, function, batch_size) in enumerate(self.stages):
+            workers.append(threading.Thread(
+                target=self._work, args=(name, function, batch_size, queues[index], queues[index + 1]),
+                name=name, daemon=True))
+        for worker in workers:
+            worker.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _END:
+                    break
+                yield item
+        finally:
+            self.stop()
+            for worker in workers:
+                worker.join()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        """Ask every worker to finish; items still queued are dropped"""
+        self.stopped.set()
+
+    def throughput(self) -> Dict[str, float]:
+        """Items per second of busy time of each stage (the lowest one is the bottleneck)"""
+        return {name: round(stats["items"] / stats["seconds"], 2) if stats["seconds"] else 0.0
+                for name, stats in self.stats.items()}
+
+
+class FPSMeter:
+    """Frames per second of a run, reported every interval seconds"""
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self.frames = 0
+        self.started_at = time.perf_counter()
+        self.reported_at = self.started_at
+        self.reported_frames = 0
+
+    def tick(self, frames: int = 1) -> Optional[float]:
+        """Count processed frames; once per interval, return the FPS since the last report"""
+        self.frames += frames
+        now = time.perf_counter()
+        if now - self.reported_at < self.interval:
+            return None
+        fps = (self.frames - self.reported_frames) / (now - self.reported_at)
+        self.reported_at = now
+        self.reported_frames = self.frames
+        return fps
+
+    def average(self) -> float:
+        """FPS over the whole run"""
+        elapsed = time.perf_counter() - self.started_at
+        return self.frames / elapsed if elapsed else 0.0
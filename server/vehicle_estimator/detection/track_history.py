@@ -0,0 +1,107 @@
+import numpy as np
+from typing import Dict, List, Optional
+
+
+class TrackHistory:
+    """
+    Recent top-down positions of tracked objects in fixed-size ring buffers.
+
+    Each tracker ID gets a row of a preallocated array. Rows of IDs that were not seen
+    for max_age frames (ByteTrack has dropped them by then) are reused, and when every
+    row is taken the least recently seen ID gives up its row, so memory stays bounded
+    on a camera that runs for days.
+    """
+
+    def __init__(self, length: int, max_age: int, capacity: int = 256):
+        """
+        Args:
+            length: Positions kept per track (e.g. one second of frames)
+            max_age: Frames without an update after which a track is evicted
+            capacity: Maximum number of tracks kept at the same time
+        """
+        self.length = length
+        self.max_age = max_age
+        self.positions = np.zeros((capacity, length), dtype=np.float64)
+        self.heads = np.zeros(capacity, dtype=np.int64)  # Next write position of each row
+        self.counts = np.zeros(capacity, dtype=np.int64)  # Positions stored in each row
+        self.last_seen = np.full(capacity, -1, dtype=np.int64)
+        self.tracker_ids = np.full(capacity, -1, dtype=np.int64)
+        self.rows: Dict[int, int] = {}
+        self.frame = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _release(self, rows: np.ndarray):
+        for row in rows:
+            del self.rows[int(self.tracker_ids[row])]
+        self.tracker_ids[rows] = -1
+        self.last_seen[rows] = -1
+        self.counts[rows] = 0
+        self.heads[rows] = 0
+
+    def update(self, tracker_ids: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """
+        Append one position per tracked object of the current frame.
+
+        Returns:
+            The row of each tracker ID, for speeds()
+        """
+        if len(tracker_ids) > len(self.tracker_ids):
+            raise ValueError(f"{len(tracker_ids)} tracks do not fit a history of {len(self.tracker_ids)} rows")
+        self.frame += 1
+        used = self.tracker_ids >= 0
+        self._release(np.flatnonzero(used & (self.last_seen < self.frame - self.max_age)))
+
+        rows = np.empty(len(tracker_ids), dtype=np.int64)
+        for index, tracker_id in enumerate(tracker_ids.tolist()):
+            row = self.rows.get(tracker_id)
+            if row is None:
+                free = np.flatnonzero(self.tracker_ids < 0)
+                if free.size:
+                    row = int(free[0])
+                else:
+                    # Every row is taken: evict the track seen least recently (not in this frame)
+                    row = int(np.argmin(np.where(self.last_seen == self.frame, self.frame + 1, self.last_seen)))
+                    self._release(np.array([row]))
+                self.rows[tracker_id] = row
+                self.tracker_ids[row] = tracker_id
+            self.last_seen[row] = self.frame
+            rows[index] = row
+
+        # Write every position at once
+        self.positions[rows, self.heads[rows]] = positions
+        self.heads[rows] = (self.heads[rows] + 1) % self.length
+        self.counts[rows] = np.minimum(self.counts[rows] + 1, self.length)
+        return rows
+
+    def speeds(self, rows: np.ndarray, fps: float, min_positions: float) -> np.ndarray:
+        """
+        Speed in km/h of each row from its oldest and newest position (in meters),
+        NaN for tracks with fewer than min_positions positions.
+        """
+        counts = self.counts[rows]
+        newest = self.positions[rows, (self.heads[rows] - 1) % self.length]
+        oldest = self.positions[rows, (self.heads[rows] - counts) % self.length]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speeds = np.abs(newest - oldest) / (counts / fps) * 3.6  # Convert from m/s to km/h
+        return np.where(counts >= min_positions, speeds, np.nan)
+
+
+def lane_average_speeds(membership: np.ndarray, speeds: np.ndarray,
+                        lane_names: List[str]) -> Dict[str, Optional[float]]:
+    """
+    Average known speed of the objects in each lane.
+
+    Args:
+        membership: Boolean array (objects, lanes), e.g. from LaneMask.membership
+        speeds: Speed of each object, NaN if unknown
+
+    Returns:
+        Lane name -> average speed in km/h, None for lanes without a known speed
+    """
+    known = membership & ~np.isnan(speeds)[:, None]
+    totals = np.where(known, speeds[:, None], 0.0).sum(axis=0)
+    counts = known.sum(axis=0)
+    return {lane_name: round(float(total / count), 1) if count else None
+            for lane_name, total, count in zip(lane_names, totals, counts)}
@@ -1,12 +1,15 @@
 import argparse
+import os
 import cv2
 import numpy as np
 import supervision as sv
-from collections import defaultdict, deque
+from contextlib import nullcontext
 from ultralytics import YOLO
 from view_transformer import ViewTransformer
-from kafka import KafkaProducer
-import json
+from pipeline import FPSMeter, Pipeline
+from lane_mask import LaneMask
+from track_history import TrackHistory, lane_average_speeds
+from analytics_producer import COMPRESSION_TYPE, WindowAggregator, WindowedPublisher, create_producer
 
 YOLO_PATH = "yolov8x.pt"
 DEVICE = "mps" # Change to cuda if needed
@@ -73,11 +76,11 @@ TARGET = np.array(
     ]
 )
 
-# Creating Polygon Zones for each lane
-lane_zones = {
-    lane_name: sv.PolygonZone(polygon=lane_data["polygon"])
-    for lane_name, lane_data in LANES.items()
-}
+# Lane lookup raster of the region and lanes, built once
+lane_mask = LaneMask(
+    region=SOURCE,
+    lanes={lane_name: lane_data["polygon"] for lane_name, lane_data in LANES.items()}
+)
 
 def parse_arguments() -> argparse.Namespace:
     # Setup command-line argument parsing
@@ -92,8 +95,8 @@ def parse_arguments() -> argparse.Namespace:
     )
     parser.add_argument(
         "--target_video_path",
-        required=True,
-        help="Path to the target video file (output)",
+        default=None,
+        help="Path to the target video file (output), none to skip writing a video",
         type=str,
     )
     parser.add_argument(
@@ -105,8 +108,171 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument(
         "--iou_threshold", default=0.65, help="IOU threshold for the model", type=float
     )
+    parser.add_argument(
+        "--batch_size",
+        default=1,
+        help="Number of frames per inference call (larger batches raise throughput on CPU)",
+        type=int,
+    )
+    parser.add_argument(
+        "--queue_size",
+        default=8,
+        help="Number of frames buffered between two pipeline stages",
+        type=int,
+    )
+    parser.add_argument(
+        "--device",
+        default=DEVICE,
+        help="Torch device of the model (e.g. cpu on servers without a GPU)",
+        type=str,
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Only publish lane count and speed windows to Kafka: no annotation, output video or window",
+    )
+    parser.add_argument(
+        "--report_interval",
+        default=5.0,
+        help="Seconds between two FPS reports",
+        type=float,
+    )
+    parser.add_argument(
+        "--camera_id",
+        default=None,
+        help="Key of the published windows (defaults to the source video name)",
+        type=str,
+    )
+    parser.add_argument(
+        "--window_seconds",
+        default=1.0,
+        help="Length of the windows lane counts and speeds are aggregated over",
+        type=float,
+    )
+    parser.add_argument(
+        "--slide_seconds",
+        default=None,
+        help="Interval between two sliding windows (tumbling windows if not set)",
+        type=float,
+    )
+    parser.add_argument(
+        "--compression_type",
+        default=COMPRESSION_TYPE,
+        help="Kafka compression of the produced batches (gzip, snappy, lz4, zstd)",
+        type=str,
+    )
+
+    args = parser.parse_args()
+    if args.headless and args.target_video_path:
+        parser.error("--target_video_path needs annotated frames, it cannot be used with --headless")
+    return args
+
+
+def detect(model, batch, confidence_threshold, keep_frames=True):
+    """
+    Run YOLO over a batch of frames in a single inference call.
+
+    Args:
+        batch: List of (frame_index, frame)
+        keep_frames: Pass the frames on for annotation (headless runs drop them here)
+
+    Returns:
+        One dict per frame with its index, the frame and the confident detections
+    """
+    results = model([frame for _, frame in batch])
+    frames = []
+    for (frame_index, frame), result in zip(batch, results):
+        detections = sv.Detections.from_ultralytics(result)
+        detections = detections[detections.confidence > confidence_threshold]
+        frames.append({"frame_index": frame_index, "frame": frame if keep_frames else None,
+                       "detections": detections})
+    return frames
+
+
+def track(frame_data, byte_track, view_transformer, track_history, fps, iou_threshold):
+    """Filter, track and count the detections of one frame and estimate their speeds"""
+    detections = frame_data["detections"]
+
+    # Only keep detections within the region of interest
+    detections = detections[lane_mask.in_region(detections.xyxy)]
+    # Apply non-max suppression
+    detections = detections.with_nms(threshold=iou_threshold)
+    # Update trackers
+    detections = byte_track.update_with_detections(detections=detections)
+
+    # Count vehicles in each lane (a new dict per frame, later stages still hold earlier ones)
+    membership = lane_mask.membership(detections.xyxy)
+    lane_counts = dict(zip(lane_mask.lane_names, membership.sum(axis=0).tolist()))
+
+    # Get the bottom-center anchor points of tracked objects
+    points = detections.get_anchors_coordinates(
+        anchor=sv.Position.BOTTOM_CENTER
+    )
+    # Transform those points to top-down view
+    points = view_transformer.transform_points(points=points).astype(int)
+
+    # Store y-coordinates to compute speed
+    rows = track_history.update(detections.tracker_id, points[:, 1])
+
+    # Estimate the speed of every tracked object at once (NaN until enough data is available)
+    speeds = track_history.speeds(rows, fps, min_positions=fps / 2)
+    lane_speeds = lane_average_speeds(membership, speeds, lane_mask.lane_names)
+
+    frame_data.update(detections=detections, lane_counts=lane_counts, speeds=speeds,
+                      lane_speeds=lane_speeds)
+    return frame_data
+
+
+def annotate(frame_data, trace_annotator, box_annotator, label_annotator):
+    """Draw the traces, boxes, labels, lane polygons and lane counts onto a copy of the frame"""
+    detections = frame_data["detections"]
+
+    # Create labels showing tracker ID and speed if known
+    labels = [
+        f"#{tracker_id}" if np.isnan(speed) else f"#{tracker_id} {int(speed)} km/h"
+        for tracker_id, speed in zip(detections.tracker_id, frame_data["speeds"])
+    ]
+
+    # Create copy of the frame for annotation
+    annotated_frame = frame_data.pop("frame").copy()
+    annotated_frame = trace_annotator.annotate(
+        scene=annotated_frame, detections=detections
+    )
+    annotated_frame = box_annotator.annotate(
+        scene=annotated_frame, detections=detections
+    )
+    annotated_frame = label_annotator.annotate(
+        scene=annotated_frame, detections=detections, labels=labels
+    )
+
+    # Draw lane polygons
+    for lane_name, lane_data in LANES.items():
+        sv.draw_polygon(
+            annotated_frame,
+            polygon=lane_data["polygon"],
+            color=lane_data["color"],
+            thickness=4
+        )
+
+    # Display lane counts and average speeds on the frame
+    y_offset = 50
+    for lane, count in frame_data["lane_counts"].items():
+        speed = frame_data["lane_speeds"][lane]
+        text = f"{lane}: {count}" if speed is None else f"{lane}: {count} ({int(speed)} km/h)"
+        cv2.putText(
+            annotated_frame,
+            text,
+            (50, y_offset),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1,
+            (255, 255, 255),
+            2
+        )
+        y_offset += 50
+
+    frame_data["annotated_frame"] = annotated_frame
+    return frame_data
 
-    return parser.parse_args()
 
 if __name__ == "__main__":
     # Main execution starts here
@@ -116,158 +282,107 @@ if __name__ == "__main__":
     video_info = sv.VideoInfo.from_video_path(video_path=args.source_video_path)
 
     # Load YOLO model using ultralytics
-    model = YOLO(YOLO_PATH).to(DEVICE)
+    model = YOLO(YOLO_PATH).to(args.device)
 
     # ByteTrack for tracking objects across frames
     byte_track = sv.ByteTrack(
         frame_rate=video_info.fps, track_activation_threshold=args.confidence_threshold
     )
 
-    # Decide thickness and text scale based on video resolution
-    thickness = sv.calculate_optimal_line_thickness(
-        resolution_wh=video_info.resolution_wh
-    )
-    text_scale = sv.calculate_optimal_text_scale(resolution_wh=video_info.resolution_wh)
-
-    # Annotators for drawing boxes, labels, and traces
-    box_annotator = sv.BoxAnnotator(thickness=thickness)
-    label_annotator = sv.LabelAnnotator(
-        text_scale=text_scale-0.4,
-        text_thickness=thickness-2,
-        text_position=sv.Position.BOTTOM_CENTER,
-    )
-    trace_annotator = sv.TraceAnnotator(
-        thickness=thickness,
-        trace_length=video_info.fps * 2,  # Trace length in frames
-        position=sv.Position.BOTTOM_CENTER,
-    )
-
     # Generator to read frames from the source video
     frame_generator = sv.get_video_frames_generator(source_path=args.source_video_path)
 
-    # Define the region of interest (polygon) and view transformer
-    polygon_zone = sv.PolygonZone(polygon=SOURCE)
-
+    # Define the view transformer
     view_transformer = ViewTransformer(source=SOURCE, target=TARGET)
 
-    # Store y-coordinates for each tracked ID to calculate speed
-    coordinates = defaultdict(lambda: deque(maxlen=video_info.fps))
+    # Store one second of y-coordinates for each tracked ID to calculate speed, forgetting
+    # IDs once ByteTrack has dropped them (after its lost_track_buffer, one second at 30 FPS)
+    track_history = TrackHistory(length=video_info.fps, max_age=video_info.fps)
 
-    # Store vehicle counts for each lane
-    lane_counts = {lane_name: 0 for lane_name in LANES}
+    # Initialize Kafka producer, publishing one message per window instead of per frame
+    publisher = WindowedPublisher(
+        create_producer('localhost:9092', compression_type=args.compression_type),
+        topic='video-analytics',
+        camera_id=args.camera_id or os.path.splitext(os.path.basename(args.source_video_path))[0],
+        aggregator=WindowAggregator(list(LANES), args.window_seconds, args.slide_seconds),
+    )
 
-    # Initialize Kafka producer
-    producer = KafkaProducer(
-        bootstrap_servers='localhost:9092',
-        value_serializer=lambda v: json.dumps(v).encode('utf-8')
+    # Decode, inference, tracking and annotation each run on their own thread;
+    # writing, display and Kafka stay on the main thread
+    pipeline = Pipeline(enumerate(frame_generator, start=1), queue_size=args.queue_size)
+    pipeline.add_stage(
+        "infer",
+        lambda batch: detect(model, batch, args.confidence_threshold, keep_frames=not args.headless),
+        batch_size=args.batch_size,
+    )
+    pipeline.add_stage(
+        "track",
+        lambda frame_data: track(frame_data, byte_track, view_transformer,
+                                 track_history, video_info.fps, args.iou_threshold),
     )
 
-    with sv.VideoSink(args.target_video_path, video_info) as sink:
-        # Iterate through frames
-        for frame_index, frame in enumerate(frame_generator):
-            frame_index += 1
-            # if frame_index % 2 != 0:
-            #     # Skip every other frame for performance
-            #     continue
-
-            # Run YOLO and get detections
-            result = model(frame)[0]
-            detections = sv.Detections.from_ultralytics(result)
-            detections = detections[detections.confidence > args.confidence_threshold]
-
-            # Only keep detections within the polygon zone
-            detections = detections[polygon_zone.trigger(detections)]
-            # Apply non-max suppression
-            detections = detections.with_nms(threshold=args.iou_threshold)
-            # Update trackers
-            detections = byte_track.update_with_detections(detections=detections)
-
-            # Reset lane counts for each frame
-            for k, v in lane_counts.items():
-                lane_counts[k] = 0
-            
-            # Count vehicles in each lane
-            for lane_name, zone in lane_zones.items():
-                lane_detections = detections[zone.trigger(detections)]
-                lane_counts[lane_name] = len(lane_detections)
-
-            # Get the bottom-center anchor points of tracked objects
-            points = detections.get_anchors_coordinates(
-                anchor=sv.Position.BOTTOM_CENTER
-            )
-            # Transform those points to top-down view
-            points = view_transformer.transform_points(points=points).astype(int)
-
-            # Store y-coordinates to compute speed later
-            for tracker_id, [_, y] in zip(detections.tracker_id, points):
-                coordinates[tracker_id].append(y)
-
-            # Create labels showing tracker ID and speed if enough data is available
-            labels = []
-            for tracker_id in detections.tracker_id:
-                if len(coordinates[tracker_id]) < video_info.fps / 2:
-                    # If not enough points, just show ID
-                    labels.append(f"#{tracker_id}")
-                else:
-                    coordinate_start = coordinates[tracker_id][-1]
-                    coordinate_end = coordinates[tracker_id][0]
-                    distance = abs(coordinate_start - coordinate_end)
-                    time = len(coordinates[tracker_id]) / video_info.fps
-                    speed = distance / time * 3.6  # Convert from m/s to km/h approx
-                    labels.append(f"#{tracker_id} {int(speed)} km/h")
-
-            # Create copy of the frame for annotation
-            annotated_frame = frame.copy()
-            annotated_frame = trace_annotator.annotate(
-                scene=annotated_frame, detections=detections
-            )
-            annotated_frame = box_annotator.annotate(
-                scene=annotated_frame, detections=detections
-            )
-            annotated_frame = label_annotator.annotate(
-                scene=annotated_frame, detections=detections, labels=labels
+    if not args.headless:
+        # Decide thickness and text scale based on video resolution
+        thickness = sv.calculate_optimal_line_thickness(
+            resolution_wh=video_info.resolution_wh
+        )
+        text_scale = sv.calculate_optimal_text_scale(resolution_wh=video_info.resolution_wh)
+
+        # Annotators for drawing boxes, labels, and traces
+        box_annotator = sv.BoxAnnotator(thickness=thickness)
+        label_annotator = sv.LabelAnnotator(
+            text_scale=text_scale-0.4,
+            text_thickness=thickness-2,
+            text_position=sv.Position.BOTTOM_CENTER,
+        )
+        trace_annotator = sv.TraceAnnotator(
+            thickness=thickness,
+            trace_length=video_info.fps * 2,  # Trace length in frames
+            position=sv.Position.BOTTOM_CENTER,
+        )
+
+        pipeline.add_stage(
+            "annotate",
+            lambda frame_data: annotate(frame_data, trace_annotator, box_annotator, label_annotator),
+        )
+
+    # Write an output video only if a target path was given
+    sink = sv.VideoSink(args.target_video_path, video_info) if args.target_video_path else None
+    fps_meter = FPSMeter(interval=args.report_interval)
+
+    with sink or nullcontext():
+        # Iterate through processed frames, in order
+        for frame_data in pipeline.run():
+            # Aggregate the frame into the current window, sent to Kafka once it closes
+            publisher.publish(
+                frame_data["frame_index"] / video_info.fps,
+                frame_data["frame_index"],
+                frame_data["lane_counts"],
+                frame_data["lane_speeds"]
             )
 
-            # Draw lane polygons
-            for lane_name, lane_data in LANES.items():
-                sv.draw_polygon(
-                    annotated_frame,
-                    polygon=lane_data["polygon"],
-                    color=lane_data["color"],
-                    thickness=4
-                )
-
-            # Display lane counts on the frame
-            y_offset = 50
-            for lane, count in lane_counts.items():
-                text = f"{lane}: {count}"
-                cv2.putText(
-                    annotated_frame,
-                    text,
-                    (50, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    1,
-                    (255, 255, 255),
-                    2
-                )
-                y_offset += 50
-
-            # Send data to Kafka
-            producer.send(
-                'video-analytics',
-                {
-                    'frame_index': frame_index,
-                    'lane_counts': lane_counts
-                }
-            )
+            fps = fps_meter.tick()
+            if fps is not None:
+                print(f"Frame {frame_data['frame_index']}: {fps:.1f} FPS")
+
+            if args.headless:
+                continue
 
             # Write annotated frame to output video
-            sink.write_frame(annotated_frame)
+            if sink is not None:
+                sink.write_frame(frame_data["annotated_frame"])
 
             # Display the frame in a window
-            cv2.imshow("frame", annotated_frame)
+            cv2.imshow("frame", frame_data["annotated_frame"])
             if cv2.waitKey(1) & 0xFF == ord("q"):
                 break
 
+    if not args.headless:
         # Cleanup OpenCV windows after loop
-        cv2.destroyAllWindows()
\ No newline at end of file
+        cv2.destroyAllWindows()
+
+    # Send the last window and flush the batches still buffered by the producer
+    publisher.close()
+    print(f"Published {publisher.messages} windows")
+    print(f"{fps_meter.frames} frames at {fps_meter.average():.1f} FPS")
+    print(f"Stage throughput (frames/s): {pipeline.throughput()}")
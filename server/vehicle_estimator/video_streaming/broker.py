@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import defaultdict, namedtuple
+from typing import Dict, List, Callable, Optional
+
+TopicPartition = namedtuple("TopicPartition", ["topic", "partition"])
+ConsumerRecord = namedtuple("ConsumerRecord", ["topic", "partition", "offset", "timestamp", "key", "value"])
+
+
+class InMemoryBroker:
+    """
+    Kafka stand-in inside one process, for tests and local runs without a cluster.
+
+    Topics have a single partition kept as a list. Producers and consumers mimic the
+    parts of kafka-python's KafkaProducer and KafkaConsumer the analytics code uses
+    (send/flush/close and poll/close), so they can be swapped in through a factory.
+    """
+
+    def __init__(self):
+        self.topics: Dict[str, List[ConsumerRecord]] = defaultdict(list)
+        self.condition = threading.Condition()
+
+    def append(self, topic: str, value: bytes, key: Optional[bytes] = None) -> ConsumerRecord:
+        with self.condition:
+            record = ConsumerRecord(topic, 0, len(self.topics[topic]), int(time.time() * 1000), key, value)
+            self.topics[topic].append(record)
+            self.condition.notify_all()
+        return record
+
+    def producer(self, value_serializer: Optional[Callable] = None,
+                 key_serializer: Optional[Callable] = None) -> "InMemoryProducer":
+        return InMemoryProducer(self, value_serializer, key_serializer)
+
+    def consumer(self, *topics: str, auto_offset_reset: str = "latest",
+                 value_deserializer: Optional[Callable] = None) -> "InMemoryConsumer":
+        return InMemoryConsumer(self, topics, auto_offset_reset, value_deserializer)
+
+
+class InMemoryProducer:
+    def __init__(self, broker: InMemoryBroker, value_serializer: Optional[Callable] = None,
+                 key_serializer: Optional[Callable] = None):
+        self.broker = broker
+        self.value_serializer = value_serializer
+        self.key_serializer = key_serializer
+
+    def send(self, topic: str, value=None, key=None) -> ConsumerRecord:
+        if self.value_serializer is not None:
+            value = self.value_serializer(value)
+        if key is not None and self.key_serializer is not None:
+            key = self.key_serializer(key)
+        return self.broker.append(topic, value, key)
+
+    def flush(self, timeout: Optional[float] = None):
+        pass
+
+    def close(self, timeout: Optional[float] = None):
+        pass
+
+
+class InMemoryConsumer:
+    def __init__(self, broker: InMemoryBroker, topics: tuple, auto_offset_reset: str = "latest",
+                 value_deserializer: Optional[Callable] = None):
+        self.broker = broker
+        self.value_deserializer = value_deserializer
+        with broker.condition:
+            # Start after the existing messages ("latest") or at the beginning ("earliest")
+            self.offsets = {topic: len(broker.topics[topic]) if auto_offset_reset == "latest" else 0
+                            for topic in topics}
+        self.closed = False
+
+    def _pending(self) -> bool:
+        return any(len(self.broker.topics[topic]) > offset for topic, offset in self.offsets.items())
+
+    def poll(self, timeout_ms: int = 0, max_records: Optional[int] = None) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        """New records per partition, waiting up to timeout_ms for the first one"""
+        with self.broker.condition:
+            self.broker.condition.wait_for(self._pending, timeout=timeout_ms / 1000)
+            batches = {}
+            for topic, offset in self.offsets.items():
+                records = self.broker.topics[topic][offset:]
+                if max_records is not None:
+                    records = records[:max_records - sum(len(batch) for batch in batches.values())]
+                if not records:
+                    continue
+                self.offsets[topic] = offset + len(records)
+                if self.value_deserializer is not None:
+                    records = [record._replace(value=self.value_deserializer(record.value)) for record in records]
+                batches[TopicPartition(topic, 0)] = records
+        return batches
+
+    def close(self):
+        self.closed = True
@@ -1,27 +1,208 @@
-from flask import Flask, jsonify
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Any, Callable, Optional
+
+import orjson
+from flask import Flask, jsonify, request
 from kafka import KafkaConsumer
 
+# Camera of messages published without a camera_id (per-frame payloads of older detectors)
+DEFAULT_CAMERA = "default"
+
+# Seconds to wait before reconnecting after the broker failed
+RETRY_SECONDS = 5
+
+
+class AnalyticsCache:
+    """Latest message and a ring buffer of the recent ones per camera, shared across threads"""
+
+    def __init__(self, history_size: int = 120):
+        """
+        Args:
+            history_size: Messages (windows) kept per camera
+        """
+        self.history_size = history_size
+        self.lock = threading.Lock()
+        self.latest: Dict[str, Dict[str, Any]] = {}
+        self.history: Dict[str, deque] = {}
+        self.latest_camera: Optional[str] = None
+        self.received = 0
+
+    def add(self, message: Dict[str, Any]):
+        camera_id = message.get("camera_id", DEFAULT_CAMERA)
+        with self.lock:
+            self.latest[camera_id] = message
+            self.history.setdefault(camera_id, deque(maxlen=self.history_size)).append(message)
+            self.latest_camera = camera_id
+            self.received += 1
+
+    def get_latest(self, camera_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Latest message of the camera, or of whichever camera published last"""
+        with self.lock:
+            return self.latest.get(camera_id or self.latest_camera)
+
+    def cameras(self) -> Dict[str, Dict[str, Any]]:
+        """Latest message of every camera"""
+        with self.lock:
+            return dict(self.latest)
+
+    def recent(self, camera_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent messages of the camera, oldest first"""
+        with self.lock:
+            messages = list(self.history.get(camera_id, []))
+        return messages[-limit:] if limit else messages
+
+
+class AnalyticsConsumer:
+    """
+    One long-lived consumer thread for a topic that keeps an AnalyticsCache up to date,
+    so requests read from memory instead of joining the consumer group each time.
+    """
+
+    def __init__(self, topic: str, cache: AnalyticsCache, consumer_factory: Callable = None,
+                 poll_timeout_ms: int = 500):
+        """
+        Args:
+            topic: Topic to consume
+            cache: Cache the decoded messages go to
+            consumer_factory: Creates the consumer for a topic (kafka_consumer by default);
+                anything with poll(timeout_ms=) and close() works, e.g. InMemoryBroker.consumer
+            poll_timeout_ms: Longest wait of one poll, which bounds how long stop() takes
+        """
+        self.topic = topic
+        self.cache = cache
+        self.consumer_factory = consumer_factory or kafka_consumer
+        self.poll_timeout_ms = poll_timeout_ms
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.invalid_messages = 0
+        self.last_error: Optional[str] = None
+        self.connected = threading.Event()
+
+    def start(self) -> "AnalyticsConsumer":
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name=f"consumer-{self.topic}", daemon=True)
+            self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                consumer = self.consumer_factory(self.topic)
+            except Exception as error:
+                self.last_error = str(error)
+                self.stopped.wait(RETRY_SECONDS)
+                continue
+            self.connected.set()
+            try:
+                while not self.stopped.is_set():
+                    for records in consumer.poll(timeout_ms=self.poll_timeout_ms).values():
+                        for record in records:
+                            self._handle(record.value)
+            except Exception as error:
+                # Reconnect with a new consumer after a broker failure
+                self.last_error = str(error)
+                self.connected.clear()
+                self.stopped.wait(RETRY_SECONDS)
+            finally:
+                consumer.close()
+
+    def _handle(self, value: bytes):
+        try:
+            message = orjson.loads(value)
+        except orjson.JSONDecodeError:
+            self.invalid_messages += 1
+            return
+        if isinstance(message, dict):
+            self.cache.add(message)
+        else:
+            self.invalid_messages += 1
+
+    def stop(self, timeout: Optional[float] = None):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "topic": self.topic,
+            "running": self.thread is not None and self.thread.is_alive(),
+            "connected": self.connected.is_set(),
+            "received": self.cache.received,
+            "invalid_messages": self.invalid_messages,
+            "last_error": self.last_error
+        }
+
+
+def kafka_consumer(topic: str) -> KafkaConsumer:
+    """Consumer outside any group, starting at the newest message, on KAFKA_BOOTSTRAP_SERVERS"""
+    return KafkaConsumer(
+        topic,
+        bootstrap_servers=os.environ.get("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092"),
+        auto_offset_reset='latest',
+        enable_auto_commit=False,
+    )
+
+
+_analytics_consumer = None
+_analytics_consumer_lock = threading.Lock()
+
+
+def get_analytics_consumer() -> AnalyticsConsumer:
+    """
+    Process-wide background consumer, started on first use and configured from
+    environment variables:
+
+    ANALYTICS_TOPIC, ANALYTICS_HISTORY_SIZE (messages kept per camera)
+    """
+    global _analytics_consumer
+    # Requests run on several threads, only one of them may start the consumer
+    with _analytics_consumer_lock:
+        if _analytics_consumer is None:
+            _analytics_consumer = AnalyticsConsumer(
+                os.environ.get("ANALYTICS_TOPIC", "video-analytics"),
+                AnalyticsCache(int(os.environ.get("ANALYTICS_HISTORY_SIZE", 120)))
+            ).start()
+    return _analytics_consumer
+
+
 app = Flask(__name__)
 
+
 @app.route('/analytics', methods=['GET'])
 def get_analytics():
-    # Fetch only the latest message from Kafka
-    consumer = KafkaConsumer(
-        'video-analytics',
-        bootstrap_servers='localhost:9092',
-        auto_offset_reset='latest',
-        enable_auto_commit=True,
-        value_deserializer=lambda x: x.decode('utf-8')
-    )
-    
-    # Poll for the latest message
-    message = None
-    for msg in consumer:
-        message = msg.value  # Get the latest message
-        break  # Exit after fetching one message
+    """
+    Latest message of the camera given by 'camera_id' (or of the camera that published
+    last), and the latest message of every camera, served from memory
+    """
+    cache = get_analytics_consumer().cache
+    return jsonify({
+        'latest_frame_data': cache.get_latest(request.args.get('camera_id')),
+        'cameras': cache.cameras()
+    })
+
+
+@app.route('/analytics/recent', methods=['GET'])
+def get_recent_analytics():
+    """Recent messages of a camera, oldest first, at most 'limit' of them"""
+    camera_id = request.args.get('camera_id', DEFAULT_CAMERA)
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    return jsonify({
+        'camera_id': camera_id,
+        'messages': get_analytics_consumer().cache.recent(camera_id, limit)
+    })
+
+
+@app.route('/analytics/status', methods=['GET'])
+def get_consumer_status():
+    """State of the background consumer"""
+    return jsonify(get_analytics_consumer().status())
 
-    consumer.close()
-    return jsonify({'latest_frame_data': message})
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
+    # Start consuming before the first request comes in
+    get_analytics_consumer()
+    app.run(host='0.0.0.0', port=5001)
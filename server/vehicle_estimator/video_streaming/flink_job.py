@@ -1,30 +1,251 @@
-# from pyflink.datastream import StreamExecutionEnvironment
-# from pyflink.datastream.connectors.kafka import FlinkKafkaConsumer, FlinkKafkaProducer
-# from pyflink.common.serialization import SimpleStringSchema
-
-# def process_video_analytics():
-#     env = StreamExecutionEnvironment.get_execution_environment()
-
-#     # Kafka consumer to read data
-#     kafka_consumer = FlinkKafkaConsumer(
-#         topics='video-analytics',
-#         value_deserializer=SimpleStringSchema(),
-#         properties={'bootstrap.servers': 'localhost:9092'}
-#     )
-#     stream = env.add_source(kafka_consumer)
-
-#     # Process the data (e.g., filter, map, etc.)
-#     processed_stream = stream.map(lambda x: x)
-
-#     # Kafka producer to write processed data
-#     kafka_producer = FlinkKafkaProducer(
-#         topic='processed-analytics',
-#         value_serializer=SimpleStringSchema(),
-#         producer_config={'bootstrap.servers': 'localhost:9092'}
-#     )
-#     processed_stream.add_sink(kafka_producer)
-
-#     env.execute("Video Analytics Processing")
-
-# if __name__ == "__main__":
-#     process_video_analytics()
\ No newline at end of file
+import argparse
+import math
+import os
+import re
+import threading
+from collections import defaultdict, deque
+from typing import Dict, List, Any, Optional
+
+import orjson
+from kafka import KafkaConsumer, KafkaProducer
+
+DEFAULT_WINDOW_SECONDS = 30
+DEFAULT_EMIT_SECONDS = 5
+
+# Vehicles a camera lane zone holds when traffic is queued
+LANE_CAPACITY = 10
+
+# Congestion level from the busiest lane's occupancy (average count / capacity),
+# using the levels of the scenarios' traffic_metrics
+CONGESTION_THRESHOLDS = [(0.6, "high"), (0.3, "moderate"), (0.0, "low")]
+
+# Lanes moving slower than this while at least moderately occupied count as congested
+SLOW_SPEED_KMH = 10
+
+
+def signal_lane(camera_lane: str) -> str:
+    """Signal lane of a camera lane zone (e.g. Northbound_Straight2 -> Northbound_Straight)"""
+    return re.sub(r"\d+$", "", camera_lane)
+
+
+def congestion_level(occupancy: Dict[str, float], speeds: Dict[str, Optional[float]]) -> str:
+    """Congestion of an intersection from the occupancy and average speed of its lanes"""
+    if not any(occupancy.values()):
+        return "none"
+    level = max(occupancy.values())
+    if any(speed is not None and speed < SLOW_SPEED_KMH and occupancy[lane] >= CONGESTION_THRESHOLDS[1][0]
+           for lane, speed in speeds.items()):
+        return "high"
+    return next(name for threshold, name in CONGESTION_THRESHOLDS if level >= threshold)
+
+
+class TrafficStateJob:
+    """
+    Turns the lane count windows of the detector cameras into the traffic state of each
+    intersection, in the configuration_state shape TrafficOptimizer.optimize takes.
+
+    State is kept per intersection and (camera, lane), covering the last window_seconds
+    of event time. Every emit_seconds of event time (driven by the message timestamps, so
+    replays give the same result) every intersection with recent data gets a summary with
+    its rolling average counts by_lane and by_destination, peak counts, speeds and a
+    congestion level. Messages are expected roughly in time order, as per partition.
+    """
+
+    def __init__(self, window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 emit_seconds: float = DEFAULT_EMIT_SECONDS,
+                 intersections: Dict[str, str] = None,
+                 lane_map: Dict[str, str] = None,
+                 lane_capacity: float = LANE_CAPACITY):
+        """
+        Args:
+            window_seconds: Length of the rolling window the summaries average over
+            emit_seconds: Interval between two summaries of an intersection
+            intersections: Camera ID -> intersection ID (cameras are their own intersection otherwise)
+            lane_map: Camera lane -> signal lane (see signal_lane otherwise)
+            lane_capacity: Vehicles a camera lane zone holds when queued
+        """
+        self.window_seconds = window_seconds
+        self.emit_seconds = emit_seconds
+        self.intersections = intersections or {}
+        self.lane_map = lane_map or {}
+        self.lane_capacity = lane_capacity
+        # Intersection -> (camera, camera lane) -> deque of (event time, count, peak, speed)
+        self.state: Dict[str, Dict[tuple, deque]] = defaultdict(dict)
+        self.next_emit: Optional[float] = None
+
+    def process(self, message: Dict[str, Any], event_time: float) -> List[Dict[str, Any]]:
+        """
+        Add one message of the detector (a window or a single frame).
+
+        Returns:
+            The summaries due before event_time
+        """
+        summaries = []
+        if self.next_emit is None:
+            self.next_emit = (math.floor(event_time / self.emit_seconds) + 1) * self.emit_seconds
+        while self.next_emit <= event_time:
+            summaries += self.emit(self.next_emit)
+            self.next_emit += self.emit_seconds
+            if not self.state:
+                # Nothing left to report across a gap in the stream
+                self.next_emit = (math.floor(event_time / self.emit_seconds) + 1) * self.emit_seconds
+
+        camera_id = message.get("camera_id", "default")
+        intersection = self.state[self.intersections.get(camera_id, camera_id)]
+        peaks = message.get("lane_counts_peak") or {}
+        speeds = message.get("lane_speeds") or {}
+        for camera_lane, count in (message.get("lane_counts") or {}).items():
+            entries = intersection.setdefault((camera_id, camera_lane), deque())
+            entries.append((event_time, count, peaks.get(camera_lane, count), speeds.get(camera_lane)))
+        return summaries
+
+    def emit(self, now: float) -> List[Dict[str, Any]]:
+        """Summaries of every intersection over [now - window_seconds, now)"""
+        summaries = []
+        for intersection_id in list(self.state):
+            lanes = self.state[intersection_id]
+            for key in list(lanes):
+                entries = lanes[key]
+                while entries and entries[0][0] < now - self.window_seconds:
+                    entries.popleft()
+                if not entries:
+                    del lanes[key]
+            if not lanes:
+                del self.state[intersection_id]
+                continue
+            summaries.append(self._summary(intersection_id, lanes, now))
+        return summaries
+
+    def _summary(self, intersection_id: str, lanes: Dict[tuple, deque], now: float) -> Dict[str, Any]:
+        counts = defaultdict(float)
+        peaks = defaultdict(int)
+        speed_sums = defaultdict(float)
+        speed_counts = defaultdict(int)
+        for (_, camera_lane), entries in lanes.items():
+            lane = self.lane_map.get(camera_lane) or signal_lane(camera_lane)
+            # Camera lanes of the same signal lane add up
+            counts[lane] += sum(entry[1] for entry in entries) / len(entries)
+            peaks[lane] += max(entry[2] for entry in entries)
+            for entry in entries:
+                if entry[3] is not None:
+                    speed_sums[lane] += entry[3]
+                    speed_counts[lane] += 1
+
+        speeds = {lane: round(speed_sums[lane] / speed_counts[lane], 1) if speed_counts[lane] else None
+                  for lane in counts}
+        occupancy = {lane: count / self.lane_capacity for lane, count in counts.items()}
+        # Whole vehicles like the simulator's counts, a lane half the time occupied counts one
+        by_lane = {lane: int(count + 0.5) for lane, count in sorted(counts.items())}
+        # A turn lane's vehicles all head for its movement
+        by_destination = dict(by_lane)
+        return {
+            "intersection_id": intersection_id,
+            "timestamp": now,
+            "window_seconds": self.window_seconds,
+            "configuration_state": {
+                "vehicles": {
+                    "total_count": sum(by_lane.values()),
+                    "by_lane": by_lane,
+                    "by_destination": by_destination,
+                    "emergency_vehicles": []
+                }
+            },
+            "lane_counts_average": {lane: round(count, 2) for lane, count in sorted(counts.items())},
+            "lane_counts_peak": dict(sorted(peaks.items())),
+            "lane_speeds": dict(sorted(speeds.items())),
+            "congestion_level": congestion_level(occupancy, speeds)
+        }
+
+
+class StreamRunner:
+    """
+    Runs a TrafficStateJob between a consumer and a producer: a KafkaConsumer and
+    KafkaProducer in production, or an InMemoryBroker's in-process ones in tests.
+    """
+
+    def __init__(self, job: TrafficStateJob, consumer, producer, output_topic: str = "processed-analytics"):
+        """
+        Args:
+            job: Job state and configuration
+            consumer: Consumer of the detector topic, with poll(timeout_ms=) and close()
+            producer: Producer of the summaries, with send(topic, value=, key=) (values are dicts)
+            output_topic: Topic of the summaries
+        """
+        self.job = job
+        self.consumer = consumer
+        self.producer = producer
+        self.output_topic = output_topic
+        self.stopped = threading.Event()
+        self.processed = 0
+        self.invalid_messages = 0
+
+    def run_once(self, timeout_ms: int = 1000) -> List[Dict[str, Any]]:
+        """Process the messages of one poll and publish the summaries that became due"""
+        summaries = []
+        for records in self.consumer.poll(timeout_ms=timeout_ms).values():
+            for record in records:
+                try:
+                    message = orjson.loads(record.value)
+                except orjson.JSONDecodeError:
+                    self.invalid_messages += 1
+                    continue
+                # Event time of the window, or when the broker received a per-frame message
+                event_time = message.get("timestamp") or record.timestamp / 1000
+                summaries += self.job.process(message, event_time)
+                self.processed += 1
+        for summary in summaries:
+            self.producer.send(self.output_topic, value=summary, key=summary["intersection_id"])
+        return summaries
+
+    def run(self, timeout_ms: int = 1000):
+        """Process messages until stop() is called"""
+        try:
+            while not self.stopped.is_set():
+                self.run_once(timeout_ms)
+        finally:
+            self.producer.flush()
+            self.consumer.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def parse_arguments() -> argparse.Namespace:
+    # Setup command-line argument parsing
+    parser = argparse.ArgumentParser(
+        description="Turn the detector's lane counts into optimizer-ready traffic state per intersection"
+    )
+    parser.add_argument("--input_topic", default="video-analytics", help="Topic of the detector windows")
+    parser.add_argument("--output_topic", default="processed-analytics", help="Topic of the summaries")
+    parser.add_argument("--window_seconds", type=float, default=DEFAULT_WINDOW_SECONDS,
+                        help="Length of the rolling window the counts are averaged over")
+    parser.add_argument("--emit_seconds", type=float, default=DEFAULT_EMIT_SECONDS,
+                        help="Interval between two summaries of an intersection")
+    parser.add_argument("--intersections", default=None,
+                        help="JSON file mapping camera IDs to intersection IDs")
+    parser.add_argument("--lane_capacity", type=float, default=LANE_CAPACITY,
+                        help="Vehicles a camera lane zone holds when queued")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    intersections = None
+    if args.intersections:
+        with open(args.intersections, "rb") as file:
+            intersections = orjson.loads(file.read())
+
+    bootstrap_servers = os.environ.get("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
+    runner = StreamRunner(
+        TrafficStateJob(args.window_seconds, args.emit_seconds, intersections=intersections,
+                        lane_capacity=args.lane_capacity),
+        KafkaConsumer(args.input_topic, bootstrap_servers=bootstrap_servers,
+                      group_id="traffic-state", auto_offset_reset="latest"),
+        KafkaProducer(bootstrap_servers=bootstrap_servers, value_serializer=orjson.dumps,
+                      key_serializer=lambda key: key.encode("utf-8")),
+        output_topic=args.output_topic,
+    )
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        pass